@@ -3,114 +3,210 @@ from datetime import datetime, timedelta
 import calendar
 from collections import defaultdict
 import concurrent.futures
-from typing import Tuple, List, Dict
+import hashlib
+import http.client
+import re
+from typing import Tuple, Dict, Iterator
 import logging
 import os
 import time
+import urllib.error
 import urllib.request
-from pathlib import Path
 from tqdm import tqdm
 import threading
 from queue import Queue
+from Ingestion.manifest import IngestionManifest, arxiv_id, file_sha256, paper_relpath
+from Ingestion.catalog import PaperCatalog
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 
 class DownloadTracker:
-    def __init__(self, total_papers: int):
-        self.pbar = tqdm(total=total_papers, desc="Downloading papers", unit="paper")
+    def __init__(self, total_papers: int = None, position: int = 0):
+        self.pbar = tqdm(total=total_papers, desc="Downloading papers", unit="paper", position=position)
         self.lock = threading.Lock()
     
     def update(self, n=1):
         with self.lock:
             self.pbar.update(n)
+
+    def expect(self, n: int):
+        """Grow the total as papers are queued, for runs that don't know it up front."""
+        with self.lock:
+            self.pbar.total = (self.pbar.total or 0) + n
+            self.pbar.refresh()
     
     def close(self):
         self.pbar.close()
 
-def sanitize_filename(title: str) -> str:
-    """Convert title to a valid filename."""
-    invalid_chars = '<>:"/\\|?*'
-    filename = ''.join(char if char not in invalid_chars else '_' for char in title)
-    return filename[:150]
+CHUNK_SIZE = 1 << 16
+
+
+class IncompleteDownload(IOError):
+    pass
+
+
+def expected_size(response, offset: int):
+    """Total file size from Content-Range (206) or Content-Length, if known."""
+    content_range = response.headers.get("Content-Range")
+    if content_range:
+        match = re.search(r"/(\d+)$", content_range)
+        if match:
+            return int(match.group(1))
+    length = response.headers.get("Content-Length")
+    return offset + int(length) if length is not None else None
+
+
+def fetch_pdf(url: str, filepath: str, chunk_size: int = CHUNK_SIZE,
+              max_attempts: int = 4, timeout: float = 60.0) -> Tuple[int, str]:
+    """
+    Stream `url` to `filepath` in fixed-size chunks and return (size, sha256).
+
+    Bytes go to `filepath + ".part"`, which is renamed into place only after
+    its size matches what the server announced, so an existing `filepath` is
+    always complete. A leftover .part file (from a failed attempt or a
+    killed run) is resumed with an HTTP Range request; servers that ignore
+    Range are downloaded again from the start, and so, once, is a .part file
+    the server answers with 416 for any other reason (it no longer matches
+    the server's copy).
+    """
+    part_path = filepath + ".part"
+    attempt = 0
+    restarted = False
+    while True:
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        digest = hashlib.sha256()
+        request = urllib.request.Request(url)
+        if offset:
+            request.add_header("Range", f"bytes={offset}-")
+        try:
+            try:
+                response = urllib.request.urlopen(request, timeout=timeout)
+            except urllib.error.HTTPError as e:
+                # 416: the .part file already holds the whole file
+                total = re.search(r"/(\d+)$", e.headers.get("Content-Range", ""))
+                if e.code == 416 and total and int(total.group(1)) == offset:
+                    os.replace(part_path, filepath)
+                    return offset, file_sha256(filepath)
+                if e.code == 416 and offset and not restarted:
+                    os.remove(part_path)
+                    restarted = True
+                    continue
+                raise
+            with response:
+                if offset and response.status != 206:
+                    offset = 0
+                expected = expected_size(response, offset)
+                with open(part_path, "r+b" if offset else "wb") as f:
+                    if offset:
+                        # hash the bytes kept from earlier attempts, then append
+                        for block in iter(lambda: f.read(chunk_size), b""):
+                            digest.update(block)
+                        f.seek(offset)
+                        f.truncate()
+                    while True:
+                        chunk = response.read(chunk_size)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        digest.update(chunk)
+            size = os.path.getsize(part_path)
+            if expected is not None and size != expected:
+                raise IncompleteDownload(f"got {size} of {expected} bytes")
+            os.replace(part_path, filepath)
+            return size, digest.hexdigest()
+        except (urllib.error.URLError, http.client.HTTPException, OSError) as e:
+            if isinstance(e, urllib.error.HTTPError) and e.code < 500 and e.code != 429:
+                raise
+            if attempt == max_attempts - 1:
+                raise
+            logging.warning(f"Retrying {url} after: {str(e)}")
+            time.sleep(min(2 ** attempt, 30))
+        attempt += 1
+
 
-def download_paper(args: Tuple[arxiv.Result, str, DownloadTracker]) -> bool:
+def download_paper(args: Tuple[arxiv.Result, str, DownloadTracker, IngestionManifest]) -> bool:
     """
-    Download a single paper's PDF.
+    Download a single paper's PDF and record the outcome in the manifest.
     """
-    paper, base_path, tracker = args
+    paper, base_path, tracker, manifest = args
+    paper_id = getattr(paper, "arxiv_id", None) or arxiv_id(paper)
     try:
-        month_dir = os.path.join(base_path, paper.published.strftime("%Y-%m"))
-        os.makedirs(month_dir, exist_ok=True)
-        
-        filename = f"{sanitize_filename(paper.title)}.pdf"
-        filepath = os.path.join(month_dir, filename)
+        filepath = os.path.join(base_path, paper_relpath(paper))
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
         
+        # Only fetch_pdf's atomic rename creates filepath, so it is complete
         if os.path.exists(filepath):
-            tracker.update()
-            return True
-        
-        # Download with progress monitoring
-        response = urllib.request.urlopen(paper.pdf_url)
-        file_size = int(response.headers['Content-Length'])
-        
-        with open(filepath, 'wb') as f:
-            f.write(response.read())
+            size, sha256 = os.path.getsize(filepath), file_sha256(filepath)
+        else:
+            size, sha256 = fetch_pdf(paper.pdf_url, filepath)
         
+        if manifest is not None:
+            manifest.mark_downloaded(paper_id, filepath, size, sha256)
         tracker.update()
         return True
         
     except Exception as e:
         logging.error(f"Error downloading '{paper.title}': {str(e)}")
+        if manifest is not None:
+            manifest.mark_failed(paper_id, str(e))
         tracker.update()
         return False
 
-def process_papers_batch(papers: List[arxiv.Result], base_path: str, 
-                        max_workers: int = 10) -> None:
+PAGE_SIZE = 100
+_DONE = object()
+
+
+def iter_month_papers(date_tuple: Tuple[datetime, datetime, int, datetime]) -> Iterator[arxiv.Result]:
     """
-    Download a batch of papers in parallel with progress tracking.
+    Lazily list papers for a specific month, only those submitted after
+    `since` (the month's manifest checkpoint) when it is set. The arxiv
+    client requests the next page only once the previous one is consumed.
+    Papers come oldest first, as in Ingestion.async_downloader, so a month
+    capped at max_papers checkpoints at the last paper it actually listed.
     """
-    tracker = DownloadTracker(len(papers))
+    start_date, end_date, max_papers, since = date_tuple
+    if since is not None:
+        start_date = max(start_date, since.replace(tzinfo=None) + timedelta(minutes=1))
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Create arguments for each download task
-        download_args = [(paper, base_path, tracker) for paper in papers]
-        
-        # Submit all downloads
-        futures = [executor.submit(download_paper, args) for args in download_args]
-        concurrent.futures.wait(futures)
-    
-    tracker.close()
-
-def fetch_month_papers(date_tuple: Tuple[datetime, datetime, int]) -> Tuple[str, List]:
-    """Fetch papers for a specific month."""
-    start_date, end_date, max_papers = date_tuple
-    date_key = start_date.strftime("%Y-%m")
-    
-    client = arxiv.Client(page_size=100, delay_seconds=1, num_retries=3)
+    client = arxiv.Client(page_size=PAGE_SIZE, delay_seconds=1, num_retries=3)
     search = arxiv.Search(
-        query=f'cat:cs.* AND submittedDate:[{start_date.strftime("%Y%m%d")} TO {end_date.strftime("%Y%m%d")}]',
+        query=f'cat:cs.* AND submittedDate:[{start_date.strftime("%Y%m%d%H%M")} TO {end_date.strftime("%Y%m%d")}2359]',
         max_results=max_papers,
-        sort_by=arxiv.SortCriterion.SubmittedDate
+        sort_by=arxiv.SortCriterion.SubmittedDate,
+        sort_order=arxiv.SortOrder.Ascending
     )
-    
-    try:
-        papers = list(client.results(search))
-        print(f"\nFetched {len(papers)} papers for {date_key}")
-        return date_key, papers
-    except Exception as e:
-        logging.error(f"Error fetching papers for {date_key}: {str(e)}")
-        return date_key, []
+    return client.results(search)
 
 def get_papers_by_month(start_date: datetime, end_date: datetime, 
                        max_papers_per_month: int = 200,
                        max_fetch_workers: int = 4, 
                        max_download_workers: int = 10,
-                       download_dir: str = "arxiv_papers") -> Dict[str, List]:
+                       download_dir: str = "arxiv_papers",
+                       manifest_path: str = None,
+                       queue_size: int = 200,
+                       catalog_path: str = None) -> Dict[str, int]:
     """
-    Fetch and download papers within date range using parallel processing.
+    Fetch and download papers within date range as one pipeline.
+
+    Month listers stream each page of results into a bounded download
+    queue as it arrives, and download workers drain it concurrently, so
+    downloads start with the first page and memory stays flat however long
+    the range is; a full queue blocks the listers until downloads catch up.
+
+    Progress is kept in an IngestionManifest (download_dir/manifest.db by
+    default): each month is listed only past its checkpoint, which advances
+    once the month is fully listed, and every paper that is still pending
+    or failed, from this run or an interrupted earlier one, is downloaded.
+    Every listed paper's metadata also goes into a PaperCatalog
+    (download_dir/catalog.db by default, GCS links under
+    $PAPER_CATALOG_GCS_PREFIX). Returns the number of newly listed papers by
+    month.
     """
     os.makedirs(download_dir, exist_ok=True)
+    manifest = IngestionManifest(manifest_path or os.path.join(download_dir, "manifest.db"))
+    catalog = PaperCatalog(catalog_path or os.path.join(download_dir, "catalog.db"), download_dir,
+                           os.environ.get("PAPER_CATALOG_GCS_PREFIX"))
     
     # Generate month ranges
     month_ranges = []
@@ -118,39 +214,77 @@ def get_papers_by_month(start_date: datetime, end_date: datetime,
     while current_date <= end_date:
         _, last_day = calendar.monthrange(current_date.year, current_date.month)
         month_end = min(datetime(current_date.year, current_date.month, last_day), end_date)
-        month_ranges.append((current_date, month_end, max_papers_per_month))
+        month_ranges.append((current_date, month_end, max_papers_per_month,
+                             manifest.checkpoint(current_date.strftime("%Y-%m"))))
         
         if current_date.month == 12:
             current_date = datetime(current_date.year + 1, 1, 1)
         else:
             current_date = datetime(current_date.year, current_date.month + 1, 1)
     
-    papers_by_month = defaultdict(list)
-    all_papers = []
+    new_by_month = defaultdict(int)
+    queue = Queue(maxsize=queue_size)
+    tracker = DownloadTracker(position=1)
+    
+    def download_worker():
+        while True:
+            paper = queue.get()
+            if paper is _DONE:
+                return
+            download_paper((paper, download_dir, tracker, manifest))
+    
+    def enqueue(papers):
+        tracker.expect(len(papers))
+        for paper in papers:
+            queue.put(paper)  # blocks while the downloaders are behind
     
-    # Fetch papers with progress bar
-    with tqdm(total=len(month_ranges), desc="Fetching papers", unit="month") as pbar:
+    def list_month(month_range):
+        month_key = month_range[0].strftime("%Y-%m")
+        batch, newest = [], None
+        
+        def flush():
+            nonlocal batch, newest
+            if batch:
+                newest = max([p.published for p in batch] + ([newest] if newest else []))
+                catalog.add(batch)
+                added = manifest.add_papers(batch)
+                new_by_month[month_key] += len(added)
+                batch = []
+                enqueue(added)
+        
+        try:
+            for paper in iter_month_papers(month_range):
+                batch.append(paper)
+                if len(batch) == PAGE_SIZE:
+                    flush()
+            flush()
+            # only a fully listed month may move its checkpoint
+            if newest is not None:
+                manifest.set_checkpoint(month_key, newest)
+        except Exception as e:
+            logging.error(f"Error fetching papers for {month_key}: {str(e)}")
+    
+    workers = [threading.Thread(target=download_worker, daemon=True)
+               for _ in range(max_download_workers)]
+    for worker in workers:
+        worker.start()
+    
+    # Papers left pending by an earlier run go first; add_papers never
+    # returns them again, so nothing is queued twice
+    enqueue(manifest.pending(r[0].strftime("%Y-%m") for r in month_ranges))
+    
+    with tqdm(total=len(month_ranges), desc="Fetching papers", unit="month", position=0) as pbar:
         with concurrent.futures.ThreadPoolExecutor(max_workers=max_fetch_workers) as executor:
-            future_to_month = {
-                executor.submit(fetch_month_papers, month_range): month_range
-                for month_range in month_ranges
-            }
-            
-            for future in concurrent.futures.as_completed(future_to_month):
-                try:
-                    month_key, papers = future.result()
-                    papers_by_month[month_key].extend(papers)
-                    all_papers.extend(papers)
-                    pbar.update(1)
-                except Exception as e:
-                    logging.error(f"Error in worker: {str(e)}")
-                    pbar.update(1)
+            for _ in executor.map(list_month, month_ranges):
+                pbar.update(1)
     
-    # Download all papers in parallel
-    print("\nStarting parallel downloads...")
-    process_papers_batch(all_papers, download_dir, max_download_workers)
+    for _ in workers:
+        queue.put(_DONE)
+    for worker in workers:
+        worker.join()
+    tracker.close()
     
-    return papers_by_month
+    return dict(new_by_month)
 
 def main():
     # Example usage
@@ -174,14 +308,14 @@ def main():
     
     # Print summary
     total_papers = 0
-    for month, month_papers in papers.items():
-        paper_count = len(month_papers)
+    for month, paper_count in papers.items():
         total_papers += paper_count
         print(f"\nMonth: {month}")
         print(f"Number of papers: {paper_count}")
         print(f"Download location: {os.path.join(download_dir, month)}")
         
-    print(f"\nTotal papers processed: {total_papers}")
+    print(f"\nTotal new papers listed: {total_papers}")
+    print(f"Manifest: {IngestionManifest(os.path.join(download_dir, 'manifest.db')).summary()}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,5 +1,13 @@
+from typing import Optional
 from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from LLMs.streaming import sse_stream, SSE_HEADERS
 class UserChat(BaseModel):
     message:str
-def chatbotButton(data,chat):
-    return chat.research_chat(data['message'])
\ No newline at end of file
+    session_id:Optional[str]=None
+async def chatbotButton(data,chat):
+    return await chat.research_chat(data['message'], data.get('session_id'))
+def chatbotStreamButton(data,chat):
+    events = chat.stream_chat(data['message'], data.get('session_id'))
+    return StreamingResponse(sse_stream(events), media_type="text/event-stream",
+                             headers=SSE_HEADERS)
\ No newline at end of file
@@ -0,0 +1,214 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+def estimate_tokens(text: str):
+    """Cheap token estimate (~4 characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+def window_messages(messages: list, token_budget: int):
+    """
+    Most recent messages whose combined size fits in `token_budget`. The newest
+    message is always kept so the model sees the current question.
+    """
+    window = []
+    used = 0
+    for message in reversed(messages):
+        cost = estimate_tokens(message["content"])
+        if window and used + cost > token_budget:
+            break
+        window.append(message)
+        used += cost
+    window.reverse()
+    return window
+
+
+class MemoryConversationStore:
+    """
+    Per-process conversation store with LRU + TTL eviction. Every session
+    keeps at most `max_messages` messages, and at most `max_sessions`
+    sessions are held, so memory is bounded regardless of traffic.
+
+    Each gunicorn worker has its own copy, so a session only sticks to one
+    worker; use SQLiteConversationStore when workers must share history.
+    """
+
+    def __init__(self, max_sessions: int = 1000, ttl: float = 3600.0,
+                 max_messages: int = 50, clock=time.monotonic):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.clock = clock
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _evict(self, now):
+        while self.sessions:
+            session_id, (last_access, _) = next(iter(self.sessions.items()))
+            if len(self.sessions) > self.max_sessions or now - last_access > self.ttl:
+                del self.sessions[session_id]
+            else:
+                break
+
+    def get(self, session_id: str):
+        now = self.clock()
+        with self.lock:
+            self._evict(now)
+            entry = self.sessions.get(session_id)
+            if entry is None:
+                return []
+            self.sessions[session_id] = (now, entry[1])
+            self.sessions.move_to_end(session_id)
+            return list(entry[1])
+
+    def append(self, session_id: str, *messages):
+        now = self.clock()
+        with self.lock:
+            entry = self.sessions.pop(session_id, None)
+            # an expired session that _evict has not reached yet starts over
+            history = entry[1] if entry and now - entry[0] <= self.ttl else []
+            history.extend(messages)
+            del history[:-self.max_messages]
+            self.sessions[session_id] = (now, history)
+            self._evict(now)
+
+    def delete(self, session_id: str):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self.sessions)
+
+
+class SQLiteConversationStore:
+    """
+    On-disk conversation store shared by every worker on the instance. Uses
+    the same LRU/TTL/max_messages policy as MemoryConversationStore.
+    """
+
+    def __init__(self, path: str = "chat_sessions.db", max_sessions: int = 10000,
+                 ttl: float = 3600.0, max_messages: int = 50, clock=time.time):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.clock = clock
+        self.local = threading.local()
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    last_access REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions(last_access);
+                CREATE TABLE IF NOT EXISTS messages (
+                    session_id TEXT NOT NULL,
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    message TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS messages_session ON messages(session_id, seq);
+            """)
+
+    def _connect(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def _evict(self, conn, now, added: bool):
+        # expired sessions come off the last_access index; the sessions are
+        # only counted when one was added, since only then can they exceed
+        # max_sessions
+        evicted = [row[0] for row in conn.execute(
+            "SELECT session_id FROM sessions WHERE last_access < ?", (now - self.ttl,))]
+        if added:
+            over = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - len(evicted) - self.max_sessions
+            if over > 0:
+                evicted += [row[0] for row in conn.execute(
+                    "SELECT session_id FROM sessions WHERE last_access >= ? ORDER BY last_access LIMIT ?",
+                    (now - self.ttl, over))]
+        conn.executemany("DELETE FROM messages WHERE session_id = ?", [(s,) for s in evicted])
+        conn.executemany("DELETE FROM sessions WHERE session_id = ?", [(s,) for s in evicted])
+
+    def _live(self, conn, session_id: str, now):
+        """
+        Whether the session exists and is within the TTL. An expired session
+        is deleted on the spot, so its history cannot come back when the
+        same id is used again before _evict gets to it.
+        """
+        row = conn.execute("SELECT last_access FROM sessions WHERE session_id = ?",
+                           (session_id,)).fetchone()
+        if row is not None and now - row[0] > self.ttl:
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            return False
+        return row is not None
+
+    def get(self, session_id: str):
+        now = self.clock()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = []
+            if self._live(conn, session_id, now):
+                conn.execute("UPDATE sessions SET last_access = ? WHERE session_id = ?", (now, session_id))
+                rows = conn.execute("SELECT message FROM messages WHERE session_id = ? ORDER BY seq",
+                                    (session_id,)).fetchall()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [json.loads(r[0]) for r in rows]
+
+    def append(self, session_id: str, *messages):
+        now = self.clock()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            added = not self._live(conn, session_id, now)
+            conn.execute("""
+                INSERT INTO sessions(session_id, last_access) VALUES (?, ?)
+                ON CONFLICT(session_id) DO UPDATE SET last_access = excluded.last_access
+            """, (session_id, now))
+            conn.executemany("INSERT INTO messages(session_id, message) VALUES (?, ?)",
+                             [(session_id, json.dumps(m)) for m in messages])
+            conn.execute("""
+                DELETE FROM messages WHERE session_id = ? AND seq NOT IN (
+                    SELECT seq FROM messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?
+                )""", (session_id, session_id, self.max_messages))
+            self._evict(conn, now, added)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, session_id: str):
+        conn = self._connect()
+        conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+        conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def conversation_store_from_env():
+    """CHAT_SESSION_BACKEND=memory (default) or sqlite; CHAT_SESSION_DB sets the file."""
+    ttl = float(os.environ.get("CHAT_SESSION_TTL", 3600))
+    max_sessions = int(os.environ.get("CHAT_MAX_SESSIONS", 1000))
+    if os.environ.get("CHAT_SESSION_BACKEND", "memory") == "sqlite":
+        return SQLiteConversationStore(os.environ.get("CHAT_SESSION_DB", "chat_sessions.db"),
+                                       max_sessions=max_sessions, ttl=ttl)
+    return MemoryConversationStore(max_sessions=max_sessions, ttl=ttl)
@@ -1,4 +1,6 @@
 from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from LLMs.streaming import sse_stream, SSE_HEADERS
 
 
 class PaperFormat(BaseModel):
@@ -23,7 +25,7 @@ def generateButton():
     return sample_data
 
 
-def generateSubmitButton(data, chat):
+async def generateSubmitButton(data, chat):
     sample_data = {
         1: {
             "title": "This is the paper title",
@@ -74,4 +76,10 @@ def generateSubmitButton(data, chat):
             }
         }
     }
-    return chat.generate_ideas(data["domains"], data["specifications"])
+    return await chat.generate_ideas(data["domains"], data["specifications"])
+
+
+def generateSubmitStreamButton(data, chat):
+    events = chat.stream_ideas(data["domains"], data["specifications"])
+    return StreamingResponse(sse_stream(events), media_type="text/event-stream",
+                             headers=SSE_HEADERS)
@@ -0,0 +1,372 @@
+"""
+asyncio arXiv ingestion: lists months through the arXiv export API and
+downloads PDFs on one event loop, with every request going through a shared
+rate limiter, per-host connection caps and jittered retries.
+
+    python -m Ingestion.async_downloader --start 2021-01-01 --end 2021-12-31 \
+        --categories cs.AI cs.LG --max-per-month 200 --out arxiv_papers
+"""
+import argparse
+import asyncio
+import calendar
+import hashlib
+import logging
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+import httpx
+
+from ArxivDownload import CHUNK_SIZE, IncompleteDownload, expected_size
+from Ingestion.catalog import PaperCatalog
+from Ingestion.manifest import IngestionManifest, PaperRecord, file_sha256, paper_relpath
+from LLMs.search_client import RETRY_STATUSES, backoff_delay
+
+ARXIV_API_URL = "http://export.arxiv.org/api/query"
+ATOM = "{http://www.w3.org/2005/Atom}"
+OPENSEARCH = "{http://a9.com/-/spec/opensearch/1.1/}"
+
+
+class TokenBucket:
+    """
+    Async token bucket refilled at `rate` tokens per second, holding at most
+    `burst`. `acquire` waits for a token; waiters are served in arrival order.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+        self.lock = asyncio.Lock()
+        self.waited = 0.0
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = self.clock()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+                self.waited += delay
+                await asyncio.sleep(delay)
+
+
+def month_ranges(start_date: datetime, end_date: datetime):
+    """(first, last) day of every month touched by the range, clipped to it."""
+    ranges = []
+    current = start_date
+    while current <= end_date:
+        _, last_day = calendar.monthrange(current.year, current.month)
+        ranges.append((current, min(datetime(current.year, current.month, last_day), end_date)))
+        current = datetime(current.year + current.month // 12, current.month % 12 + 1, 1)
+    return ranges
+
+
+def prefix_sha256(path: str, size: int):
+    """SHA-256 state over the first `size` bytes of a .part file, to resume hashing from."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while size > 0:
+            block = f.read(min(CHUNK_SIZE, size))
+            if not block:
+                break
+            digest.update(block)
+            size -= len(block)
+    return digest
+
+
+def parse_feed(text: str):
+    """Returns (totalResults, [PaperRecord]) from an arXiv API Atom page."""
+    root = ET.fromstring(text)
+    total = int(root.findtext(f"{OPENSEARCH}totalResults", "0"))
+    papers = []
+    for entry in root.iter(f"{ATOM}entry"):
+        entry_id = entry.findtext(f"{ATOM}id", "")
+        pdf_url = next((link.get("href") for link in entry.iter(f"{ATOM}link")
+                        if link.get("title") == "pdf"), None)
+        if "/abs/" not in entry_id or pdf_url is None:
+            continue  # the API reports query errors as a single id-less entry
+        papers.append(PaperRecord(
+            re.sub(r"v\d+$", "", entry_id.split("/abs/")[-1]),
+            re.sub(r"\s+", " ", entry.findtext(f"{ATOM}title", "")).strip(),
+            datetime.fromisoformat(entry.findtext(f"{ATOM}published")),
+            pdf_url,
+            tuple(author.findtext(f"{ATOM}name", "") for author in entry.iter(f"{ATOM}author")),
+            tuple(category.get("term") for category in entry.iter(f"{ATOM}category"))))
+    return total, papers
+
+
+class AsyncArxivDownloader:
+    """
+    Lists and downloads a date range on one event loop.
+
+    Every HTTP request first takes a token from the global bucket (`rate`
+    requests per second across all hosts) and a slot on its host
+    (`per_host` connections at most); API listing pages additionally take a
+    token from a bucket that allows one page per `api_interval` seconds, the
+    pace arXiv asks of API clients. 429/5xx answers and connection errors are
+    retried with jittered exponential backoff, honouring Retry-After.
+
+    As in ArxivDownload.get_papers_by_month, listed pages flow through a
+    bounded queue into `workers` download tasks, PDFs are streamed to a
+    .part file and resumed with Range, progress is kept in an
+    IngestionManifest and, if given, listed metadata in a PaperCatalog.
+    Manifest and catalog writes and file hashing run in worker threads so
+    they never stall the event loop's downloads.
+    """
+
+    def __init__(self, manifest: IngestionManifest, download_dir: str,
+                 api_url: str = ARXIV_API_URL, categories=("cs.*",),
+                 rate: float = 4.0, burst: float = 4.0, api_interval: float = 3.0,
+                 per_host: int = 4, workers: int = 16, max_retries: int = 5,
+                 backoff_factor: float = 1.0, max_backoff: float = 60.0,
+                 page_size: int = 100, queue_size: int = 200, timeout: float = 60.0,
+                 catalog: PaperCatalog = None):
+        self.manifest = manifest
+        self.catalog = catalog
+        self.download_dir = download_dir
+        self.api_url = api_url
+        self.categories = list(categories)
+        self.per_host = per_host
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.page_size = page_size
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate, burst)
+        self.api_bucket = TokenBucket(1.0 / api_interval) if api_interval > 0 else None
+        self.host_slots = defaultdict(lambda: asyncio.Semaphore(self.per_host))
+        self.http = None
+        self.stats = defaultdict(int)
+
+    @asynccontextmanager
+    async def _slot(self, url: str):
+        async with self.host_slots[urlsplit(url).netloc]:
+            if self.api_bucket is not None and url == self.api_url:
+                await self.api_bucket.acquire()
+            await self.bucket.acquire()
+            yield
+
+    async def _retry(self, attempt: int, url: str, reason, retry_after=None):
+        """Sleeps before the next attempt, or returns False when out of attempts."""
+        if attempt >= self.max_retries:
+            return False
+        self.stats["retries"] += 1
+        delay = backoff_delay(attempt, self.backoff_factor, self.max_backoff)
+        if retry_after is not None:
+            # Retry-After is the same for every task that was turned away, so
+            # it is a floor under the jittered backoff rather than a replacement
+            delay = min(delay + backoff_delay(0, 0, self.max_backoff, retry_after), self.max_backoff)
+        logging.warning(f"Retrying {url} in {delay:.1f}s after: {reason}")
+        await asyncio.sleep(delay)
+        return True
+
+    async def _get(self, url: str, params=None):
+        attempt = 0
+        while True:
+            try:
+                async with self._slot(url):
+                    response = await self.http.get(url, params=params)
+            except httpx.TransportError as e:
+                if not await self._retry(attempt, url, repr(e)):
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or not await self._retry(
+                        attempt, url, response.status_code, response.headers.get("Retry-After")):
+                    response.raise_for_status()
+                    return response
+            attempt += 1
+
+    def _query(self, start: datetime, end: datetime):
+        categories = " OR ".join(f"cat:{c}" for c in self.categories)
+        return f"({categories}) AND submittedDate:[{start:%Y%m%d%H%M} TO {end:%Y%m%d}2359]"
+
+    async def list_month(self, start: datetime, end: datetime, max_results: int, queue: asyncio.Queue):
+        """Queues the month's new papers page by page; returns how many were new."""
+        month_key = start.strftime("%Y-%m")
+        since = await asyncio.to_thread(self.manifest.checkpoint, month_key)
+        if since is not None:
+            start = max(start, since.replace(tzinfo=None) + timedelta(minutes=1))
+        query = self._query(start, end)
+        offset, new, newest, empty_pages = 0, 0, None, 0
+        while offset < max_results:
+            response = await self._get(self.api_url, params={
+                "search_query": query, "start": offset,
+                "max_results": min(self.page_size, max_results - offset),
+                "sortBy": "submittedDate", "sortOrder": "ascending"})
+            total, papers = parse_feed(response.text)
+            if not papers:
+                # the API occasionally returns an empty page mid-listing
+                if offset < total and await self._retry(empty_pages, self.api_url, "empty page"):
+                    empty_pages += 1
+                    continue
+                break
+            offset += len(papers)
+            newest = max([p.published for p in papers] + ([newest] if newest else []))
+            if self.catalog is not None:
+                await asyncio.to_thread(self.catalog.add, papers)
+            added = await asyncio.to_thread(self.manifest.add_papers, papers)
+            new += len(added)
+            self.stats["listed"] += len(added)
+            for paper in added:
+                await queue.put(paper)
+            if offset >= total:
+                break
+        if newest is not None:
+            await asyncio.to_thread(self.manifest.set_checkpoint, month_key, newest)
+        return new
+
+    async def fetch_pdf(self, url: str, filepath: str):
+        """Async counterpart of ArxivDownload.fetch_pdf; returns (size, sha256)."""
+        part_path = filepath + ".part"
+        attempt = 0
+        restarted = False
+        while True:
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            retry_after = None
+            try:
+                async with self._slot(url):
+                    async with self.http.stream("GET", url, headers=headers) as response:
+                        if response.status_code == 416:
+                            total = re.search(r"/(\d+)$", response.headers.get("Content-Range", ""))
+                            if total and int(total.group(1)) == offset:
+                                os.replace(part_path, filepath)
+                                return offset, await asyncio.to_thread(file_sha256, filepath)
+                            if offset and not restarted:
+                                # the .part file no longer matches the server's copy
+                                os.remove(part_path)
+                                restarted = True
+                                continue
+                        if response.status_code in RETRY_STATUSES:
+                            retry_after = response.headers.get("Retry-After")
+                            raise httpx.HTTPStatusError(f"HTTP {response.status_code}",
+                                                        request=response.request, response=response)
+                        response.raise_for_status()
+                        if offset and response.status_code != 206:
+                            offset = 0
+                        expected = expected_size(response, offset)
+                        digest = (await asyncio.to_thread(prefix_sha256, part_path, offset)
+                                  if offset else hashlib.sha256())
+                        with open(part_path, "r+b" if offset else "wb") as f:
+                            if offset:
+                                f.seek(offset)
+                                f.truncate()
+                            async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                                f.write(chunk)
+                                digest.update(chunk)
+                size = os.path.getsize(part_path)
+                if expected is not None and size != expected:
+                    raise IncompleteDownload(f"got {size} of {expected} bytes")
+                os.replace(part_path, filepath)
+                return size, digest.hexdigest()
+            except (httpx.TransportError, httpx.HTTPStatusError, IncompleteDownload) as e:
+                if isinstance(e, httpx.HTTPStatusError) and e.response.status_code not in RETRY_STATUSES:
+                    raise
+                if not await self._retry(attempt, url, str(e), retry_after):
+                    raise
+            attempt += 1
+
+    async def download(self, paper: PaperRecord):
+        try:
+            filepath = os.path.join(self.download_dir, paper_relpath(paper))
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            if os.path.exists(filepath):
+                size, sha256 = os.path.getsize(filepath), await asyncio.to_thread(file_sha256, filepath)
+            else:
+                size, sha256 = await self.fetch_pdf(paper.pdf_url, filepath)
+            await asyncio.to_thread(self.manifest.mark_downloaded, paper.arxiv_id, filepath, size, sha256)
+            self.stats["downloaded"] += 1
+        except Exception as e:
+            logging.error(f"Error downloading '{paper.title}': {str(e)}")
+            await asyncio.to_thread(self.manifest.mark_failed, paper.arxiv_id, str(e))
+            self.stats["failed"] += 1
+
+    async def _download_worker(self, queue: asyncio.Queue):
+        while True:
+            paper = await queue.get()
+            try:
+                await self.download(paper)
+            finally:
+                queue.task_done()
+
+    async def run(self, start_date: datetime, end_date: datetime, max_per_month: int = 200):
+        """Lists and downloads the range; returns the number of new papers by month."""
+        os.makedirs(self.download_dir, exist_ok=True)
+        months = month_ranges(start_date, end_date)
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.http = httpx.AsyncClient(timeout=self.timeout, follow_redirects=True)
+        workers = [asyncio.create_task(self._download_worker(queue)) for _ in range(self.workers)]
+        try:
+            pending = await asyncio.to_thread(self.manifest.pending, [m[0].strftime("%Y-%m") for m in months])
+            for paper in pending:
+                await queue.put(paper)
+            results = await asyncio.gather(
+                *(self.list_month(first, last, max_per_month, queue) for first, last in months),
+                return_exceptions=True)
+            new_by_month = {}
+            for (first, _), result in zip(months, results):
+                if isinstance(result, Exception):
+                    logging.error(f"Error fetching papers for {first:%Y-%m}: {result!r}")
+                else:
+                    new_by_month[first.strftime("%Y-%m")] = result
+            await queue.join()
+            return new_by_month
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            await self.http.aclose()
+            self.stats["rate_wait_s"] = round(self.bucket.waited, 2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Download arXiv PDFs for a date range.")
+    parser.add_argument("--start", required=True, type=datetime.fromisoformat, help="YYYY-MM-DD")
+    parser.add_argument("--end", required=True, type=datetime.fromisoformat, help="YYYY-MM-DD")
+    parser.add_argument("--categories", nargs="+", default=["cs.*"])
+    parser.add_argument("--max-per-month", type=int, default=200)
+    parser.add_argument("--out", default="arxiv_papers", help="download directory")
+    parser.add_argument("--manifest", help="manifest path (default OUT/manifest.db)")
+    parser.add_argument("--catalog", help="paper catalog path (default OUT/catalog.db)")
+    parser.add_argument("--gcs-prefix", default=os.environ.get("PAPER_CATALOG_GCS_PREFIX"),
+                        help="bucket the papers are mirrored to, e.g. gs://bucket")
+    parser.add_argument("--rate", type=float, default=4.0, help="requests per second, all hosts")
+    parser.add_argument("--burst", type=float, default=4.0)
+    parser.add_argument("--api-interval", type=float, default=3.0, help="seconds between API pages")
+    parser.add_argument("--per-host", type=int, default=4, help="concurrent connections per host")
+    parser.add_argument("--workers", type=int, default=16, help="concurrent downloads")
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--api-url", default=ARXIV_API_URL)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    os.makedirs(args.out, exist_ok=True)
+    manifest = IngestionManifest(args.manifest or os.path.join(args.out, "manifest.db"))
+    catalog = PaperCatalog(args.catalog or os.path.join(args.out, "catalog.db"), args.out, args.gcs_prefix)
+    downloader = AsyncArxivDownloader(
+        manifest, args.out, api_url=args.api_url, categories=args.categories,
+        rate=args.rate, burst=args.burst, api_interval=args.api_interval,
+        per_host=args.per_host, workers=args.workers, max_retries=args.retries, catalog=catalog)
+    new_by_month = asyncio.run(downloader.run(args.start, args.end, args.max_per_month))
+    for month, count in sorted(new_by_month.items()):
+        print(f"{month}: {count} new papers")
+    print(f"Run: {dict(downloader.stats)}")
+    print(f"Manifest: {manifest.summary()}")
+
+
+if __name__ == "__main__":
+    main()
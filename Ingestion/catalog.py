@@ -0,0 +1,230 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from Ingestion.manifest import PaperRecord, arxiv_id, paper_relpath
+
+
+def normalize_title(title: str):
+    """Accent-, case- and punctuation-insensitive form of a title for exact lookups."""
+    title = unicodedata.normalize("NFKD", title)
+    title = "".join(ch for ch in title if not unicodedata.combining(ch))
+    return " ".join(re.findall(r"\w+", title.casefold()))
+
+
+def fts_query(text: str):
+    """Quote every word so user text can't inject FTS5 query syntax."""
+    return " ".join(f'"{word}"' for word in re.findall(r"\w+", text))
+
+
+class PaperCatalog:
+    """
+    Metadata for every listed paper: id, title, authors, categories,
+    published date, local path and GCS link, in SQLite.
+
+    Lookups by id, normalized title and GCS link go through B-tree indexes
+    (O(log n)); `search` is full-text over titles and authors with FTS5.
+    Paths are where ArxivDownload puts the PDF under `download_dir`, and GCS
+    links the same relative path under `gcs_prefix` (gs://bucket), which is
+    how the bucket the search engine indexes is laid out.
+    """
+
+    COLUMNS = ("arxiv_id", "title", "authors", "categories", "published", "path", "gcs_link")
+
+    def __init__(self, path: str, download_dir: str = None, gcs_prefix: str = None):
+        self.path = path
+        self.download_dir = download_dir
+        self.gcs_prefix = gcs_prefix.rstrip("/") if gcs_prefix else None
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.doc_counts = {}
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS papers (
+                arxiv_id TEXT NOT NULL UNIQUE,
+                title TEXT NOT NULL,
+                norm_title TEXT NOT NULL,
+                authors TEXT NOT NULL,
+                categories TEXT NOT NULL,
+                published TEXT NOT NULL,
+                path TEXT,
+                gcs_link TEXT
+            );
+            CREATE INDEX IF NOT EXISTS papers_norm_title ON papers(norm_title);
+            CREATE INDEX IF NOT EXISTS papers_gcs_link ON papers(gcs_link);
+            CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+                title, authors, content='papers', content_rowid='rowid'
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS papers_vocab USING fts5vocab(papers_fts, 'row');
+            CREATE TRIGGER IF NOT EXISTS papers_ai AFTER INSERT ON papers BEGIN
+                INSERT INTO papers_fts(rowid, title, authors) VALUES (new.rowid, new.title, new.authors);
+            END;
+            CREATE TRIGGER IF NOT EXISTS papers_ad AFTER DELETE ON papers BEGIN
+                INSERT INTO papers_fts(papers_fts, rowid, title, authors)
+                VALUES ('delete', old.rowid, old.title, old.authors);
+            END;
+            CREATE TRIGGER IF NOT EXISTS papers_au AFTER UPDATE ON papers BEGIN
+                INSERT INTO papers_fts(papers_fts, rowid, title, authors)
+                VALUES ('delete', old.rowid, old.title, old.authors);
+                INSERT INTO papers_fts(rowid, title, authors) VALUES (new.rowid, new.title, new.authors);
+            END;
+        """)
+
+    def _connect(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+    def _row(self, paper):
+        if not isinstance(paper, PaperRecord):
+            paper = PaperRecord(arxiv_id(paper), paper.title, paper.published, paper.pdf_url,
+                                tuple(author.name for author in paper.authors), tuple(paper.categories))
+        relpath = paper_relpath(paper)
+        return (paper.arxiv_id, paper.title, normalize_title(paper.title),
+                json.dumps(list(paper.authors)), json.dumps(list(paper.categories)),
+                paper.published.isoformat(),
+                os.path.join(self.download_dir, relpath) if self.download_dir else None,
+                f"{self.gcs_prefix}/{relpath}" if self.gcs_prefix else None)
+
+    def add(self, papers):
+        """Inserts or refreshes listed papers (arxiv.Result or PaperRecord)."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("""
+                INSERT INTO papers(arxiv_id, title, norm_title, authors, categories, published, path, gcs_link)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(arxiv_id) DO UPDATE SET
+                    title = excluded.title, norm_title = excluded.norm_title,
+                    authors = CASE WHEN excluded.authors = '[]' THEN authors ELSE excluded.authors END,
+                    categories = CASE WHEN excluded.categories = '[]' THEN categories ELSE excluded.categories END,
+                    published = excluded.published,
+                    path = COALESCE(excluded.path, path), gcs_link = COALESCE(excluded.gcs_link, gcs_link)
+            """, (self._row(paper) for paper in papers))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        with self.lock:
+            self.doc_counts.clear()
+
+    def _select(self, where: str, params, limit: int = None):
+        query = f"SELECT {', '.join(self.COLUMNS)} FROM papers WHERE {where}"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        rows = self._connect().execute(query, params).fetchall()
+        return [self._record(row) for row in rows]
+
+    def _record(self, row):
+        record = dict(zip(self.COLUMNS, row))
+        record["authors"] = json.loads(record["authors"])
+        record["categories"] = json.loads(record["categories"])
+        return record
+
+    def _select_in(self, column: str, values):
+        values = list(dict.fromkeys(values))
+        found = {}
+        # stay under SQLite's bound-parameter limit
+        for start in range(0, len(values), 500):
+            batch = values[start:start + 500]
+            for record in self._select(f"{column} IN ({','.join('?' * len(batch))})", batch):
+                found.setdefault(record[column] if column != "norm_title"
+                                 else normalize_title(record["title"]), record)
+        return found
+
+    def get(self, paper_id: str):
+        """Paper by arXiv id, with or without a version suffix."""
+        found = self._select("arxiv_id = ?", (re.sub(r"v\d+$", "", paper_id),))
+        return found[0] if found else None
+
+    def by_title(self, title: str, limit: int = 10):
+        return self._select("norm_title = ?", (normalize_title(title),), limit)
+
+    def by_link(self, link: str):
+        found = self._select("gcs_link = ?", (link,), 1)
+        return found[0] if found else None
+
+    def by_titles(self, titles):
+        """One query for many titles: {normalized title: paper} for those found."""
+        return self._select_in("norm_title", (normalize_title(t) for t in titles))
+
+    def by_links(self, links):
+        """One query for many GCS links: {link: paper} for those found."""
+        return self._select_in("gcs_link", links)
+
+    def _check_doc_counts(self):
+        """Drops cached document counts once another connection has written to the catalog."""
+        version = self._connect().execute("PRAGMA data_version").fetchone()[0]
+        # a thread's first check cannot tell what it missed, so it clears too
+        if getattr(self.local, "data_version", None) != version:
+            with self.lock:
+                self.doc_counts.clear()
+        self.local.data_version = version
+
+    def term_docs(self, term: str):
+        """
+        How many papers contain the word, cached: counting a common word reads
+        its whole posting list. add clears the cache, as does similar_titles
+        once another process (a running downloader) has added papers.
+        """
+        docs = self.doc_counts.get(term)
+        if docs is None:
+            row = self._connect().execute("SELECT doc FROM papers_vocab WHERE term = ?", (term,)).fetchone()
+            docs = row[0] if row else 0
+            with self.lock:
+                if len(self.doc_counts) >= 100_000:
+                    self.doc_counts.clear()
+                self.doc_counts[term] = docs
+        return docs
+
+    def similar_titles(self, title: str, k: int = 5, terms: int = 2, max_postings: int = 20000):
+        """
+        Candidate papers for a possibly garbled title: titles containing all
+        of its `terms` rarest words (by document frequency), best bm25 first.
+        The cost is bounded by the length of those words' posting lists, so
+        a title made only of common words (more than `max_postings` between
+        them) gets no candidates rather than a slow scan.
+        """
+        self._check_doc_counts()
+        words = set(re.findall(r"\w+", normalize_title(title)))
+        rare = sorted((w for w in words if self.term_docs(w)), key=self.term_docs)[:terms]
+        if not rare or sum(self.term_docs(w) for w in rare) > max_postings:
+            return []
+        return self._match("title : (" + " AND ".join(f'"{term}"' for term in rare) + ")", k)
+
+    def search(self, text: str, k: int = 10):
+        """Best full-text matches over title and authors, by FTS5 bm25 rank."""
+        query = fts_query(text)
+        return self._match(query, k) if query else []
+
+    def _match(self, query: str, k: int):
+        # rank in the FTS table alone, then fetch the k winners: joining
+        # papers into the ranked query makes SQLite read every matching row
+        conn = self._connect()
+        rowids = [row[0] for row in conn.execute(
+            "SELECT rowid FROM papers_fts WHERE papers_fts MATCH ? ORDER BY rank LIMIT ?", (query, k))]
+        if not rowids:
+            return []
+        rows = conn.execute(f"SELECT rowid, {', '.join(self.COLUMNS)} FROM papers "
+                            f"WHERE rowid IN ({','.join('?' * len(rowids))})", rowids).fetchall()
+        by_rowid = {row[0]: self._record(row[1:]) for row in rows}
+        return [by_rowid[rowid] for rowid in rowids if rowid in by_rowid]
+
+
+def catalog_from_env(download_dir: str = None):
+    """
+    The catalog at PAPER_CATALOG_DB, or None when it is unset;
+    PAPER_CATALOG_GCS_PREFIX (e.g. gs://bucket) is where its papers are mirrored.
+    """
+    path = os.environ.get("PAPER_CATALOG_DB")
+    if not path:
+        return None
+    return PaperCatalog(path, download_dir, os.environ.get("PAPER_CATALOG_GCS_PREFIX"))
@@ -0,0 +1,330 @@
+"""
+Text extraction stage that runs after ArxivDownload.py: turns
+arxiv_papers/YYYY-MM/*.pdf into section-aware, token-bounded chunks stored
+column-wise with NumPy.
+
+    python -m Ingestion.extract --papers arxiv_papers --out extracted --workers 8
+"""
+import argparse
+import concurrent.futures
+import glob
+import json
+import logging
+import os
+import re
+import time
+import numpy as np
+from pypdf import PdfReader
+from tqdm import tqdm
+from Ingestion.manifest import file_sha256
+
+FORMAT_VERSION = 1
+
+# Section codes stored in the chunk_section column.
+SECTIONS = ["front", "abstract", "introduction", "related_work", "methods", "experiments",
+            "results", "discussion", "conclusion", "acknowledgements", "references", "appendix"]
+
+SECTION_HEADINGS = {
+    "abstract": "abstract",
+    "introduction": "introduction",
+    "related work": "related_work", "background": "related_work", "preliminaries": "related_work",
+    "method": "methods", "methods": "methods", "methodology": "methods", "approach": "methods",
+    "proposed method": "methods", "our approach": "methods",
+    "experiment": "experiments", "experiments": "experiments", "experimental setup": "experiments",
+    "experimental results": "results", "evaluation": "experiments",
+    "results": "results", "results and discussion": "results",
+    "discussion": "discussion", "limitations": "discussion",
+    "conclusion": "conclusion", "conclusions": "conclusion", "concluding remarks": "conclusion",
+    "conclusion and future work": "conclusion", "conclusions and future work": "conclusion",
+    "acknowledgement": "acknowledgements", "acknowledgements": "acknowledgements",
+    "acknowledgment": "acknowledgements", "acknowledgments": "acknowledgements",
+    "references": "references", "bibliography": "references",
+    "appendix": "appendix", "appendices": "appendix",
+}
+
+# "3 Methods", "III. Results", "5.1 Discussion", "Conclusions:"
+HEADING_RE = re.compile(r"^(?:(?:\d+(?:\.\d+)*|[IVX]+)\.?\s+)?([A-Za-z][A-Za-z ]{2,40}?)\s*[.:]?$")
+# "Abstract—We propose ...", "Abstract. We ..."
+INLINE_ABSTRACT_RE = re.compile(r"^abstract\s*[.:—–-]\s*(.+)$", re.IGNORECASE)
+
+DEFAULT_SKIP = ("acknowledgements", "references")
+
+
+def section_of(line: str):
+    """Canonical section name if the line is a known section heading, else None."""
+    match = HEADING_RE.match(line.strip())
+    if match is None:
+        return None
+    return SECTION_HEADINGS.get(re.sub(r"\s+", " ", match.group(1)).strip().lower())
+
+
+def split_sections(pages):
+    """
+    Splits page texts into [(section, words, word_pages)] runs, starting a new
+    run at every recognised heading line. Text before the first heading is
+    "front" (title, authors); unrecognised headings stay in the current run.
+    """
+    runs = []
+    section, words, word_pages = "front", [], []
+    for page_number, text in enumerate(pages):
+        for line in text.splitlines():
+            heading = section_of(line)
+            inline = INLINE_ABSTRACT_RE.match(line.strip()) if heading is None else None
+            if heading is not None or inline is not None:
+                if words:
+                    runs.append((section, words, word_pages))
+                section, words, word_pages = heading or "abstract", [], []
+                if inline is None:
+                    continue
+                line = inline.group(1)
+            line_words = line.split()
+            if words and words[-1].endswith("-") and line_words and line_words[0][:1].islower():
+                # re-join a word hyphenated across a line break
+                words[-1] = words[-1][:-1] + line_words.pop(0)
+            words.extend(line_words)
+            word_pages.extend([page_number] * len(line_words))
+    if words:
+        runs.append((section, words, word_pages))
+    return runs
+
+
+def chunk_section(words, word_pages, max_tokens: int = 256, overlap_tokens: int = 32):
+    """
+    Yields (first_page, text) chunks of at most ~max_tokens tokens, each
+    starting ~overlap_tokens before the previous one ended. Tokens are
+    estimated at 4 characters each, like Chatbot.sessions.estimate_tokens.
+    """
+    budget, overlap = max_tokens * 4, overlap_tokens * 4
+    start, n = 0, len(words)
+    while start < n:
+        end, chars = start, 0
+        while end < n and (end == start or chars + len(words[end]) + 1 <= budget):
+            chars += len(words[end]) + 1
+            end += 1
+        yield word_pages[start], " ".join(words[start:end])
+        if end >= n:
+            break
+        back, chars = end, 0
+        while back > start + 1 and chars + len(words[back - 1]) + 1 <= overlap:
+            back -= 1
+            chars += len(words[back]) + 1
+        start = back
+
+
+def process_pdf(path: str, max_tokens: int = 256, overlap_tokens: int = 32, skip_sections=DEFAULT_SKIP):
+    """
+    Worker entry point: extracts one PDF and returns its pages, SHA-256 and
+    [(section_code, first_page, text)] chunks, or the error message.
+    """
+    result = {"path": path, "pages": 0, "sha256": None, "chunks": [], "error": None}
+    try:
+        result["sha256"] = file_sha256(path)
+        pages = [page.extract_text() or "" for page in PdfReader(path).pages]
+        result["pages"] = len(pages)
+        for section, words, word_pages in split_sections(pages):
+            if section in skip_sections:
+                continue
+            code = SECTIONS.index(section)
+            for page, text in chunk_section(words, word_pages, max_tokens, overlap_tokens):
+                result["chunks"].append((code, page, text))
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+class ExtractedCorpus:
+    """
+    Reader for an extraction directory. Chunk columns are memory-mapped
+    .npy files (text byte offsets, paper index, section code, first page)
+    plus one UTF-8 blob of chunk texts; papers.json lists every paper with
+    its file stamp and its [chunk_start, chunk_end) range.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, "papers.json")) as f:
+            self.meta = json.load(f)
+        self.papers = self.meta["papers"]
+        generation = self.meta["generation"]
+        self.offsets = self._column("chunk_offsets", generation)
+        self.paper_ids = self._column("chunk_paper", generation)
+        self.sections = self._column("chunk_section", generation)
+        self.pages = self._column("chunk_page", generation)
+        blob = os.path.join(directory, f"chunk_text.{generation}.bin")
+        self.text_blob = np.memmap(blob, dtype=np.uint8, mode="r") if os.path.getsize(blob) \
+            else np.empty(0, dtype=np.uint8)
+
+    def _column(self, name, generation):
+        return np.load(os.path.join(self.directory, f"{name}.{generation}.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.paper_ids)
+
+    def text(self, chunk_id: int):
+        return bytes(self.text_blob[self.offsets[chunk_id]:self.offsets[chunk_id + 1]]).decode()
+
+    def chunk(self, chunk_id: int):
+        paper = self.papers[int(self.paper_ids[chunk_id])]
+        return {"path": paper["path"], "title": paper["title"],
+                "section": SECTIONS[self.sections[chunk_id]], "page": int(self.pages[chunk_id]),
+                "text": self.text(chunk_id)}
+
+    def __iter__(self):
+        for chunk_id in range(len(self)):
+            yield self.chunk(chunk_id)
+
+    @staticmethod
+    def exists(directory: str):
+        return os.path.exists(os.path.join(directory, "papers.json"))
+
+
+class _ColumnWriter:
+    """Appends chunks to the next generation's column files."""
+
+    def __init__(self, directory: str, generation: int):
+        self.directory = directory
+        self.generation = generation
+        self.blob = open(os.path.join(directory, f"chunk_text.{generation}.bin"), "wb")
+        self.offsets = [0]
+        self.paper_ids, self.sections, self.pages = [], [], []
+
+    def add(self, paper_id: int, section: int, page: int, data: bytes):
+        self.blob.write(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+        self.paper_ids.append(paper_id)
+        self.sections.append(section)
+        self.pages.append(page)
+
+    def __len__(self):
+        return len(self.paper_ids)
+
+    def close(self):
+        self.blob.close()
+        for name, values, dtype in (("chunk_offsets", self.offsets, np.int64),
+                                    ("chunk_paper", self.paper_ids, np.int32),
+                                    ("chunk_section", self.sections, np.uint8),
+                                    ("chunk_page", self.pages, np.int32)):
+            np.save(os.path.join(self.directory, f"{name}.{self.generation}.npy"),
+                    np.asarray(values, dtype=dtype))
+
+
+def extract_corpus(papers_dir: str, out_dir: str, workers: int = None,
+                   max_tokens: int = 256, overlap_tokens: int = 32, skip_sections=DEFAULT_SKIP):
+    """
+    Extracts every PDF under papers_dir/*/ into out_dir and returns run stats.
+
+    Incremental: a paper whose mtime and size match the previous run, or
+    whose SHA-256 does despite a new mtime, keeps its chunks without being
+    parsed again; papers that failed to parse are only retried once their
+    file changes. Changing the chunking settings re-extracts everything.
+    Each run writes a new generation of column files and switches to it by
+    replacing papers.json, so readers never see a half-written corpus.
+    """
+    started = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+    settings = {"max_tokens": max_tokens, "overlap_tokens": overlap_tokens,
+                "skip_sections": sorted(skip_sections)}
+    previous = ExtractedCorpus(out_dir) if ExtractedCorpus.exists(out_dir) else None
+    if previous is not None and (previous.meta.get("version") != FORMAT_VERSION
+                                 or previous.meta.get("settings") != settings):
+        previous = None
+    old_entries = {p["path"]: (i, p) for i, p in enumerate(previous.papers)} if previous else {}
+    generation = previous.meta["generation"] + 1 if previous else 1
+
+    papers, stale = [], []
+    for path in sorted(glob.glob(os.path.join(papers_dir, "*", "*.pdf"))):
+        rel = os.path.relpath(path, papers_dir)
+        stat = os.stat(path)
+        entry = {"path": rel, "title": os.path.splitext(os.path.basename(path))[0],
+                 "mtime": stat.st_mtime, "size": stat.st_size}
+        old_id, old = old_entries.get(rel, (None, None))
+        if old is not None and old["size"] == stat.st_size and (
+                old["mtime"] == stat.st_mtime or old["sha256"] == file_sha256(path)):
+            entry.update(sha256=old["sha256"], pages=old["pages"], error=old["error"], reuse=old_id)
+        else:
+            stale.append(len(papers))
+        papers.append(entry)
+
+    writer = _ColumnWriter(out_dir, generation)
+    stats = {"papers": len(papers), "extracted": len(stale), "reused": len(papers) - len(stale),
+             "failed": 0, "pages": 0}
+    try:
+        for paper_id, entry in enumerate(papers):
+            old_id = entry.pop("reuse", None)
+            if old_id is None:
+                continue
+            old = previous.papers[old_id]
+            entry["chunk_start"] = len(writer)
+            for chunk_id in range(old["chunk_start"], old["chunk_end"]):
+                writer.add(paper_id, int(previous.sections[chunk_id]), int(previous.pages[chunk_id]),
+                           bytes(previous.text_blob[previous.offsets[chunk_id]:previous.offsets[chunk_id + 1]]))
+            entry["chunk_end"] = len(writer)
+
+        extract_started = time.perf_counter()
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(process_pdf, os.path.join(papers_dir, papers[i]["path"]),
+                                       max_tokens, overlap_tokens, tuple(skip_sections)): i
+                       for i in stale}
+            for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures),
+                               desc="Extracting papers", unit="paper"):
+                paper_id = futures[future]
+                result = future.result()
+                entry = papers[paper_id]
+                entry.update(sha256=result["sha256"], pages=result["pages"], error=result["error"])
+                if result["error"]:
+                    logging.error(f"Error extracting '{entry['path']}': {result['error']}")
+                    stats["failed"] += 1
+                stats["pages"] += result["pages"]
+                entry["chunk_start"] = len(writer)
+                for section, page, text in result["chunks"]:
+                    writer.add(paper_id, section, page, text.encode())
+                entry["chunk_end"] = len(writer)
+        extract_seconds = time.perf_counter() - extract_started
+    finally:
+        writer.close()
+
+    meta = {"version": FORMAT_VERSION, "generation": generation, "settings": settings, "papers": papers}
+    tmp_path = os.path.join(out_dir, "papers.json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(out_dir, "papers.json"))
+    if previous is not None:
+        for name in glob.glob(os.path.join(out_dir, f"chunk_*.{previous.meta['generation']}.*")):
+            os.remove(name)
+
+    stats["chunks"] = len(writer)
+    stats["seconds"] = time.perf_counter() - started
+    stats["pages_per_sec"] = stats["pages"] / extract_seconds if stats["pages"] else 0.0
+    return stats
+
+
+def iter_extracted_chunks(directory: str, link_prefix: str = "", papers_dir: str = "arxiv_papers"):
+    """Chunk dicts for Retrieval.build_index from an extraction directory."""
+    for chunk in ExtractedCorpus(directory):
+        path = chunk["path"].replace(os.sep, "/")
+        link = f"{link_prefix.rstrip('/')}/{path}" if link_prefix else os.path.join(papers_dir, chunk["path"])
+        yield {"title": chunk["title"], "link": link, "text": chunk["text"],
+               "section": chunk["section"], "page": chunk["page"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract and chunk downloaded arXiv PDFs.")
+    parser.add_argument("--papers", default="arxiv_papers")
+    parser.add_argument("--out", default="extracted")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: CPU count)")
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument("--overlap-tokens", type=int, default=32)
+    parser.add_argument("--keep-sections", nargs="*", default=[], choices=SECTIONS,
+                        help="also chunk sections skipped by default: " + ", ".join(DEFAULT_SKIP))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    skip = [s for s in DEFAULT_SKIP if s not in args.keep_sections]
+    stats = extract_corpus(args.papers, args.out, args.workers, args.max_tokens, args.overlap_tokens, skip)
+    print(f"{stats['papers']} papers: {stats['extracted']} extracted ({stats['failed']} failed), "
+          f"{stats['reused']} unchanged; {stats['chunks']} chunks in {stats['seconds']:.1f}s, "
+          f"{stats['pages_per_sec']:.1f} pages/s")
+
+
+if __name__ == "__main__":
+    main()
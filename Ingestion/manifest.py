@@ -0,0 +1,148 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+
+# The attributes download_paper needs, shared with arxiv.Result so either can
+# be downloaded. authors and categories are only filled in by listings that
+# have them, for the PaperCatalog.
+PaperRecord = namedtuple("PaperRecord", ["arxiv_id", "title", "published", "pdf_url", "authors", "categories"],
+                         defaults=((), ()))
+
+
+def arxiv_id(paper):
+    """Version-less short id, e.g. 2101.00001 for http://arxiv.org/abs/2101.00001v2."""
+    return re.sub(r"v\d+$", "", paper.get_short_id())
+
+
+def sanitize_filename(title: str) -> str:
+    """Convert title to a valid filename."""
+    invalid_chars = '<>:"/\\|?*'
+    filename = ''.join(char if char not in invalid_chars else '_' for char in title)
+    return filename[:150]
+
+
+def paper_relpath(paper):
+    """Where a paper's PDF lives under the download directory (and the bucket)."""
+    return f"{paper.published.strftime('%Y-%m')}/{sanitize_filename(paper.title)}.pdf"
+
+
+def file_sha256(path: str, block_size: int = 1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestionManifest:
+    """
+    Persistent record of the arXiv corpus, keyed on arXiv id.
+
+    Every listed paper gets a row with its status (pending, downloaded or
+    failed), local path, size and SHA-256, and every month keeps a
+    checkpoint: the newest submission date already listed. A run lists only
+    submissions after the checkpoint and downloads whatever is still pending
+    or failed, so an interrupted run resumes where it stopped.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.local = threading.local()
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS papers (
+                arxiv_id TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                published TEXT NOT NULL,
+                month TEXT NOT NULL,
+                pdf_url TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                path TEXT,
+                size INTEGER,
+                sha256 TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS papers_month_status ON papers(month, status);
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                month TEXT PRIMARY KEY,
+                last_published TEXT NOT NULL
+            );
+        """)
+
+    def _connect(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def checkpoint(self, month: str):
+        row = self._connect().execute(
+            "SELECT last_published FROM checkpoints WHERE month = ?", (month,)).fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def set_checkpoint(self, month: str, last_published: datetime):
+        self._connect().execute("""
+            INSERT INTO checkpoints(month, last_published) VALUES (?, ?)
+            ON CONFLICT(month) DO UPDATE SET last_published = MAX(last_published, excluded.last_published)
+        """, (month, last_published.isoformat()))
+
+    def add_papers(self, papers):
+        """
+        Registers listed papers (arxiv.Result or PaperRecord) as pending;
+        returns the records that were new.
+        """
+        conn = self._connect()
+        now = time.time()
+        added = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for paper in papers:
+                record = paper if isinstance(paper, PaperRecord) else PaperRecord(
+                    arxiv_id(paper), paper.title, paper.published, paper.pdf_url)
+                cursor = conn.execute("""
+                    INSERT OR IGNORE INTO papers(arxiv_id, title, published, month, pdf_url, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (record.arxiv_id, record.title, record.published.isoformat(),
+                      record.published.strftime("%Y-%m"), record.pdf_url, now))
+                if cursor.rowcount:
+                    added.append(record)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def pending(self, months=None):
+        """Papers not yet downloaded (pending or failed), optionally limited to some months."""
+        query = "SELECT arxiv_id, title, published, pdf_url FROM papers WHERE status != 'downloaded'"
+        params = []
+        if months is not None:
+            months = list(months)
+            query += f" AND month IN ({','.join('?' * len(months))})"
+            params = months
+        rows = self._connect().execute(query + " ORDER BY published", params).fetchall()
+        return [PaperRecord(r[0], r[1], datetime.fromisoformat(r[2]), r[3]) for r in rows]
+
+    def mark_downloaded(self, paper_id: str, path: str, size: int, sha256: str):
+        self._connect().execute("""
+            UPDATE papers SET status = 'downloaded', path = ?, size = ?, sha256 = ?, error = NULL,
+            updated_at = ? WHERE arxiv_id = ?
+        """, (path, size, sha256, time.time(), paper_id))
+
+    def mark_failed(self, paper_id: str, error: str):
+        self._connect().execute(
+            "UPDATE papers SET status = 'failed', error = ?, updated_at = ? WHERE arxiv_id = ?",
+            (error, time.time(), paper_id))
+
+    def summary(self):
+        rows = self._connect().execute(
+            "SELECT status, COUNT(*), COALESCE(SUM(size), 0) FROM papers GROUP BY status").fetchall()
+        return {status: {"papers": count, "bytes": size} for status, count, size in rows}
@@ -0,0 +1,301 @@
+import asyncio
+import json
+import math
+import os
+import time
+from bisect import insort
+from collections import OrderedDict
+
+# route path -> request class; only these routes are admission controlled
+ROUTE_CLASSES = {
+    "/chatbot": "chat",
+    "/chatbot/stream": "chat",
+    "/generate/submit/extra-suggestions/": "improve",
+    "/recommend/suggested/": "recommend",
+    "/generate/submit/": "generate",
+    "/generate/submit/stream/": "generate",
+}
+
+
+class Rejected(Exception):
+    def __init__(self, status: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class RequestClass:
+    """
+    Admission policy of one kind of request: at most `limit` run at once,
+    waiters are served in `priority` order (lower first), and none waits
+    longer than `max_wait` seconds. `service_seconds` is the expected time
+    a request holds its slot until there are measurements to go by.
+    """
+
+    def __init__(self, name: str, limit: int, priority: int, max_wait: float, service_seconds: float = None):
+        self.name = name
+        self.limit = limit
+        self.priority = priority
+        self.max_wait = max_wait
+        self.in_flight = 0
+        # moving average of how long a request holds its slot
+        self.service_seconds = service_seconds
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "deadline": 0, "timeout": 0, "shed": 0, "rate_limited": 0}
+
+    def observe(self, seconds: float):
+        if self.service_seconds is None:
+            self.service_seconds = seconds
+        else:
+            self.service_seconds += 0.2 * (seconds - self.service_seconds)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float):
+        """0 if a token was taken, else the seconds until one is available."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """
+    Bounds the LLM-backed work one worker takes on. It is used from the
+    worker's event loop only, so it needs no locks.
+
+    At most `capacity` requests run at once in total, and each request
+    class has its own limit within that. A request that cannot start waits
+    in one queue of at most `queue_size`, ordered by class priority, so
+    interactive chat overtakes queued idea generation. When the queue is
+    full, a request sheds the newest waiter of a lower priority class, or is
+    rejected itself. It is also rejected straight away when its expected
+    wait (its place in the queue times its class's recent service time)
+    exceeds the class's max_wait, and if it is still queued after max_wait.
+    A rejection is a fast 503 with Retry-After instead of a request that
+    piles more work on Mistral and times out later.
+
+    With `rate`, each client (by X-Forwarded-For or peer address) also has
+    a token bucket of `burst` requests refilled at `rate` per second; an
+    empty bucket gets a 429. At most `max_clients` buckets are kept.
+    """
+
+    def __init__(self, classes: dict, capacity: int = 16, queue_size: int = 64,
+                 rate: float = 0.0, burst: float = 10.0, max_clients: int = 10000):
+        self.classes = classes
+        self.capacity = capacity
+        self.queue_size = queue_size
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()
+        self.in_flight = 0
+        # sorted [priority, seq, request class, future]
+        self.waiters = []
+        self.seq = 0
+
+    def _can_start(self, request_class: RequestClass):
+        return self.in_flight < self.capacity and request_class.in_flight < request_class.limit
+
+    def _start(self, request_class: RequestClass):
+        self.in_flight += 1
+        request_class.in_flight += 1
+        request_class.admitted += 1
+
+    def _dispatch(self):
+        for waiter in list(self.waiters):
+            if self.in_flight >= self.capacity:
+                break
+            request_class, future = waiter[2], waiter[3]
+            if request_class.in_flight < request_class.limit:
+                self.waiters.remove(waiter)
+                self._start(request_class)
+                future.set_result(None)
+
+    def _expected_wait(self, request_class: RequestClass):
+        if request_class.service_seconds is None:
+            return 0.0
+        ahead = sum(1 for waiter in self.waiters if waiter[0] <= request_class.priority)
+        slots = min(self.capacity, request_class.limit)
+        return (ahead + 1) / slots * request_class.service_seconds
+
+    def _shed_for(self, request_class: RequestClass):
+        """Rejects the newest waiter of the lowest class below `request_class`; False if there is none."""
+        if not self.waiters:
+            return False
+        victim = self.waiters[-1]
+        if victim[0] <= request_class.priority:
+            return False
+        self.waiters.pop()
+        victim[2].rejected["shed"] += 1
+        victim[3].set_exception(Rejected(503, "shed", victim[2].max_wait))
+        return True
+
+    def rate_limit(self, client: str, request_class: RequestClass):
+        if not self.rate:
+            return
+        now = time.monotonic()
+        bucket = self.buckets.get(client)
+        if bucket is None:
+            bucket = self.buckets[client] = TokenBucket(self.rate, self.burst, now)
+            if len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(client)
+        wait = bucket.take(now)
+        if wait:
+            request_class.rejected["rate_limited"] += 1
+            raise Rejected(429, "rate_limited", wait)
+
+    async def acquire(self, request_class: RequestClass):
+        """Returns once the request may run (call release() after); raises Rejected otherwise."""
+        # waiters are dispatched as soon as slots free up, so any still
+        # queued are held back by their own class's limit
+        if self._can_start(request_class):
+            self._start(request_class)
+            return
+        expected = self._expected_wait(request_class)
+        if expected > request_class.max_wait:
+            request_class.rejected["deadline"] += 1
+            raise Rejected(503, "deadline", expected)
+        if len(self.waiters) >= self.queue_size and not self._shed_for(request_class):
+            request_class.rejected["queue_full"] += 1
+            raise Rejected(503, "queue_full", request_class.max_wait)
+
+        future = asyncio.get_running_loop().create_future()
+        self.seq += 1
+        waiter = [request_class.priority, self.seq, request_class, future]
+        insort(self.waiters, waiter, key=lambda w: (w[0], w[1]))
+        try:
+            await asyncio.wait_for(asyncio.shield(future), request_class.max_wait)
+        except asyncio.TimeoutError:
+            if not future.done():
+                self.waiters.remove(waiter)
+                request_class.rejected["timeout"] += 1
+                raise Rejected(503, "timeout", request_class.max_wait)
+            # granted or shed just as the wait ran out
+            if future.exception() is not None:
+                raise future.exception()
+        except asyncio.CancelledError:
+            # the client went away while queued
+            if not future.done():
+                self.waiters.remove(waiter)
+            elif future.exception() is None:
+                self.release(request_class, None)
+            raise
+
+    def release(self, request_class: RequestClass, seconds: float):
+        self.in_flight -= 1
+        request_class.in_flight -= 1
+        if seconds is not None:
+            request_class.observe(seconds)
+        self._dispatch()
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "queued": len(self.waiters),
+            "classes": {name: {"in_flight": c.in_flight, "admitted": c.admitted, "rejected": dict(c.rejected),
+                               "service_seconds": c.service_seconds}
+                        for name, c in self.classes.items()}
+        }
+
+    def register_metrics(self, metrics):
+        metrics.callback("inspireit_admission_in_flight", "Admitted LLM-backed requests running, by class.",
+                         "gauge", ["class"], lambda: [((name,), c.in_flight) for name, c in self.classes.items()])
+        metrics.callback("inspireit_admission_queued", "LLM-backed requests waiting for a slot.",
+                         "gauge", [], lambda: [((), len(self.waiters))])
+        metrics.callback("inspireit_admission_admitted_total", "LLM-backed requests admitted, by class.",
+                         "counter", ["class"], lambda: [((name,), c.admitted) for name, c in self.classes.items()])
+        metrics.callback("inspireit_admission_rejected_total", "LLM-backed requests turned away, by class and reason.",
+                         "counter", ["class", "reason"],
+                         lambda: [((name, reason), count) for name, c in self.classes.items()
+                                  for reason, count in c.rejected.items()])
+
+
+def client_key(scope):
+    for name, value in scope.get("headers", ()):
+        if name == b"x-forwarded-for":
+            return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware that runs requests to the routes in ROUTE_CLASSES
+    through an AdmissionController. A request holds its slot until its
+    response has been sent, to the end of a stream.
+    """
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        request_class = self.controller.classes.get(ROUTE_CLASSES.get(scope.get("path")))
+        if scope["type"] != "http" or request_class is None:
+            return await self.app(scope, receive, send)
+        try:
+            self.controller.rate_limit(client_key(scope), request_class)
+            await self.controller.acquire(request_class)
+        except Rejected as e:
+            return await self.reject(send, e)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(request_class, time.perf_counter() - started)
+
+    async def reject(self, send, rejection: Rejected):
+        retry_after = max(1, math.ceil(rejection.retry_after))
+        error = "Too many requests" if rejection.status == 429 else "Server busy, retry later"
+        body = json.dumps({"error": error, "reason": rejection.reason, "retry_after": retry_after}).encode()
+        await send({"type": "http.response.start", "status": rejection.status,
+                    "headers": [(b"content-type", b"application/json"),
+                                (b"content-length", str(len(body)).encode()),
+                                (b"retry-after", str(retry_after).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+
+def _per_class(value: str, cast):
+    return {name.strip(): cast(number) for name, number in
+            (item.split("=") for item in value.split(",") if item.strip())}
+
+
+def admission_from_env():
+    """
+    Off (None) unless ADMISSION=1. Then, per worker process: ADMISSION_CAPACITY
+    concurrent LLM-backed requests in total, ADMISSION_LIMITS per class
+    ("chat=16,improve=8,recommend=8,generate=6"), ADMISSION_QUEUE waiters,
+    ADMISSION_MAX_WAIT seconds of queueing for generation (chat gets a
+    quarter of it), ADMISSION_SERVICE_SECONDS the expected request times
+    before any are measured, and RATE_LIMIT_RPS / RATE_LIMIT_BURST per
+    client (0 = no rate limit).
+    """
+    if os.environ.get("ADMISSION", "0") != "1":
+        return None
+    capacity = int(os.environ.get("ADMISSION_CAPACITY", 16))
+    limits = _per_class(os.environ.get("ADMISSION_LIMITS", "chat=16,improve=8,recommend=8,generate=6"), int)
+    service = _per_class(os.environ.get("ADMISSION_SERVICE_SECONDS",
+                                        "chat=5,improve=15,recommend=15,generate=20"), float)
+    max_wait = float(os.environ.get("ADMISSION_MAX_WAIT", 20))
+    classes = {name: RequestClass(name, limits.get(name, capacity), priority,
+                                  max_wait / 4 if name == "chat" else max_wait, service.get(name))
+               for name, priority in (("chat", 0), ("improve", 1), ("recommend", 1), ("generate", 2))}
+    return AdmissionController(
+        classes,
+        capacity=capacity,
+        queue_size=int(os.environ.get("ADMISSION_QUEUE", 64)),
+        rate=float(os.environ.get("RATE_LIMIT_RPS", 0)),
+        burst=float(os.environ.get("RATE_LIMIT_BURST", 10))
+    )
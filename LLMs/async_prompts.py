@@ -0,0 +1,295 @@
+import asyncio
+import time
+from LLMs.prompts import IDEA_COUNT, MistralChat
+from LLMs.context import merge_triples
+from LLMs.search_client import AsyncSearchClient
+from LLMs.single_flight import AsyncSingleFlight, flight_key
+from LLMs.routing import retryable
+from LLMs.streaming import JSONArrayStreamParser
+from Chatbot.sessions import new_session_id
+
+
+class AsyncMistralChat(MistralChat):
+    """
+    Non-blocking variant of MistralChat for the FastAPI routes.
+
+    Discovery Engine searches go through a pooled AsyncSearchClient and
+    completions use Mistral's async API, so a slow call only suspends its own
+    request instead of the whole uvicorn worker. Prompt construction and
+    response parsing are inherited unchanged from MistralChat.
+    """
+
+    search_client_class = AsyncSearchClient
+    single_flight_class = AsyncSingleFlight
+
+    async def aclose(self):
+        self.credentials.stop()
+        await self.search_client.aclose()
+
+    async def _cache(self, method, *args):
+        # the shared disk tier is SQLite; a memory-only cache stays inline
+        if self.retrieval_cache.disk_path:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def _search(self, query: str, page_size: int):
+        key = self._search_cache_key(query, page_size)
+        with self.metrics.stage("search"):
+            triples = await self._cache(self.retrieval_cache.get, key)
+            if triples is None:
+                with self.metrics.stage("retrieval"):
+                    self.metrics.search_in_flight.inc()
+                    try:
+                        if self.retriever is not None:
+                            triples = await asyncio.to_thread(self.retriever.search, query, page_size)
+                        else:
+                            payload = self._search_payload(query, page_size)
+                            headers = self._auth_headers(await self.credentials.get_token_async())
+                            response_json = await self.search_client.search(payload, headers)
+                            triples = self.snippet_triples(response_json)
+                    finally:
+                        self.metrics.search_in_flight.dec()
+                await self._cache(self.retrieval_cache.put, key, triples)
+        return triples
+
+    async def _search_all(self, searches: list):
+        if len(searches) == 1:
+            return await self._search(*searches[0])
+        return merge_triples(await asyncio.gather(*(self._search(query, page_size)
+                                                    for query, page_size in searches)))
+
+    def _warm(self, endpoint: str):
+        self.warmer.warm_async(self.router.client_for(self.router.select(endpoint, [])))
+
+    async def _fix_references(self, fix, result):
+        # catalog lookups are SQLite queries; snippet-only checks stay inline
+        with self.metrics.stage("references"):
+            if self.references.catalog is not None:
+                return await asyncio.to_thread(fix, result)
+            return fix(result)
+
+    async def _complete(self, messages: list, endpoint: str, json_mode: bool = False):
+        return (await self._complete_routed(messages, endpoint, json_mode))[0]
+
+    async def _complete_routed(self, messages: list, endpoint: str, json_mode: bool = False):
+        async def call(client, model, timeout):
+            with self.metrics.stage("completion", model=model):
+                self.metrics.llm_in_flight.inc()
+                try:
+                    response = await client.chat.complete_async(
+                        model=model,
+                        messages=messages,
+                        response_format=self._response_format(json_mode),
+                        timeout_ms=int(timeout * 1000) if timeout else None
+                    )
+                finally:
+                    self.metrics.llm_in_flight.dec()
+            self.metrics.add_tokens(response.usage)
+            return response.choices[0].message.content
+        return await self.router.complete_async(call, endpoint, messages)
+
+    async def _complete_json(self, messages: list, endpoint: str, semantic_text: str = None):
+        model = self.router.select(endpoint, messages)
+        result = self.completion_cache.get(endpoint, model, messages, semantic_text)
+        if result is None:
+            content, answered = await self._complete_routed(messages, endpoint, json_mode=True)
+            result, truncated = self._parse_json_checked(content, endpoint)
+            if "error" not in result and not truncated and answered == model:
+                self.completion_cache.put(endpoint, model, messages, result, semantic_text)
+        return result
+
+    async def _open_stream(self, messages: list, endpoint: str, json_mode: bool):
+        """Opens the completion stream, moving down the model's fallback tiers if that fails."""
+        tiers = self.router.tiers(self.router.select(endpoint, messages))
+        for i, model in enumerate(tiers):
+            timeout = self.router.timeout_for(model)
+            try:
+                return await self.router.client_for(model).chat.stream_async(
+                    model=model,
+                    messages=messages,
+                    response_format=self._response_format(json_mode),
+                    timeout_ms=int(timeout * 1000) if timeout else None
+                )
+            except Exception as e:
+                if i + 1 == len(tiers) or not retryable(e):
+                    raise
+                self.router.fallback_calls += 1
+
+    async def _stream(self, messages: list, endpoint: str, json_mode: bool = False):
+        # a generator can be resumed from another context, so the stage is
+        # timed without a span
+        self.metrics.llm_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            response = await self._open_stream(messages, endpoint, json_mode)
+            async for event in response:
+                if event.data.usage is not None:
+                    self.metrics.add_tokens(event.data.usage)
+                delta = event.data.choices[0].delta.content
+                if isinstance(delta, str) and delta:
+                    yield delta
+        finally:
+            self.metrics.llm_in_flight.dec()
+            if self.metrics.enabled:
+                self.metrics.stage_seconds.observe(time.perf_counter() - started, "completion_stream")
+
+    async def _plan_seeds(self, domains: list, specifications: str, final_lst: list):
+        seeds = self._parse_json(await self._complete(
+            self._seed_messages(domains, specifications, final_lst), "idea_seeds", json_mode=True), "idea_seeds")
+        return None if "error" in seeds or not seeds["seeds"] else seeds["seeds"][:IDEA_COUNT]
+
+    async def _seeded_idea(self, domains: list, specifications: str, final_lst: list, seed: dict, seeds: list):
+        """One fan-out idea, parsed; errors and timeouts are returned, not raised."""
+        message = self._seeded_idea_messages(domains, specifications, final_lst, seed, seeds)
+        try:
+            content = await asyncio.wait_for(self._complete(message, "ideas", json_mode=True), self.idea_timeout)
+        except asyncio.TimeoutError:
+            return TimeoutError(f"no response within {self.idea_timeout}s")
+        except Exception as e:
+            return e
+        return self._parse_json(content, "ideas")
+
+    async def _fanout_ideas(self, domains: list, specifications: str, final_lst: list, message: list, query: str):
+        model = self.router.select("ideas", message)
+        result = self.completion_cache.get("ideas", model, message, query)
+        if result is not None:
+            return result
+        seeds = await self._plan_seeds(domains, specifications, final_lst)
+        if seeds is None:
+            return self._parse_json(await self._complete(message, "ideas", json_mode=True), "ideas")
+        outcomes = await asyncio.gather(*(
+            self._seeded_idea(domains, specifications, final_lst, seed, seeds) for seed in seeds))
+        result = self._merge_ideas(seeds, outcomes)
+        if "error" not in result and "errors" not in result:
+            self.completion_cache.put("ideas", model, message, result, query)
+        return result
+
+    async def get_idea_prompt(self, data):
+        key = flight_key("ideas", self._idea_query(data.domains, data.specifications))
+        return await self.single_flight.do(key, lambda: self._get_idea_prompt(data.domains, data.specifications))
+
+    async def _get_idea_prompt(self, domains: list, specifications: str):
+        self._warm("idea_seeds" if self.idea_fanout else "ideas")
+        query = self._idea_query(domains, specifications)
+        triples = await self._search_all(self._idea_searches(domains, specifications))
+        final_lst = self._context(query, triples)
+        message = self._idea_messages(domains, specifications, final_lst)
+        if self.idea_fanout:
+            result = await self._fanout_ideas(domains, specifications, final_lst, message, query)
+        else:
+            result = await self._complete_json(message, "ideas", query)
+        return await self._fix_references(lambda r: self.references.fix(r, triples), result)
+
+    async def generate_ideas(self, domains: list, specifications: str):
+        data = type('Data', (), {'domains': domains,
+                    'specifications': specifications})()
+        return await self.get_idea_prompt(data)
+
+    async def suggestion_improvement_idea_prompt(self, data: dict):
+        return await self.single_flight.do(flight_key("improve", data),
+                                           lambda: self._suggestion_improvement_idea_prompt(data))
+
+    async def _suggestion_improvement_idea_prompt(self, data: dict):
+        self._warm("improve")
+        query = self._improvement_query(data)
+        triples = await self._search(query, 10)
+        message = self._improvement_messages(data, self._context(query, triples))
+        result = await self._complete_json(message, "improve", query)
+        return await self._fix_references(lambda r: self.references.fix(r, triples), result)
+
+    async def recommend_ideas(self, data: dict):
+        return await self.single_flight.do(flight_key("recommend", data), lambda: self._recommend_ideas(data))
+
+    async def _recommend_ideas(self, data: dict):
+        self._warm("recommend")
+        query = self._recommend_query(data)
+        triples = await self._search(query, 10)
+        message = self._recommend_messages(data, self._context(query, triples))
+        result = await self._complete_json(message, "recommend", query)
+        return await self._fix_references(lambda r: self.references.fix(r, triples), result)
+
+    async def research_chat(self, user_message: str, session_id: str = None):
+        if session_id is None:
+            session_id = new_session_id()
+        # the sqlite session store reads and commits on disk, so it stays off the event loop
+        history = await asyncio.to_thread(self.sessions.get, session_id)
+        user_turn = {"role": "user", "content": user_message}
+
+        try:
+            assistant_message = await self._complete(self._chat_messages(history, user_turn), "chat")
+            assistant_turn = {"role": "assistant", "content": assistant_message}
+            await asyncio.to_thread(self.sessions.append, session_id, user_turn, assistant_turn)
+            return {
+                "response": assistant_message,
+                "session_id": session_id,
+                "context": history + [user_turn, assistant_turn]
+            }
+        except Exception as e:
+            return {
+                "error": f"Error in chat: {str(e)}",
+                "session_id": session_id,
+                "context": history
+            }
+
+    async def stream_ideas(self, domains: list, specifications: str):
+        """
+        Streaming counterpart of generate_ideas. Yields ("start", ...) before
+        any work so the client gets its first byte at once, ("status", ...)
+        when retrieval is done, ("idea", idea) as soon as each idea object is
+        complete, then ("done", full parsed result). With IDEA_FANOUT=1 the
+        ideas are generated in parallel and each is yielded when its own
+        completion finishes.
+        """
+        yield "start", {"domains": domains}
+        self._warm("idea_seeds" if self.idea_fanout else "ideas")
+        query = self._idea_query(domains, specifications)
+        triples = await self._search_all(self._idea_searches(domains, specifications))
+        yield "status", {"stage": "generating", "papers": len({triple["link"] for triple in triples})}
+        final_lst = self._context(query, triples)
+        message = self._idea_messages(domains, specifications, final_lst)
+        resolver = self.references.resolver(triples)
+        fix = resolver.fix if self.references.enabled else (lambda result: result)
+
+        seeds = await self._plan_seeds(domains, specifications, final_lst) if self.idea_fanout else None
+        if seeds is not None:
+            async def indexed(i, seed):
+                return i, await self._seeded_idea(domains, specifications, final_lst, seed, seeds)
+
+            outcomes = [None] * len(seeds)
+            for next_done in asyncio.as_completed([indexed(i, seed) for i, seed in enumerate(seeds)]):
+                i, outcome = await next_done
+                outcomes[i] = outcome
+                if isinstance(outcome, dict) and outcome.get("ideas"):
+                    outcome = await self._fix_references(fix, {"ideas": outcome["ideas"][:1]})
+                    outcomes[i] = outcome
+                    yield "idea", outcome["ideas"][0]
+            yield "done", self._merge_ideas(seeds, outcomes)
+            return
+
+        parser = JSONArrayStreamParser()
+        parts = []
+        async for delta in self._stream(message, "ideas", json_mode=True):
+            parts.append(delta)
+            for idea in parser.feed(delta):
+                yield "idea", (await self._fix_references(fix, {"ideas": [idea]}))["ideas"][0]
+        yield "done", await self._fix_references(fix, self._parse_json("".join(parts), "ideas"))
+
+    async def stream_chat(self, user_message: str, session_id: str = None):
+        """
+        Streaming counterpart of research_chat. Yields ("token", {"delta": ...})
+        per chunk and ("done", {...}) once the reply is stored in the session.
+        """
+        if session_id is None:
+            session_id = new_session_id()
+        history = await asyncio.to_thread(self.sessions.get, session_id)
+        user_turn = {"role": "user", "content": user_message}
+        yield "session", {"session_id": session_id}
+
+        parts = []
+        async for delta in self._stream(self._chat_messages(history, user_turn), "chat"):
+            parts.append(delta)
+            yield "token", {"delta": delta}
+
+        assistant_turn = {"role": "assistant", "content": "".join(parts)}
+        await asyncio.to_thread(self.sessions.append, session_id, user_turn, assistant_turn)
+        yield "done", {"response": assistant_turn["content"], "session_id": session_id}
@@ -0,0 +1,146 @@
+import copy
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+
+def messages_key(model: str, messages: list):
+    data = json.dumps({"model": model, "messages": messages}, sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def hashed_embedding(text: str, dim: int = 4096):
+    """
+    Local CPU embedding: L2-normalized counts of hashed word unigrams and
+    bigrams, as a sparse {bucket: weight} dict. Good enough to spot prompts
+    that differ by a few words without a network call.
+    """
+    words = re.findall(r"\w+", text.casefold())
+    counts = {}
+    for i, word in enumerate(words):
+        for gram in (word, " ".join(words[i:i + 2]) if i + 1 < len(words) else None):
+            if gram:
+                bucket = zlib.crc32(gram.encode()) % dim
+                counts[bucket] = counts.get(bucket, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+    return {k: v / norm for k, v in counts.items()}
+
+
+def cosine(a: dict, b: dict):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+class CompletionCache:
+    """
+    Cache of parsed LLM responses in front of the chat completion call.
+
+    The exact tier is keyed on a hash of model + messages. Endpoints listed in
+    `semantic_endpoints` additionally get a similarity tier over
+    `semantic_text`, the user-supplied part of the request (the full prompt is
+    dominated by retrieved snippets, which makes unrelated requests look
+    alike). A request whose embedding has cosine >= `threshold` with a cached
+    one for the same endpoint and model reuses that response. Only
+    `endpoints` are cached at all, and entries are evicted LRU with a TTL.
+    """
+
+    def __init__(self, endpoints=("ideas", "improve", "recommend"), semantic_endpoints=(),
+                 threshold: float = 0.95, max_entries: int = 256, ttl: float = 3600.0,
+                 embed=hashed_embedding, clock=time.time):
+        self.endpoints = set(endpoints)
+        self.semantic_endpoints = set(semantic_endpoints)
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.embed = embed
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def enabled(self, endpoint: str):
+        return endpoint in self.endpoints and self.max_entries > 0
+
+    def get(self, endpoint: str, model: str, messages: list, semantic_text: str = None):
+        if not self.enabled(endpoint):
+            return None
+        now = self.clock()
+        key = messages_key(model, messages)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now - entry["stored_at"] <= self.ttl:
+                self.entries.move_to_end(key)
+                self.exact_hits += 1
+                return copy.deepcopy(entry["value"])
+
+        if semantic_text is not None and endpoint in self.semantic_endpoints:
+            vector = self.embed(semantic_text)
+            with self.lock:
+                best, best_score = None, self.threshold
+                for other_key, entry in self.entries.items():
+                    if (entry["endpoint"] != endpoint or entry["model"] != model
+                            or entry["vector"] is None or now - entry["stored_at"] > self.ttl):
+                        continue
+                    score = cosine(vector, entry["vector"])
+                    if score >= best_score:
+                        best, best_score = other_key, score
+                if best is not None:
+                    self.entries.move_to_end(best)
+                    self.semantic_hits += 1
+                    return copy.deepcopy(self.entries[best]["value"])
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, endpoint: str, model: str, messages: list, value, semantic_text: str = None):
+        if not self.enabled(endpoint):
+            return
+        vector = None
+        if semantic_text is not None and endpoint in self.semantic_endpoints:
+            vector = self.embed(semantic_text)
+        entry = {"endpoint": endpoint, "model": model, "vector": vector,
+                 "value": copy.deepcopy(value), "stored_at": self.clock()}
+        key = messages_key(model, messages)
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0
+        }
+
+
+def _endpoint_list(value: str):
+    return [e.strip() for e in value.split(",") if e.strip()]
+
+
+def completion_cache_from_env():
+    """
+    COMPLETION_CACHE_ENDPOINTS / COMPLETION_CACHE_SEMANTIC are comma separated
+    lists out of ideas, improve, recommend.
+    """
+    return CompletionCache(
+        endpoints=_endpoint_list(os.environ.get("COMPLETION_CACHE_ENDPOINTS", "ideas,improve,recommend")),
+        semantic_endpoints=_endpoint_list(os.environ.get("COMPLETION_CACHE_SEMANTIC", "")),
+        threshold=float(os.environ.get("COMPLETION_CACHE_THRESHOLD", 0.95)),
+        max_entries=int(os.environ.get("COMPLETION_CACHE_SIZE", 256)),
+        ttl=float(os.environ.get("COMPLETION_CACHE_TTL", 3600))
+    )
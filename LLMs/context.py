@@ -0,0 +1,126 @@
+import os
+import re
+from Chatbot.sessions import estimate_tokens
+from Retrieval.retriever import reciprocal_rank_fusion
+
+WORD_RE = re.compile(r"\w+")
+# "title i: ... snippet i: ... link i: ..." around each document's snippets
+HEADER_TOKENS = 8
+
+
+def words_of(text: str):
+    return WORD_RE.findall(text.casefold())
+
+
+def shingles(words: list):
+    """Word 3-grams of a passage (the whole passage if it is shorter)."""
+    if len(words) <= 3:
+        return {tuple(words)} if words else set()
+    return set(zip(words, words[1:], words[2:]))
+
+
+def overlap(a: set, b: set):
+    """Share of the smaller shingle set found in the other, so a passage contained in another counts as a duplicate."""
+    return len(a & b) / min(len(a), len(b)) if a and b else 0.0
+
+
+def truncate_to_tokens(text: str, tokens: int):
+    limit = tokens * 4
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > 0 else limit].rstrip() + "…"
+
+
+def merge_triples(results: list):
+    """
+    Fuses the snippet triples of several searches into one ranking with
+    reciprocal rank fusion, keeping each (link, snippet) once, so a snippet
+    found by more than one query moves up.
+    """
+    triples = {}
+    rankings = []
+    for result in results:
+        ranking = []
+        for triple in result:
+            key = (triple["link"], triple["snippet"])
+            triples.setdefault(key, triple)
+            ranking.append(key)
+        rankings.append(ranking)
+    return [triples[key] for key in reciprocal_rank_fusion(rankings)]
+
+
+class ContextBuilder:
+    """
+    Packs retrieved snippet triples into the context of a prompt.
+
+    Snippets are ranked by reciprocal rank fusion of their retrieval rank
+    and how many of the query's words appear in them or their title, and taken in that order while
+    they fit in `budget_tokens` (estimated at ~4 characters per token; 0
+    means no limit). A snippet is skipped if it overlaps an already
+    chosen one by `dedupe_threshold` or more of its word 3-grams, or if its
+    document already has `max_per_doc` snippets. Long snippets are cut to
+    `max_snippet_tokens`, and the last one is cut to the remaining budget if
+    at least `min_fill_tokens` are left.
+
+    `build` returns one triple per document, in rank order, with that
+    document's chosen snippets in their original order joined by " ... ",
+    so every snippet stays next to its own title and link.
+    """
+
+    def __init__(self, budget_tokens: int = 1500, max_per_doc: int = 3, max_snippet_tokens: int = 200,
+                 dedupe_threshold: float = 0.8, min_fill_tokens: int = 32):
+        self.budget_tokens = budget_tokens
+        self.max_per_doc = max_per_doc
+        self.max_snippet_tokens = max_snippet_tokens
+        self.dedupe_threshold = dedupe_threshold
+        self.min_fill_tokens = min_fill_tokens
+
+    def rank(self, query: str, triples: list):
+        terms = {word for word in words_of(query) if len(word) > 2}
+        coverage = []
+        for triple in triples:
+            text = f"{triple['title']} {triple['snippet']}".casefold()
+            coverage.append(sum(term in text for term in terms))
+        by_coverage = sorted(range(len(triples)), key=lambda i: -coverage[i])
+        return reciprocal_rank_fusion([list(range(len(triples))), by_coverage])
+
+    def build(self, query: str, triples: list):
+        docs = {}
+        chosen = []
+        used = 0
+        for i in self.rank(query, triples):
+            triple = triples[i]
+            doc = docs.get(triple["link"])
+            if doc is not None and len(doc["parts"]) >= self.max_per_doc:
+                continue
+            text = truncate_to_tokens(triple["snippet"], self.max_snippet_tokens)
+            header = 0 if doc is not None else estimate_tokens(triple["title"] + triple["link"]) + HEADER_TOKENS
+            if self.budget_tokens and used + header + estimate_tokens(text) > self.budget_tokens:
+                remaining = self.budget_tokens - used - header
+                if remaining < self.min_fill_tokens:
+                    continue
+                text = truncate_to_tokens(text, remaining - 1)
+            grams = shingles(words_of(triple["snippet"]))
+            if any(overlap(grams, other) >= self.dedupe_threshold for other in chosen):
+                continue
+            used += header + estimate_tokens(text)
+            chosen.append(grams)
+            if doc is None:
+                doc = docs[triple["link"]] = {"title": triple["title"], "link": triple["link"], "parts": []}
+            doc["parts"].append((i, text))
+        return [{"title": doc["title"], "link": doc["link"],
+                 "snippet": " ... ".join(text for _, text in sorted(doc["parts"]))}
+                for doc in docs.values()]
+
+
+def context_builder_from_env():
+    """
+    CONTEXT_TOKEN_BUDGET caps the snippet context of each prompt (0 = no
+    cap); CONTEXT_MAX_PER_DOC and CONTEXT_DEDUPE_THRESHOLD tune packing.
+    """
+    return ContextBuilder(
+        budget_tokens=int(os.environ.get("CONTEXT_TOKEN_BUDGET", 1500)),
+        max_per_doc=int(os.environ.get("CONTEXT_MAX_PER_DOC", 3)),
+        dedupe_threshold=float(os.environ.get("CONTEXT_DEDUPE_THRESHOLD", 0.8))
+    )
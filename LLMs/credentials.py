@@ -0,0 +1,145 @@
+import asyncio
+import calendar
+import logging
+import threading
+import time
+from google.oauth2 import service_account
+import google.auth.transport.requests
+
+
+SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+
+
+def service_account_fetcher(service_account_file: str, scopes=SCOPES):
+    """
+    Returns a fetch function for TokenManager that refreshes a service account
+    and yields (access_token, expiry as a unix timestamp).
+    """
+    credentials = service_account.Credentials.from_service_account_file(
+        service_account_file, scopes=scopes)
+    auth_req = google.auth.transport.requests.Request()
+
+    def fetch():
+        credentials.refresh(auth_req)
+        # google-auth reports expiry as a naive UTC datetime
+        return credentials.token, calendar.timegm(credentials.expiry.utctimetuple())
+
+    return fetch
+
+
+def static_fetcher(token: str):
+    """Fetch function for a fixed token (local stubs, benchmarks)."""
+    def fetch():
+        return token, float("inf")
+    return fetch
+
+
+class TokenManager:
+    """
+    Caches an OAuth access token and refreshes it before it expires.
+
+    `get_token` returns the cached token without locking while it is fresh.
+    Once the token is within `refresh_margin` seconds of expiry, the first
+    caller refreshes it while concurrent callers wait on the same lock and
+    reuse the result, so there is only ever one refresh in flight. `start`
+    runs a daemon thread that refreshes ahead of time so request threads
+    normally never wait at all.
+    """
+
+    def __init__(self, fetch, refresh_margin: float = 300.0, retry_delay: float = 10.0,
+                 clock=time.time):
+        self.fetch = fetch
+        self.refresh_margin = refresh_margin
+        self.retry_delay = retry_delay
+        self.clock = clock
+        self.token = None
+        self.expiry = 0.0
+        self.fetched_at = None
+        self.refresh_count = 0
+        self.refresh_failures = 0
+        self.last_refresh_latency = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def needs_refresh(self):
+        return self.token is None or self.clock() >= self.expiry - self.refresh_margin
+
+    def refresh(self):
+        start = time.perf_counter()
+        try:
+            token, expiry = self.fetch()
+        except Exception:
+            self.refresh_failures += 1
+            raise
+        self.token, self.expiry = token, expiry
+        self.fetched_at = self.clock()
+        self.refresh_count += 1
+        self.last_refresh_latency = time.perf_counter() - start
+        return token
+
+    def get_token(self):
+        if not self.needs_refresh():
+            return self.token
+        with self.lock:
+            # another caller may have refreshed while we waited for the lock
+            if self.needs_refresh():
+                try:
+                    self.refresh()
+                except Exception:
+                    # keep serving the old token until it actually expires
+                    if self.token is None or self.clock() >= self.expiry:
+                        raise
+                    logging.exception("Token refresh failed, using cached token")
+            return self.token
+
+    async def get_token_async(self):
+        if not self.needs_refresh():
+            return self.token
+        return await asyncio.to_thread(self.get_token)
+
+    def invalidate(self, token: str = None):
+        """
+        Forces the next get_token to refresh, e.g. after the API rejected the
+        token with a 401. Given the rejected `token`, it does nothing if that
+        token has already been replaced, so concurrent 401s cause one refresh.
+        """
+        with self.lock:
+            if token is None or token == self.token:
+                self.expiry = 0.0
+
+    def seconds_until_refresh(self):
+        return max(0.0, self.expiry - self.refresh_margin - self.clock())
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.get_token()
+            except Exception:
+                logging.exception("Background token refresh failed")
+            # a failed refresh leaves the token stale, so retry after a pause
+            wait = self.retry_delay if self.needs_refresh() else self.seconds_until_refresh()
+            self.stop_event.wait(min(wait, 3600.0))
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="token-refresh", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def metrics(self):
+        now = self.clock()
+        return {
+            "token_age_seconds": None if self.fetched_at is None else now - self.fetched_at,
+            "token_ttl_seconds": (None if self.token is None or self.expiry == float("inf")
+                                  else self.expiry - now),
+            "refresh_count": self.refresh_count,
+            "refresh_failures": self.refresh_failures,
+            "last_refresh_latency_seconds": self.last_refresh_latency
+        }
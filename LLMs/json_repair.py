@@ -0,0 +1,255 @@
+import json
+import re
+
+KEY, COLON, VALUE, COMMA = range(4)
+
+NUMBER_RE = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?$")
+LITERALS = {"true": "true", "false": "false", "null": "null",
+            "True": "true", "False": "false", "None": "null",
+            "NaN": "null", "Infinity": "null", "-Infinity": "null", "undefined": "null"}
+ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+STRUCTURAL = "{}[],:"
+WHITESPACE = re.compile(r"[ \t\r\n]+")
+PLAIN_RUNS = {'"': re.compile(r'[^"\\]+'), "'": re.compile(r"[^'\\]+")}
+
+
+class JSONRepairError(ValueError):
+    pass
+
+
+def _root_start(text: str):
+    """Offset of the root container: the first "{", or a "[" that opens a list of values."""
+    for match in re.finditer(r"[{\[]", text):
+        if match.group() == "{":
+            return match.start()
+        rest = text[match.end():].lstrip()
+        if rest[:1] in ("{", "[", '"', "]"):
+            return match.start()
+    return -1
+
+
+def _closes_string(text: str, i: int):
+    """
+    Whether the quote at `i` ends the string. Models leave inner quotes
+    unescaped ("he said "hi""), so a quote only counts as closing when the
+    next non-blank character could follow a string, or another string
+    starts on a new line or is followed by a colon (a key after a missing
+    comma).
+    """
+    j = i + 1
+    n = len(text)
+    while j < n and text[j] in " \t\r\n":
+        j += 1
+    if j == n or text[j] in ",:}]`":
+        return True
+    if text[j] not in "\"'":
+        return False
+    if "\n" in text[i + 1:j]:
+        return True
+    end = text.find(text[j], j + 1)
+    return end > 0 and text[end + 1:end + 2] == ":"
+
+
+def _read_string(text: str, i: int):
+    """Decodes the string opened by the quote at `i`; returns (value, end, terminated)."""
+    quote = text[i]
+    parts = []
+    i += 1
+    n = len(text)
+    plain = PLAIN_RUNS[quote]
+    while i < n:
+        run = plain.match(text, i)
+        if run:
+            parts.append(run.group())
+            i = run.end()
+            continue
+        ch = text[i]
+        if ch == "\\" and i + 1 < n:
+            nxt = text[i + 1]
+            if nxt == "u" and re.match(r"[0-9a-fA-F]{4}", text[i + 2:i + 6]):
+                parts.append(chr(int(text[i + 2:i + 6], 16)))
+                i += 6
+                continue
+            parts.append(ESCAPES.get(nxt, nxt))
+            i += 2
+            continue
+        if ch == quote and _closes_string(text, i):
+            return "".join(parts), i + 1, True
+        parts.append(ch)
+        i += 1
+    return "".join(parts), n, False
+
+
+def _read_bare(text: str, i: int, stops: str):
+    j = i
+    n = len(text)
+    while j < n and text[j] not in stops:
+        j += 1
+    return text[i:j].strip(), j
+
+
+def _bare_value(token: str):
+    if token in LITERALS:
+        return LITERALS[token]
+    if NUMBER_RE.match(token):
+        return token
+    return json.dumps(token)
+
+
+def repair_json(text: str):
+    """
+    Rewrites the first JSON value in `text` as strict JSON; returns
+    (json_text, truncated).
+
+    Prose and ``` fences around the value are ignored, and the common ways
+    model output breaks JSON are repaired on the way: trailing or missing
+    commas, unquoted or single-quoted keys and strings, unescaped quotes and
+    raw newlines inside strings, Python literals, comments, "..."
+    placeholders, stray or mismatched brackets, and output cut off mid-value
+    (open strings are closed, a dangling key is dropped and open containers
+    are closed). Raises JSONRepairError when there is no JSON value at all.
+    """
+    start = _root_start(text)
+    if start < 0:
+        raise JSONRepairError("no JSON object in response")
+    out = []
+    # each frame is [bracket, stray brackets skipped inside it, len(out) where the current member starts]
+    stack = []
+    expect = VALUE
+    i, n = start, len(text)
+
+    def emit_value(token):
+        nonlocal expect
+        if expect == COMMA:
+            out.append(",")
+        elif expect == COLON:
+            out.append(":")
+        out.append(token)
+        expect = COMMA
+
+    while i < n:
+        ch = text[i]
+        if ch in " \t\r\n":
+            i = WHITESPACE.match(text, i).end()
+            continue
+        if not stack and out:
+            break
+        if ch == "/" and text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end < 0 else end
+            continue
+        if ch == "/" and text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            continue
+        if ch == "`":
+            # a closing fence before the brackets are closed: output was cut short
+            break
+
+        if ch in "{[":
+            i += 1
+            if stack and stack[-1][0] == "{" and expect in (KEY, COMMA):
+                # a bracket where a key should be, e.g. `}, {3: {...}` inside an object
+                stack[-1][1].append(ch)
+                continue
+            if stack:
+                emit_value(ch)
+            else:
+                out.append(ch)
+            stack.append([ch, [], len(out)])
+            expect = KEY if ch == "{" else VALUE
+            continue
+
+        if ch in "}]":
+            i += 1
+            opener = "{" if ch == "}" else "["
+            if stack and stack[-1][1] and stack[-1][1][-1] == opener:
+                stack[-1][1].pop()
+                continue
+            if not any(frame[0] == opener for frame in stack):
+                continue
+            while stack:
+                frame = stack.pop()
+                if frame[0] == "{" and expect in (COLON, VALUE):
+                    del out[frame[2]:]
+                if out[-1] == ",":
+                    out.pop()
+                out.append("}" if frame[0] == "{" else "]")
+                expect = COMMA
+                if frame[0] == opener:
+                    break
+            continue
+
+        if ch == ",":
+            if expect == COMMA:
+                out.append(",")
+                expect = KEY if stack[-1][0] == "{" else VALUE
+            i += 1
+            continue
+
+        if ch == ":":
+            if expect == COLON:
+                out.append(":")
+                expect = VALUE
+            i += 1
+            continue
+
+        in_key = stack[-1][0] == "{" and expect in (KEY, COMMA)
+        if ch in "\"'":
+            value, i, closed = _read_string(text, i)
+            token = json.dumps(value)
+        elif in_key:
+            token, i = _read_bare(text, i, STRUCTURAL + "\"'\n")
+            token, closed = json.dumps(token), True
+        else:
+            token, i = _read_bare(text, i, "{}[],\n")
+            if not token.strip(".…"):
+                continue
+            token, closed = _bare_value(token), True
+        if in_key:
+            if expect == COMMA:
+                out.append(",")
+            stack[-1][2] = len(out)
+            out.append(token)
+            expect = COLON
+        else:
+            emit_value(token)
+        if not closed:
+            break
+
+    truncated = bool(stack)
+    if stack and stack[-1][0] == "{" and expect in (COLON, VALUE):
+        del out[stack[-1][2]:]
+    while stack:
+        frame = stack.pop()
+        if out[-1] == ",":
+            out.pop()
+        out.append("}" if frame[0] == "{" else "]")
+    return "".join(out), truncated
+
+
+def loads(text: str):
+    """
+    json.loads for model output. The value is first decoded strictly from
+    where it starts, so well-formed output wrapped in a fence or prose costs
+    one C-level parse; only output that fails goes through repair_json.
+    """
+    value, _ = loads_checked(text)
+    return value
+
+
+def loads_checked(text: str):
+    """Like loads, but returns (value, truncated) so callers can tell cut-off output apart."""
+    start = _root_start(text)
+    if start < 0:
+        raise JSONRepairError("no JSON object in response")
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text, start)
+        return value, False
+    except json.JSONDecodeError:
+        pass
+    repaired, truncated = repair_json(text)
+    try:
+        return json.loads(repaired), truncated
+    except json.JSONDecodeError as e:
+        raise JSONRepairError(f"could not repair response: {e}") from e
@@ -0,0 +1,294 @@
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount: float = 1.0):
+        with self.lock:
+            self.values[labelvalues] = self.values.get(labelvalues, 0.0) + amount
+
+    def samples(self):
+        with self.lock:
+            items = list(self.values.items())
+        for labelvalues, value in items:
+            yield f"{self.name}{_labels(self.labelnames, labelvalues)} {value:g}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labelvalues, amount: float = 1.0):
+        self.inc(*labelvalues, amount=-amount)
+
+
+class Histogram:
+    """Prometheus histogram; per label set it keeps one count per bucket plus sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues):
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(labelvalues)
+            if series is None:
+                series = self.values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def samples(self):
+        with self.lock:
+            items = [(labelvalues, list(counts), total) for labelvalues, (counts, total) in self.values.items()]
+        for labelvalues, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {total:g}"
+            yield f"{self.name}_count{_labels(self.labelnames, labelvalues)} {cumulative}"
+
+
+class CallbackMetric:
+    """A metric read at scrape time from `fn() -> [(labelvalues, value), ...]`, e.g. a cache's stats()."""
+
+    def __init__(self, name: str, help: str, kind: str, labelnames, fn):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+
+    def samples(self):
+        for labelvalues, value in self.fn():
+            yield f"{self.name}{_labels(self.labelnames, labelvalues)} {value:g}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """The Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+class JSONLinesSpanExporter:
+    """Appends finished spans to a file, one OTLP/JSON-shaped span per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, "a", buffering=1)
+
+    def export(self, span: dict):
+        line = json.dumps(span)
+        with self.lock:
+            self.file.write(line + "\n")
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "attributes", "token")
+
+    def __init__(self, name: str, parent, attributes: dict):
+        self.trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.name = name
+        self.start = time.time_ns()
+        self.attributes = attributes
+        self.token = None
+
+    def to_otlp(self, end: int, error: bool):
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": self.start,
+            "endTimeUnixNano": end,
+            "attributes": [{"key": key, "value": {"stringValue": str(value)}}
+                           for key, value in self.attributes.items()],
+            "status": {"code": 2 if error else 0}
+        }
+
+
+CURRENT_SPAN = contextvars.ContextVar("inspireit_span", default=None)
+
+
+class Stage:
+    """Times one pipeline stage into the stage histogram and, with tracing on, a span."""
+
+    __slots__ = ("metrics", "name", "attributes", "started", "span")
+
+    def __init__(self, metrics, name: str, attributes: dict):
+        self.metrics = metrics
+        self.name = name
+        self.attributes = attributes
+        self.span = None
+
+    def __enter__(self):
+        if self.metrics.exporter is not None:
+            self.span = Span(self.name, CURRENT_SPAN.get(), self.attributes)
+            self.span.token = CURRENT_SPAN.set(self.span)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.stage_seconds.observe(time.perf_counter() - self.started, self.name)
+        if self.span is not None:
+            try:
+                CURRENT_SPAN.reset(self.span.token)
+            except ValueError:
+                # exited in another context (e.g. an async generator resumed elsewhere)
+                pass
+            self.metrics.exporter.export(self.span.to_otlp(time.time_ns(), exc_type is not None))
+        return False
+
+
+class NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_STAGE = NullStage()
+
+
+class PipelineMetrics:
+    """
+    Request pipeline instrumentation: a stage latency histogram fed by
+    `stage(name)`, HTTP and LLM counters and gauges, and scrape-time
+    callbacks for component stats (caches, coalescing, references).
+    `render()` is the body of /metrics.
+
+    With `exporter` set, every stage is also a span; stages nest through a
+    context variable, so the spans of one request (including concurrent
+    fan-out calls) share a trace and can be loaded by OpenTelemetry tools.
+    With enabled=False, stages, tokens and HTTP requests are not recorded.
+    """
+
+    def __init__(self, enabled: bool = True, exporter=None):
+        self.enabled = enabled
+        self.exporter = exporter if enabled else None
+        self.registry = Registry()
+        self.stage_seconds = self.registry.add(Histogram(
+            "inspireit_stage_seconds", "Time spent in each request pipeline stage.", ["stage"]))
+        self.http_seconds = self.registry.add(Histogram(
+            "inspireit_http_request_seconds", "HTTP request latency by route.", ["route", "status"]))
+        self.http_in_flight = self.registry.add(Gauge(
+            "inspireit_http_requests_in_flight", "HTTP requests being served."))
+        self.llm_in_flight = self.registry.add(Gauge(
+            "inspireit_llm_requests_in_flight", "Mistral completions in progress."))
+        self.search_in_flight = self.registry.add(Gauge(
+            "inspireit_search_requests_in_flight", "Snippet searches in progress."))
+        self.llm_tokens = self.registry.add(Counter(
+            "inspireit_llm_tokens_total", "Tokens reported by Mistral usage.", ["type"]))
+
+    def stage(self, name: str, **attributes):
+        if not self.enabled:
+            return NULL_STAGE
+        return Stage(self, name, attributes)
+
+    def add_tokens(self, usage):
+        if self.enabled and usage is not None:
+            self.llm_tokens.inc("prompt", amount=usage.prompt_tokens or 0)
+            self.llm_tokens.inc("completion", amount=usage.completion_tokens or 0)
+
+    def callback(self, name: str, help: str, kind: str, labelnames, fn):
+        return self.registry.add(CallbackMetric(name, help, kind, labelnames, fn))
+
+    def render(self):
+        return self.registry.render()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that times every HTTP request under its route template
+    (a streamed response is timed until its last chunk), counts requests in
+    flight, and wraps each request in a root span.
+    """
+
+    def __init__(self, app, metrics: PipelineMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.metrics.enabled:
+            return await self.app(scope, receive, send)
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        self.metrics.http_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            with self.metrics.stage("http", method=scope["method"], path=scope["path"]):
+                await self.app(scope, receive, send_with_status)
+        finally:
+            self.metrics.http_in_flight.dec()
+            route = scope.get("route")
+            self.metrics.http_seconds.observe(time.perf_counter() - started,
+                                              route.path if route is not None else "unmatched",
+                                              f"{status[0] // 100}xx")
+
+
+def pipeline_metrics_from_env():
+    """
+    METRICS=0 turns instrumentation off; TRACE_EXPORT_FILE writes spans as
+    JSON lines to that file.
+    """
+    path = os.environ.get("TRACE_EXPORT_FILE")
+    return PipelineMetrics(
+        enabled=os.environ.get("METRICS", "1") != "0",
+        exporter=JSONLinesSpanExporter(path) if path else None
+    )
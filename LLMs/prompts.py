@@ -1,34 +1,161 @@
 import os
 import re
 import json
-import requests
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
 from mistralai import Mistral
-from google.oauth2 import service_account
-import google.auth.transport.requests
+from LLMs.search_client import SearchClient
+from LLMs.credentials import TokenManager, service_account_fetcher, static_fetcher
+from LLMs.retrieval_cache import retrieval_cache_from_env, normalize_query, normalize_domains
+from LLMs.completion_cache import completion_cache_from_env
+from LLMs.references import reference_validator_from_env
+from LLMs.context import context_builder_from_env, merge_triples
+from LLMs.single_flight import SingleFlight, flight_key, single_flight_from_env
+from LLMs.metrics import pipeline_metrics_from_env
+from LLMs.routing import model_router_from_env
+from LLMs.warmup import connection_warmer_from_env
+from LLMs.schemas import RESPONSE_SCHEMAS, ResponseParseError, parse_response_checked
+from Retrieval.retriever import retriever_from_env
+from Chatbot.sessions import conversation_store_from_env, new_session_id, window_messages
+
+
+DEFAULT_ENDPOINT_URL = (
+    "https://discoveryengine.googleapis.com/v1alpha/projects/592141439586/"
+    "locations/global/collections/default_collection/engines/inspireit-v2-2_1739294394126/"
+    "servingConfigs/default_search:search"
+)
+
+IDEA_COUNT = 3
+
+CHAT_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": """You are a helpful research assistant with expertise in analyzing and suggesting research ideas. 
+            You can help with:
+            1. Understanding research concepts
+            2. Suggesting improvements to research ideas
+            3. Recommending related papers and methodologies
+            4. Explaining technical concepts
+            5. Discussing research implications and potential directions
+            you are not allowed to give any special commands like /generate domains | specifications, /improve {json_data}
+            and /recommend {json_data}.
+            Keep responses conversational but informative."""
+}
 
 
 class MistralChat:
+    search_client_class = SearchClient
+    single_flight_class = SingleFlight
+
     def __init__(self):
+        # per-stage timings, token counts and in-flight gauges for /metrics
+        self.metrics = pipeline_metrics_from_env()
         api = os.environ.get("MISTRAL_API_KEY")
-        self.model = "mistral-large-latest"
-        self.client = Mistral(api_key=api)
-        self.context=[]
-
-        SERVICE_ACCOUNT_FILE = "SERVICE_ACCOUNT_DETAILS.json"
-        credentials = service_account.Credentials.from_service_account_file(
-            SERVICE_ACCOUNT_FILE,
-            scopes=[
-                "https://www.googleapis.com/auth/cloud-platform"]
+        # MISTRAL_SERVER_URL / DISCOVERY_ENGINE_URL let the benchmarks point
+        # the app at local stub servers instead of the real APIs.
+        self.client = Mistral(
+            api_key=api, server_url=os.environ.get("MISTRAL_SERVER_URL"))
+        # the model is chosen per endpoint and prompt size, with fallback
+        # tiers and optional hedging; see LLMs/routing.py
+        self.router = model_router_from_env(self.client, api)
+        # the connection to the model is opened while retrieval runs
+        self.warmer = connection_warmer_from_env()
+        # Chat history is kept per session id with LRU/TTL eviction, and only
+        # the most recent turns that fit the token budget are sent to the model.
+        self.sessions = conversation_store_from_env()
+        self.chat_token_budget = int(os.environ.get("CHAT_CONTEXT_TOKENS", 4000))
+
+        # The access token expires after about an hour, so it is owned by a
+        # TokenManager that refreshes it in the background before expiry.
+        access_token = os.environ.get("DISCOVERY_ENGINE_TOKEN")
+        if access_token is None:
+            SERVICE_ACCOUNT_FILE = "SERVICE_ACCOUNT_DETAILS.json"
+            fetch = service_account_fetcher(SERVICE_ACCOUNT_FILE)
+        else:
+            fetch = static_fetcher(access_token)
+        self.credentials = TokenManager(fetch)
+        self.credentials.get_token()
+        self.credentials.start()
+        self.endpoint_url = os.environ.get(
+            "DISCOVERY_ENGINE_URL", DEFAULT_ENDPOINT_URL)
+        self.search_client = self.search_client_class(
+            self.endpoint_url,
+            pool_size=int(os.environ.get("SEARCH_POOL_SIZE", 10)),
+            read_timeout=float(os.environ.get("SEARCH_TIMEOUT", 30)),
+            max_retries=int(os.environ.get("SEARCH_MAX_RETRIES", 3)),
+            credentials=self.credentials
         )
-        auth_req = google.auth.transport.requests.Request()
-        credentials.refresh(auth_req)
-        access_token = credentials.token
-        self.endpoint_url = (
-            "https://discoveryengine.googleapis.com/v1alpha/projects/592141439586/"
-            "locations/global/collections/default_collection/engines/inspireit-v2-2_1739294394126/"
-            "servingConfigs/default_search:search"
-        )
-        self.headers = {
+        self.retrieval_cache = retrieval_cache_from_env()
+        # a local index (RETRIEVAL_BACKEND=local) replaces Discovery Engine
+        self.retriever = retriever_from_env()
+        self.completion_cache = completion_cache_from_env()
+        # references in model output are checked against the snippets (and
+        # the local paper catalog, if configured) before they are returned
+        self.references = reference_validator_from_env()
+        # JSON endpoints ask Mistral for a JSON object (response_format), and
+        # whatever comes back still goes through the tolerant parser
+        self.json_mode = os.environ.get("MISTRAL_JSON_MODE", "1") != "0"
+        # retrieved snippets are grouped per paper, deduplicated and packed
+        # into a token budget before they go into a prompt
+        self.context_builder = context_builder_from_env()
+        # identical generation requests that arrive while one is in flight
+        # wait for it instead of repeating the search and completion
+        self.single_flight = single_flight_from_env(self.single_flight_class)
+        # IDEA_FANOUT=1 plans the ideas in one short call and writes each up
+        # in its own completion, all in parallel; see _fanout_ideas
+        self.idea_fanout = os.environ.get("IDEA_FANOUT", "0") == "1"
+        self.idea_timeout = float(os.environ.get("IDEA_FANOUT_TIMEOUT", 60))
+        # IDEA_DOMAIN_SEARCH=1 also searches each domain on its own, in
+        # parallel with the combined query, and merges the results
+        self.idea_domain_search = os.environ.get("IDEA_DOMAIN_SEARCH", "0") == "1"
+        self.search_pool = None
+        self._register_metrics()
+
+    def _register_metrics(self):
+        """Exposes the components' own counters on /metrics, read at scrape time."""
+        caches = {"retrieval": self.retrieval_cache, "completion": self.completion_cache}
+        hit_tiers = {"retrieval": ("memory_hits", "disk_hits"), "completion": ("exact_hits", "semantic_hits")}
+        self.metrics.callback(
+            "inspireit_cache_hits_total", "Cache lookups answered, by cache and tier.", "counter",
+            ["cache", "tier"], lambda: [((name, field.removesuffix("_hits")), cache.stats()[field])
+                                        for name, cache in caches.items() for field in hit_tiers[name]])
+        self.metrics.callback(
+            "inspireit_cache_misses_total", "Cache lookups that missed.", "counter",
+            ["cache"], lambda: [((name,), cache.stats()["misses"]) for name, cache in caches.items()])
+        self.metrics.callback(
+            "inspireit_cache_entries", "Entries held in memory.", "gauge",
+            ["cache"], lambda: [((name,), cache.stats()["entries"]) for name, cache in caches.items()])
+        self.metrics.callback(
+            "inspireit_single_flight_requests_total", "Generation requests by how single flight served them.",
+            "counter", ["role"], lambda: [((role,), self.single_flight.stats()[role])
+                                          for role in ("leaders", "coalesced", "cross_worker")])
+        self.metrics.callback(
+            "inspireit_references_total", "Model references by validation outcome.", "counter",
+            ["outcome"], lambda: [((outcome,), self.references.stats()[outcome])
+                                  for outcome in ("kept", "rewritten", "dropped")])
+        self.metrics.callback(
+            "inspireit_llm_warmups_total", "Connections opened to the model ahead of a completion.", "counter",
+            ["outcome"], lambda: [(("started",), self.warmer.warmups), (("failed",), self.warmer.failures)])
+        self.router.register_metrics(self.metrics)
+
+        def token_gauge(field):
+            value = self.credentials.metrics()[field]
+            return [] if value is None else [((), value)]
+        for field, help in (("token_age_seconds", "Age of the Discovery Engine access token."),
+                            ("token_ttl_seconds", "Seconds until the Discovery Engine access token expires."),
+                            ("last_refresh_latency_seconds", "How long the last token refresh took.")):
+            self.metrics.callback(f"inspireit_search_{field}", help, "gauge", [],
+                                  lambda field=field: token_gauge(field))
+        self.metrics.callback(
+            "inspireit_search_token_refreshes_total", "Discovery Engine token refreshes by outcome.", "counter",
+            ["outcome"], lambda: [(("ok",), self.credentials.refresh_count),
+                                  (("failed",), self.credentials.refresh_failures)])
+
+    @property
+    def headers(self):
+        return self._auth_headers(self.credentials.get_token())
+
+    def _auth_headers(self, access_token: str):
+        return {
             "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json"
         }
@@ -40,56 +167,146 @@ class MistralChat:
 
         return text
 
-    def get_clean_snippets(self, result):
+    def snippet_triples(self, result):
         results = result["results"]
-        titles = []
-        snippets = []
-        links = []
+        triples = []
         for i in results:
             doc = i["document"]["derivedStructData"]
-            titles.append(doc["title"])
-            links.append(doc["link"])
             for j in doc["snippets"]:
                 if j["snippet_status"] == "SUCCESS":
-                    snippets.append(self.clean_text(j["snippet"]))
+                    triples.append({"title": doc["title"], "snippet": self.clean_text(j["snippet"]),
+                                    "link": doc["link"]})
+        return triples
+
+    def format_snippets(self, triples):
         lst = []
-        for i, j in enumerate(zip(snippets, titles, links)):
-            lst.append(f"title {i}: {j[1]} snippet {i}: {j[0]} link {i}: {j[2]}")
+        for i, j in enumerate(triples):
+            lst.append(f"title {i}: {j['title']} snippet {i}: {j['snippet']} link {i}: {j['link']}")
         return lst
 
-    def clean_mistral_response(raw_response: str):
-        # Remove the ```json\n and \n``` markers
-        cleaned = raw_response.replace("```json\n", "").replace("\n```", "")
-
-        # Remove escaped newlines and quotes
-        cleaned = cleaned.replace("\\n", "").replace('\\"', '"')
-
-        # Parse the string to JSON
-        try:
-            json_data = json.loads(cleaned)
-            return json_data
-        except json.JSONDecodeError as e:
-            return {"error": f"Failed to parse JSON: {str(e)}"}
+    def get_clean_snippets(self, result):
+        return self.format_snippets(self.snippet_triples(result))
 
-    def get_idea_prompt(self, data: json):
-        domains = data.domains
-        specifications = data.specifications
+    def _context(self, query: str, triples: list):
+        with self.metrics.stage("context"):
+            return self.format_snippets(self.context_builder.build(query, triples))
 
-        payload = {
-            "query": f"Keywords: {','.join(domains)}. Specifications: {specifications}",
-            "pageSize": 20,
+    def _search_payload(self, query: str, page_size: int):
+        return {
+            "query": query,
+            "pageSize": page_size,
             "queryExpansionSpec": {"condition": "AUTO"},
             "spellCorrectionSpec": {"mode": "AUTO"},
             "contentSearchSpec": {"snippetSpec": {"returnSnippet": True}}
         }
 
-        response = requests.post(
-            self.endpoint_url, headers=self.headers, json=payload)
-        response_json = response.json()
-
-        final_lst = self.get_clean_snippets(response_json)
-
-        message = [
+    def _search_cache_key(self, query: str, page_size: int):
+        # v2: entries written before snippet_triples kept titles aligned are ignored
+        return f"triples:v2:{page_size}:{normalize_query(query)}"
+
+    def _search(self, query: str, page_size: int):
+        """Snippet triples for the query; format_snippets turns them into prompt lines."""
+        key = self._search_cache_key(query, page_size)
+        with self.metrics.stage("search"):
+            triples = self.retrieval_cache.get(key)
+            if triples is None:
+                with self.metrics.stage("retrieval"):
+                    self.metrics.search_in_flight.inc()
+                    try:
+                        if self.retriever is not None:
+                            triples = self.retriever.search(query, page_size)
+                        else:
+                            payload = self._search_payload(query, page_size)
+                            response_json = self.search_client.search(payload, self.headers)
+                            triples = self.snippet_triples(response_json)
+                    finally:
+                        self.metrics.search_in_flight.dec()
+                self.retrieval_cache.put(key, triples)
+        return triples
+
+    def _search_all(self, searches: list):
+        """Runs the (query, page_size) searches concurrently and merges their triples."""
+        if len(searches) == 1:
+            return self._search(*searches[0])
+        if self.search_pool is None:
+            self.search_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="search")
+        # each search runs in a copy of this context so its span joins the request's trace
+        futures = [self.search_pool.submit(contextvars.copy_context().run, self._search, query, page_size)
+                   for query, page_size in searches]
+        return merge_triples([future.result() for future in futures])
+
+    def _warm(self, endpoint: str):
+        """Opens a connection to the model `endpoint` will most likely use, in the background."""
+        self.warmer.warm(self.router.client_for(self.router.select(endpoint, [])))
+
+    def _response_format(self, json_mode: bool):
+        return {"type": "json_object"} if json_mode and self.json_mode else None
+
+    def _complete(self, messages: list, endpoint: str, json_mode: bool = False, timeout: float = None):
+        return self._complete_routed(messages, endpoint, json_mode, timeout)[0]
+
+    def _complete_routed(self, messages: list, endpoint: str, json_mode: bool = False, timeout: float = None):
+        """(content, model that answered) for the completion, on the model the router picks."""
+        def call(client, model, timeout):
+            with self.metrics.stage("completion", model=model):
+                self.metrics.llm_in_flight.inc()
+                try:
+                    response = client.chat.complete(
+                        model=model,
+                        messages=messages,
+                        response_format=self._response_format(json_mode),
+                        timeout_ms=int(timeout * 1000) if timeout else None
+                    )
+                finally:
+                    self.metrics.llm_in_flight.dec()
+            self.metrics.add_tokens(response.usage)
+            return response.choices[0].message.content
+        return self.router.complete(call, endpoint, messages, timeout)
+
+    def _complete_json(self, messages: list, endpoint: str, semantic_text: str = None):
+        model = self.router.select(endpoint, messages)
+        result = self.completion_cache.get(endpoint, model, messages, semantic_text)
+        if result is None:
+            content, answered = self._complete_routed(messages, endpoint, json_mode=True)
+            result, truncated = self._parse_json_checked(content, endpoint)
+            # never cache a response the parser rejected or had to cut short,
+            # or one from a fallback model
+            if "error" not in result and not truncated and answered == model:
+                self.completion_cache.put(endpoint, model, messages, result, semantic_text)
+        return result
+
+    def _parse_json(self, content: str, endpoint: str = None):
+        return self._parse_json_checked(content, endpoint)[0]
+
+    def _parse_json_checked(self, content: str, endpoint: str = None):
+        try:
+            with self.metrics.stage("parse"):
+                return parse_response_checked(content, RESPONSE_SCHEMAS.get(endpoint))
+        except ResponseParseError as e:
+            return {
+                "error": "Failed to parse response as JSON",
+                "detail": str(e),
+                "raw_response": content
+            }, False
+
+    def _fix_references(self, fix, result: dict):
+        with self.metrics.stage("references"):
+            return fix(result)
+
+    def _idea_query(self, domains: list, specifications: str):
+        # canonical domain order so "NLP, GANs" and "gans, nlp" hit the same cache entry
+        return f"Keywords: {','.join(normalize_domains(domains))}. Specifications: {specifications}"
+
+    def _idea_searches(self, domains: list, specifications: str):
+        """(query, page_size) of the idea searches: the combined query, and one per domain with IDEA_DOMAIN_SEARCH=1."""
+        searches = [(self._idea_query(domains, specifications), 20)]
+        domains = normalize_domains(domains)
+        if self.idea_domain_search and len(domains) > 1:
+            searches += [(self._idea_query([domain], specifications), 10) for domain in domains]
+        return searches
+
+    def _idea_messages(self, domains: list, specifications: str, final_lst: list):
+        return [
             {
                 "role": "user",
                 "content": (f'''
@@ -135,50 +352,151 @@ class MistralChat:
                 ''')
             }
         ]
-        response = self.client.chat.complete(
-            model=self.model,
-            messages=message
-        )
 
-        try:
-            return json.loads(re.sub(r'^```json\n|\n```$', '', response.choices[0].message.content.strip()))
-        except json.JSONDecodeError:
-            return {
-                "error": "Failed to parse response as JSON",
-                "raw_response": response.choices[0].message.content
+    def _seed_messages(self, domains: list, specifications: str, final_lst: list):
+        return [
+            {
+                "role": "user",
+                "content": (f'''
+                    As an AI research consultant, plan {IDEA_COUNT} distinct research ideas based on the following:
+
+                    Domains: {', '.join(domains)}
+                    User Specifications: {specifications}
+
+                    Consider the given paper title and with the context of what is written in the paper under the snippet.
+                    The snippet and title are numbered accordingly:
+                    {', '.join(final_lst)}
+
+                    Provide your response in JSON format with the following structure:
+                    {{
+                        "seeds": [
+                            {{
+                                "title": "Idea title",
+                                "angle": "One sentence on what makes this idea different from the others"
+                            }}
+                        ]
+                    }}
+
+                    Only give the titles and angles, each idea is written up separately afterwards.
+                ''')
             }
+        ]
 
-    def generate_ideas(self, domains: list, specifications: str):
+    def _seeded_idea_messages(self, domains: list, specifications: str, final_lst: list, seed: dict, seeds: list):
+        others = [other["title"] for other in seeds if other is not seed]
+        return [
+            {
+                "role": "user",
+                "content": (f'''
+                    As an AI research consultant, write up one research idea based on the following:
+
+                    Domains: {', '.join(domains)}
+                    User Specifications: {specifications}
+
+                    Idea title: {seed["title"]}
+                    Angle: {seed["angle"]}
+                    These other ideas are written up separately, do not overlap with them: {'; '.join(others)}
+
+                    Consider the given paper title and with the context of what is written in the paper under the snippet.
+                    The snippet and title are numbered accordingly:
+                    {', '.join(final_lst)}
+
+                    Provide your response in JSON format with the following structure:
+                    {{
+                        "ideas": [
+                            {{
+                                "title": "Idea title",
+                                "summary": "Very lengthy description",
+                                "opportunities": ["opp1", "opp2", ...],
+                                "drawbacks": ["drawback1", "drawback2", ...],
+                                "references": {{
+                                    "1": {{
+                                        "title": "ref1 title",
+                                        "link": "google storage link of ref1"
+                                    }}
+                                }}
+                            }}
+                        ]
+                    }}
+
+                    The ref1, ref2 and so on are the referenced papers for the idea and link is their corresponding
+                    google storage link (the link has a format of gs://link)
+                ''')
+            }
+        ]
+
+    def _merge_ideas(self, seeds: list, outcomes: list):
         """
-        Wrapper method to generate ideas with simpler parameters
+        Combines the per-seed results into the usual {"ideas": [...]} shape.
+        Seeds that failed or timed out are listed under "errors"; only if all
+        of them failed is the result an error.
         """
-        data = type('Data', (), {'domains': domains,
-                    'specifications': specifications})()
-        return self.get_idea_prompt(data)
+        ideas, errors = [], []
+        for seed, outcome in zip(seeds, outcomes):
+            if isinstance(outcome, dict) and outcome.get("ideas"):
+                ideas.append(outcome["ideas"][0])
+            else:
+                error = outcome.get("error") if isinstance(outcome, dict) else str(outcome) or type(outcome).__name__
+                errors.append({"title": seed["title"], "error": error})
+        if not ideas:
+            return {"error": "Failed to generate ideas", "errors": errors}
+        result = {"ideas": ideas}
+        if errors:
+            result["errors"] = errors
+        return result
+
+    def _fanout_ideas(self, domains: list, specifications: str, final_lst: list, message: list, query: str):
+        """
+        Plans IDEA_COUNT idea seeds in one short completion, then writes each
+        idea up in its own completion, concurrently and over the same
+        snippets, so latency follows the longest idea rather than all of them
+        in sequence. Each idea gets `idea_timeout` seconds. If planning fails
+        it falls back to the single completion. Complete results are cached
+        under the single-completion prompt.
+        """
+        model = self.router.select("ideas", message)
+        result = self.completion_cache.get("ideas", model, message, query)
+        if result is not None:
+            return result
+        seeds = self._parse_json(self._complete(
+            self._seed_messages(domains, specifications, final_lst), "idea_seeds", json_mode=True), "idea_seeds")
+        if "error" in seeds or not seeds["seeds"]:
+            return self._parse_json(self._complete(message, "ideas", json_mode=True), "ideas")
+        seeds = seeds["seeds"][:IDEA_COUNT]
+
+        pool = ThreadPoolExecutor(max_workers=len(seeds))
+        # each call runs in a copy of this context so its span joins the request's trace
+        futures = [pool.submit(contextvars.copy_context().run, self._complete, self._seeded_idea_messages(
+            domains, specifications, final_lst, seed, seeds), "ideas", True, self.idea_timeout) for seed in seeds]
+        wait(futures, timeout=self.idea_timeout)
+        pool.shutdown(wait=False, cancel_futures=True)
+        outcomes = []
+        for future in futures:
+            if not future.done():
+                outcomes.append(TimeoutError(f"no response within {self.idea_timeout}s"))
+            elif future.exception() is not None:
+                outcomes.append(future.exception())
+            else:
+                outcomes.append(self._parse_json(future.result(), "ideas"))
+
+        result = self._merge_ideas(seeds, outcomes)
+        if "error" not in result and "errors" not in result:
+            self.completion_cache.put("ideas", model, message, result, query)
+        return result
+
+    def _improvement_query(self, data: dict):
+        title = data["origDetails"]["title"]
+        summary = data["origDetails"]["summary"]
+        specifications = data["specifications"]
+        return f"Title of idea: {title}. Idea summary: \n{summary}. Specifications: \n{specifications}"
 
-    def suggestion_improvement_idea_prompt(self, data:dict):
-        
+    def _improvement_messages(self, data: dict, final_lst: list):
         title = data["origDetails"]["title"]
         summary = data["origDetails"]["summary"]
         drawbacks = data["origDetails"]["drawbacks"]
         opportunities = data["origDetails"]["opportunities"]
         specifications = data["specifications"]
-
-        payload = {
-            "query": f"Title of idea: {title}. Idea summary: \n{summary}. Specifications: \n{specifications}",
-            "pageSize": 10,
-            "queryExpansionSpec": {"condition": "AUTO"},
-            "spellCorrectionSpec": {"mode": "AUTO"},
-            "contentSearchSpec": {"snippetSpec": {"returnSnippet": True}}
-        }
-
-        response = requests.post(
-            self.endpoint_url, headers=self.headers, json=payload)
-        response_json = response.json()        
-
-        final_lst = self.get_clean_snippets(response_json)
-
-        message = [
+        return [
             {
                 "role": "user",
                 "content": (f'''
@@ -213,38 +531,16 @@ class MistralChat:
                 ''')
             }
         ]
-        response = self.client.chat.complete(
-            model=self.model,
-            messages=message
-        )
 
-        try:
-            return json.loads(re.sub(r'^```json\n|\n```$', '', response.choices[0].message.content.strip()))
-        except json.JSONDecodeError:
-            return {
-                "error": "Failed to parse response as JSON",
-                "raw_response": response.choices[0].message.content
-            }
-        
-    def recommend_ideas(self, data: dict):
+    def _recommend_query(self, data: dict):
+        return f"Title of idea: {data['title']}. Idea summary: \n{data['summary']}"
+
+    def _recommend_messages(self, data: dict, final_lst: list):
         title = data["title"]
         summary = data["summary"]
         drawbacks = data["drawbacks"]
         opportunities = data["opportunities"]
-        
-        payload = {
-            "query": f"Title of idea: {title}. Idea summary: \n{summary}",
-            "pageSize": 10,
-            "queryExpansionSpec": {"condition": "AUTO"},
-            "spellCorrectionSpec": {"mode": "AUTO"},
-            "contentSearchSpec": {"snippetSpec": {"returnSnippet": True}}
-        }
-        
-        response = requests.post(self.endpoint_url, headers=self.headers, json=payload)
-        response_json = response.json()
-        final_lst = self.get_clean_snippets(response_json)
-        
-        message = [
+        return [
             {
                 "role": "user",
                 "content": (f'''
@@ -277,73 +573,88 @@ class MistralChat:
                 ''')
             }
         ]
+
+    def get_idea_prompt(self, data: json):
+        key = flight_key("ideas", self._idea_query(data.domains, data.specifications))
+        return self.single_flight.do(key, lambda: self._get_idea_prompt(data.domains, data.specifications))
+
+    def _get_idea_prompt(self, domains: list, specifications: str):
+        self._warm("idea_seeds" if self.idea_fanout else "ideas")
+        query = self._idea_query(domains, specifications)
+        triples = self._search_all(self._idea_searches(domains, specifications))
+        final_lst = self._context(query, triples)
+        message = self._idea_messages(domains, specifications, final_lst)
+        if self.idea_fanout:
+            result = self._fanout_ideas(domains, specifications, final_lst, message, query)
+        else:
+            result = self._complete_json(message, "ideas", query)
+        return self._fix_references(lambda r: self.references.fix(r, triples), result)
+
+    def generate_ideas(self, domains: list, specifications: str):
+        """
+        Wrapper method to generate ideas with simpler parameters
+        """
+        data = type('Data', (), {'domains': domains,
+                    'specifications': specifications})()
+        return self.get_idea_prompt(data)
+
+    def suggestion_improvement_idea_prompt(self, data:dict):
+        return self.single_flight.do(flight_key("improve", data),
+                                     lambda: self._suggestion_improvement_idea_prompt(data))
+
+    def _suggestion_improvement_idea_prompt(self, data: dict):
+        self._warm("improve")
+        query = self._improvement_query(data)
+        triples = self._search(query, 10)
+        message = self._improvement_messages(data, self._context(query, triples))
+        result = self._complete_json(message, "improve", query)
+        return self._fix_references(lambda r: self.references.fix(r, triples), result)
         
-        # Get response from Mistral
-        response = self.client.chat.complete(
-            model=self.model,
-            messages=message
-        )
-        
-        # Parse and return the response
-        try:
-            return json.loads(re.sub(r'^```json\n|\n```$', '', response.choices[0].message.content.strip()))
-        except json.JSONDecodeError:
-            return {
-                "error": "Failed to parse response as JSON",
-                "raw_response": response.choices[0].message.content
-            }
+    def recommend_ideas(self, data: dict):
+        return self.single_flight.do(flight_key("recommend", data), lambda: self._recommend_ideas(data))
+
+    def _recommend_ideas(self, data: dict):
+        self._warm("recommend")
+        query = self._recommend_query(data)
+        triples = self._search(query, 10)
+        message = self._recommend_messages(data, self._context(query, triples))
+        result = self._complete_json(message, "recommend", query)
+        return self._fix_references(lambda r: self.references.fix(r, triples), result)
+
+    def _chat_messages(self, history: list, user_turn: dict):
+        return [CHAT_SYSTEM_MESSAGE] + window_messages(history + [user_turn], self.chat_token_budget)
 
-    def research_chat(self, user_message: str):
+    def research_chat(self, user_message: str, session_id: str = None):
         """
         A conversational interface for the research bot.
         
         Args:
             user_message (str): The user's input message
-            context (list, optional): List of previous messages for maintaining conversation context
+            session_id (str, optional): Conversation to continue; a new one is started if omitted
         """
-        #if context is None:
-        #    context = []
-        
-        # Add user's message to context
-        self.context.append({"role": "user", "content": user_message})
-        
-        # System message to define bot's behavior
-        system_message = {
-            "role": "system",
-            "content": """You are a helpful research assistant with expertise in analyzing and suggesting research ideas. 
-            You can help with:
-            1. Understanding research concepts
-            2. Suggesting improvements to research ideas
-            3. Recommending related papers and methodologies
-            4. Explaining technical concepts
-            5. Discussing research implications and potential directions
-            you are not allowed to give any special commands like /generate domains | specifications, /improve {json_data}
-            and /recommend {json_data}.
-            Keep responses conversational but informative."""
-        }
-        
-        # Prepare messages for chat
-        messages = [system_message] + self.context
+        if session_id is None:
+            session_id = new_session_id()
+        history = self.sessions.get(session_id)
+        user_turn = {"role": "user", "content": user_message}
         
         try:
             # Get response from Mistral
-            response = self.client.chat.complete(
-                model=self.model,
-                messages=messages
-            )
+            assistant_message = self._complete(self._chat_messages(history, user_turn), "chat")
             
-            # Add assistant's response to context
-            assistant_message = response.choices[0].message.content
-            self.context.append({"role": "assistant", "content": assistant_message})
+            # Store both turns in the session's history
+            assistant_turn = {"role": "assistant", "content": assistant_message}
+            self.sessions.append(session_id, user_turn, assistant_turn)
             
             return {
                 "response": assistant_message,
-                "context": self.context
+                "session_id": session_id,
+                "context": history + [user_turn, assistant_turn]
             }
         except Exception as e:
             return {
                 "error": f"Error in chat: {str(e)}",
-                "context": self.context
+                "session_id": session_id,
+                "context": history
             }
 
 # def test_mistral_chat():
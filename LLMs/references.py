@@ -0,0 +1,217 @@
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from Ingestion.catalog import PaperCatalog, catalog_from_env, normalize_title
+
+
+def trigrams(title: str):
+    text = f"  {normalize_title(title)} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def dice(a: set, b: set):
+    return 2 * len(a & b) / (len(a) + len(b)) if a or b else 0.0
+
+
+class TrigramIndex:
+    """
+    Character-trigram postings over titles. `best` only scores titles that
+    share at least one trigram with the query, and ranks them by the Dice
+    coefficient of their trigram sets.
+    """
+
+    def __init__(self):
+        self.postings = defaultdict(list)
+        self.sizes = []
+        self.items = []
+
+    def add(self, title: str, item):
+        grams = trigrams(title)
+        item_id = len(self.items)
+        for gram in grams:
+            self.postings[gram].append(item_id)
+        self.sizes.append(len(grams))
+        self.items.append(item)
+
+    def best(self, title: str, threshold: float):
+        """(item, score) of the closest title scoring at least `threshold`, else (None, 0.0)."""
+        grams = trigrams(title)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        best, best_score = None, 0.0
+        for item_id, count in shared.items():
+            score = 2 * count / (len(grams) + self.sizes[item_id])
+            if score > best_score:
+                best, best_score = item_id, score
+        if best is None or best_score < threshold:
+            return None, 0.0
+        return self.items[best], best_score
+
+
+class ReferenceResolver:
+    """
+    Resolves the references of one response against the snippets its prompt
+    was built from. Built once per request, so streamed ideas share the
+    snippet index and every reference is looked up only once.
+    """
+
+    def __init__(self, validator, triples):
+        self.validator = validator
+        self.snippet_links = {}
+        self.snippet_titles = TrigramIndex()
+        for triple in triples:
+            if triple["link"] not in self.snippet_links:
+                self.snippet_links[triple["link"]] = triple
+                self.snippet_titles.add(triple["title"], triple)
+        self.resolved = {}
+
+    def _from_snippets(self, title, link):
+        if title:
+            match, _ = self.snippet_titles.best(title, self.validator.threshold)
+            if match is not None:
+                return match["title"], match["link"]
+        if link in self.snippet_links:
+            match = self.snippet_links[link]
+            return match["title"], match["link"]
+        return None
+
+    def _from_catalog(self, pending):
+        """Resolves (title, link) pairs in bulk: one query by title, one by link, then fuzzy."""
+        catalog = self.validator.catalog
+        titles = catalog.by_titles(title for title, _ in pending if title)
+        links = catalog.by_links(link for _, link in pending if link)
+        for title, link in pending:
+            paper = titles.get(normalize_title(title)) if title else None
+            if paper is None and link:
+                paper = links.get(link)
+            if paper is None and title:
+                candidates = TrigramIndex()
+                for candidate in catalog.similar_titles(title):
+                    candidates.add(candidate["title"], candidate)
+                paper, _ = candidates.best(title, self.validator.threshold)
+            if paper is not None:
+                self.resolved[(title, link)] = (paper["title"], paper["gcs_link"] or link)
+
+    def _keys(self, references):
+        items = references.values() if isinstance(references, dict) else references
+        for reference in items:
+            if isinstance(reference, dict):
+                yield reference.get("title"), reference.get("link")
+            elif isinstance(reference, str):
+                yield reference, None
+
+    def _resolve_all(self, reference_lists):
+        pending = []
+        for references in reference_lists:
+            for key in self._keys(references):
+                if key in self.resolved or key in pending:
+                    continue
+                found = self._from_snippets(*key)
+                if found is not None:
+                    self.resolved[key] = found
+                else:
+                    pending.append(key)
+        if pending and self.validator.catalog is not None:
+            self._from_catalog(pending)
+        for key in pending:
+            self.resolved.setdefault(key, None)
+
+    def _rewrite(self, references):
+        """The references that resolved, with canonical title and link, duplicates removed."""
+        kept, seen = [], set()
+        items = references.values() if isinstance(references, dict) else references
+        for reference, key in zip(items, self._keys(references)):
+            found = self.resolved.get(key)
+            if found is None or found in seen:
+                self.validator.count("dropped")
+                continue
+            seen.add(found)
+            self.validator.count("kept" if found == key or (isinstance(reference, str) and found[0] == key[0])
+                                 else "rewritten")
+            if isinstance(reference, str):
+                kept.append(found[0])
+            else:
+                kept.append(dict(reference, title=found[0], link=found[1]))
+        if isinstance(references, dict):
+            return {str(i): reference for i, reference in enumerate(kept, 1)}
+        return kept
+
+    def fix(self, result):
+        """Validates every reference in a parsed response in one batch; edits it in place."""
+        started = time.perf_counter()
+        targets = []
+        for section in ("ideas", "improved_idea"):
+            ideas = result.get(section) if isinstance(result, dict) else None
+            for idea in ideas if isinstance(ideas, list) else ():
+                for field in ("references", "Existing_work"):
+                    if isinstance(idea, dict) and isinstance(idea.get(field), (dict, list)):
+                        targets.append((idea, field))
+        self._resolve_all(idea[field] for idea, field in targets)
+        for idea, field in targets:
+            idea[field] = self._rewrite(idea[field])
+        self.validator.timed(time.perf_counter() - started)
+        return result
+
+
+class ReferenceValidator:
+    """
+    Checks the references an LLM attaches to its ideas before they reach
+    users. A reference is kept if its title matches a retrieved snippet's
+    title (trigram similarity >= `threshold`) or its link is one of the
+    snippets' links; failing that, it is looked up in the local
+    PaperCatalog by normalized title, by GCS link and by fuzzy title. Kept
+    references get the matched paper's real title and link; the rest are
+    dropped.
+    """
+
+    def __init__(self, catalog: PaperCatalog = None, threshold: float = 0.6, enabled: bool = True):
+        self.catalog = catalog
+        self.threshold = threshold
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.calls = 0
+
+    def resolver(self, triples):
+        return ReferenceResolver(self, triples)
+
+    def fix(self, result, triples):
+        if not self.enabled:
+            return result
+        return self.resolver(triples).fix(result)
+
+    def count(self, outcome: str):
+        with self.lock:
+            self.counts[outcome] += 1
+
+    def timed(self, seconds: float):
+        with self.lock:
+            self.calls += 1
+            self.seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def stats(self):
+        return {
+            "kept": self.counts["kept"],
+            "rewritten": self.counts["rewritten"],
+            "dropped": self.counts["dropped"],
+            "responses": self.calls,
+            "mean_ms": 1000 * self.seconds / self.calls if self.calls else 0.0,
+            "max_ms": 1000 * self.max_seconds
+        }
+
+
+def reference_validator_from_env():
+    """
+    REFERENCE_VALIDATION=0 turns validation off; PAPER_CATALOG_DB adds the
+    local catalog behind the snippet check.
+    """
+    return ReferenceValidator(
+        catalog=catalog_from_env(),
+        threshold=float(os.environ.get("REFERENCE_MATCH_THRESHOLD", 0.6)),
+        enabled=os.environ.get("REFERENCE_VALIDATION", "1") != "0"
+    )
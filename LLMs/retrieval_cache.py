@@ -0,0 +1,140 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_query(query: str):
+    """Casefold and collapse whitespace so trivially different queries share a key."""
+    return re.sub(r"\s+", " ", query).strip().casefold()
+
+
+def normalize_domains(domains: list):
+    """Order-independent, case-insensitive, de-duplicated list of domains."""
+    seen = {}
+    for domain in domains:
+        cleaned = re.sub(r"\s+", " ", domain).strip()
+        if cleaned:
+            seen.setdefault(cleaned.casefold(), cleaned)
+    return [seen[key] for key in sorted(seen)]
+
+
+class RetrievalCache:
+    """
+    Cache of cleaned snippet lists keyed on the normalized search query.
+
+    The first tier is a per-process LRU with a TTL. If `disk_path` is given a
+    second SQLite tier is shared by every gunicorn worker on the instance;
+    disk hits are promoted into memory. Disk rows older than the TTL are
+    dropped on every put, and the oldest rows only once the table holds more
+    than `max_disk_entries`; both go through the stored_at index.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600.0,
+                 disk_path: str = None, max_disk_entries: int = 20000, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.max_disk_entries = max_disk_entries
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk_path:
+            self._connect().executescript("""
+                CREATE TABLE IF NOT EXISTS retrieval_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    stored_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS retrieval_cache_stored_at ON retrieval_cache(stored_at);
+            """)
+
+    def _connect(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.disk_path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        now = self.clock()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl:
+                    self.entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[1]
+                del self.entries[key]
+
+        if self.disk_path:
+            row = self._connect().execute(
+                "SELECT value, stored_at FROM retrieval_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] <= self.ttl:
+                value = json.loads(row[0])
+                self._remember(key, value, row[1])
+                with self.lock:
+                    self.disk_hits += 1
+                return value
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def _remember(self, key, value, stored_at):
+        with self.lock:
+            self.entries[key] = (stored_at, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def put(self, key: str, value):
+        if self.max_entries <= 0:
+            return
+        now = self.clock()
+        self._remember(key, value, now)
+        if self.disk_path:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO retrieval_cache(key, value, stored_at) VALUES (?, ?, ?)",
+                         (key, json.dumps(value), now))
+            conn.execute("DELETE FROM retrieval_cache WHERE stored_at < ?", (now - self.ttl,))
+            over = conn.execute("SELECT COUNT(*) FROM retrieval_cache").fetchone()[0] - self.max_disk_entries
+            if over > 0:
+                conn.execute("""
+                    DELETE FROM retrieval_cache WHERE key IN (
+                        SELECT key FROM retrieval_cache ORDER BY stored_at LIMIT ?
+                    )""", (over,))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+        if self.disk_path:
+            self._connect().execute("DELETE FROM retrieval_cache")
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+        }
+
+
+def retrieval_cache_from_env():
+    """RETRIEVAL_CACHE_SIZE=0 disables caching; RETRIEVAL_CACHE_DB enables the shared disk tier."""
+    return RetrievalCache(
+        max_entries=int(os.environ.get("RETRIEVAL_CACHE_SIZE", 512)),
+        ttl=float(os.environ.get("RETRIEVAL_CACHE_TTL", 3600)),
+        disk_path=os.environ.get("RETRIEVAL_CACHE_DB")
+    )
@@ -0,0 +1,285 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import httpx
+from mistralai import Mistral, models
+from Chatbot.sessions import estimate_tokens
+
+DEFAULT_MODEL = "mistral-large-latest"
+DEFAULT_ROUTES = "chat=mistral-small-latest,improve=mistral-small-latest"
+DEFAULT_FALLBACKS = "mistral-large-latest>mistral-small-latest>ministral-8b-latest"
+DEFAULT_TIMEOUTS = "mistral-large-latest=90,mistral-small-latest=45,ministral-8b-latest=30"
+# latency samples needed before MODEL_HEDGE_AFTER=p95 starts hedging
+MIN_HEDGE_SAMPLES = 20
+
+
+def retryable(error: BaseException):
+    """Whether a failed call should go to the next tier: timeouts, connection errors, 429s and 5xx."""
+    if isinstance(error, (httpx.TimeoutException, httpx.TransportError, TimeoutError)):
+        return True
+    if isinstance(error, models.SDKError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+class ModelStats:
+    """Call and error counts and a window of recent latencies of one model."""
+
+    def __init__(self, window: int = 256):
+        self.latencies = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds: float, ok: bool):
+        with self.lock:
+            self.calls += 1
+            if ok:
+                self.latencies.append(seconds)
+            else:
+                self.errors += 1
+
+    def quantile(self, q: float):
+        with self.lock:
+            latencies = sorted(self.latencies)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def snapshot(self):
+        return {"calls": self.calls, "errors": self.errors,
+                "p50": self.quantile(0.5), "p95": self.quantile(0.95)}
+
+
+class ModelRouter:
+    """
+    Picks the model for each completion and rides out slow or failing ones.
+
+    The model comes from `routes` (endpoint -> model, else `default_model`),
+    except that prompts over `long_prompt_tokens` go to `long_prompt_model`.
+    Each model may have a chain of `fallbacks` (model -> next model) and a
+    `timeouts` entry in seconds. A call that times out, cannot connect or
+    gets a 429 or 5xx is retried on the next model of the chain.
+
+    With `hedge_after` (seconds, or "p95" for the model's recent 95th
+    percentile latency), a call that has not finished by then gets a backup
+    call to the next model of its chain, and whichever answers first wins.
+    A losing async call is cancelled; a losing sync call runs to completion
+    on its thread, and its result is dropped.
+
+    `call(client, model, timeout)` makes the actual request, so the router
+    serves the sync and async chat classes alike. Results come back as
+    (content, model that answered).
+    """
+
+    def __init__(self, client: Mistral, default_model: str = DEFAULT_MODEL, routes: dict = None,
+                 fallbacks: dict = None, timeouts: dict = None, clients: dict = None,
+                 long_prompt_tokens: int = 0, long_prompt_model: str = None, hedge_after=0.0):
+        self.client = client
+        self.default_model = default_model
+        self.routes = routes or {}
+        self.fallbacks = fallbacks or {}
+        self.timeouts = timeouts or {}
+        self.clients = clients or {}
+        self.long_prompt_tokens = long_prompt_tokens
+        self.long_prompt_model = long_prompt_model or default_model
+        self.hedge_after = hedge_after
+        self.stats = {}
+        self.stats_lock = threading.Lock()
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.fallback_calls = 0
+        self.pool = None
+
+    def select(self, endpoint: str, messages: list):
+        if self.long_prompt_tokens and sum(
+                estimate_tokens(m["content"]) for m in messages) > self.long_prompt_tokens:
+            return self.long_prompt_model
+        return self.routes.get(endpoint, self.default_model)
+
+    def tiers(self, model: str):
+        chain = [model]
+        while self.fallbacks.get(chain[-1]) and self.fallbacks[chain[-1]] not in chain:
+            chain.append(self.fallbacks[chain[-1]])
+        return chain
+
+    def client_for(self, model: str):
+        return self.clients.get(model, self.client)
+
+    def timeout_for(self, model: str, timeout: float = None):
+        limits = [t for t in (self.timeouts.get(model), timeout) if t]
+        return min(limits) if limits else None
+
+    def model_stats(self, model: str):
+        with self.stats_lock:
+            stats = self.stats.get(model)
+            if stats is None:
+                stats = self.stats[model] = ModelStats()
+            return stats
+
+    def hedge_delay(self, model: str):
+        if self.hedge_after == "p95":
+            stats = self.model_stats(model)
+            return stats.quantile(0.95) if len(stats.latencies) >= MIN_HEDGE_SAMPLES else None
+        return self.hedge_after or None
+
+    def _timed(self, call, model: str, timeout: float):
+        started = time.perf_counter()
+        try:
+            content = call(self.client_for(model), model, self.timeout_for(model, timeout))
+        except Exception:
+            self.model_stats(model).observe(time.perf_counter() - started, False)
+            raise
+        self.model_stats(model).observe(time.perf_counter() - started, True)
+        return content, model
+
+    def _hedged(self, call, model: str, backup: str, timeout: float):
+        delay = self.hedge_delay(model) if backup else None
+        if delay is None:
+            return self._timed(call, model, timeout)
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="hedge")
+        # the calls run in copies of this context so their spans stay in the request's trace
+        primary = self.pool.submit(contextvars.copy_context().run, self._timed, call, model, timeout)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        self.hedges += 1
+        pending = {primary, self.pool.submit(contextvars.copy_context().run, self._timed, call, backup, timeout)}
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None or not pending:
+                    content, answered = future.result()
+                    self.hedge_wins += answered == backup
+                    return content, answered
+
+    def complete(self, call, endpoint: str, messages: list, timeout: float = None):
+        tiers = self.tiers(self.select(endpoint, messages))
+        for i, model in enumerate(tiers):
+            backup = tiers[i + 1] if i + 1 < len(tiers) else None
+            try:
+                return self._hedged(call, model, backup, timeout)
+            except Exception as e:
+                if backup is None or not retryable(e):
+                    raise
+                self.fallback_calls += 1
+
+    async def _timed_async(self, call, model: str, timeout: float):
+        started = time.perf_counter()
+        try:
+            content = await call(self.client_for(model), model, self.timeout_for(model, timeout))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.model_stats(model).observe(time.perf_counter() - started, False)
+            raise
+        self.model_stats(model).observe(time.perf_counter() - started, True)
+        return content, model
+
+    async def _hedged_async(self, call, model: str, backup: str, timeout: float):
+        delay = self.hedge_delay(model) if backup else None
+        if delay is None:
+            return await self._timed_async(call, model, timeout)
+        primary = asyncio.ensure_future(self._timed_async(call, model, timeout))
+        done, _ = await asyncio.wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        self.hedges += 1
+        pending = {primary, asyncio.ensure_future(self._timed_async(call, backup, timeout))}
+        try:
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None or not pending:
+                        content, answered = task.result()
+                        self.hedge_wins += answered == backup
+                        return content, answered
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def complete_async(self, call, endpoint: str, messages: list, timeout: float = None):
+        tiers = self.tiers(self.select(endpoint, messages))
+        for i, model in enumerate(tiers):
+            backup = tiers[i + 1] if i + 1 < len(tiers) else None
+            try:
+                return await self._hedged_async(call, model, backup, timeout)
+            except Exception as e:
+                if backup is None or not retryable(e):
+                    raise
+                self.fallback_calls += 1
+
+    def snapshot(self):
+        with self.stats_lock:
+            models_ = dict(self.stats)
+        return {
+            "models": {model: stats.snapshot() for model, stats in models_.items()},
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "fallbacks": self.fallback_calls
+        }
+
+    def register_metrics(self, metrics):
+        def per_model(fn):
+            with self.stats_lock:
+                items = list(self.stats.items())
+            return [((model,), value) for model, stats in items if (value := fn(stats)) is not None]
+
+        metrics.callback("inspireit_model_calls_total", "Completions sent to each model.", "counter",
+                         ["model"], lambda: per_model(lambda s: s.calls))
+        metrics.callback("inspireit_model_errors_total", "Completions that failed, by model.", "counter",
+                         ["model"], lambda: per_model(lambda s: s.errors))
+        for q in (0.5, 0.95):
+            metrics.callback(f"inspireit_model_latency_p{int(q * 100)}_seconds",
+                             f"{int(q * 100)}th percentile latency of each model's recent completions.",
+                             "gauge", ["model"], lambda q=q: per_model(lambda s: s.quantile(q)))
+        metrics.callback("inspireit_model_hedging_total", "Hedged completions, and how many the backup won.",
+                         "counter", ["outcome"], lambda: [(("hedged",), self.hedges),
+                                                          (("backup_won",), self.hedge_wins)])
+        metrics.callback("inspireit_model_fallbacks_total", "Completions retried on a fallback model.",
+                         "counter", [], lambda: [((), self.fallback_calls)])
+
+
+def _pairs(value: str, cast=str):
+    return {key.strip(): cast(item.strip()) for key, item in
+            (pair.split("=", 1) for pair in value.split(",") if pair.strip())}
+
+
+def _chains(value: str):
+    """"a>b>c,x>y" -> {"a": "b", "b": "c", "x": "y"}"""
+    fallbacks = {}
+    for chain in value.split(","):
+        models_ = [model.strip() for model in chain.split(">") if model.strip()]
+        fallbacks.update(zip(models_, models_[1:]))
+    return fallbacks
+
+
+def model_router_from_env(client: Mistral, api_key: str = None):
+    """
+    MODEL_DEFAULT, MODEL_ROUTES ("endpoint=model,..."; the endpoints are
+    ideas, idea_seeds, improve, recommend and chat), MODEL_LONG_PROMPT_TOKENS
+    and MODEL_LONG_PROMPT, MODEL_FALLBACKS ("large>small>tiny,..."; empty
+    for none), MODEL_TIMEOUTS ("model=seconds,..."), MODEL_HEDGE_AFTER
+    (seconds, "p95", or 0 for no hedging) and MODEL_SERVER_URLS
+    ("model=url,...", for models served from somewhere else).
+    """
+    hedge_after = os.environ.get("MODEL_HEDGE_AFTER", "0")
+    clients = {model: Mistral(api_key=api_key, server_url=url)
+               for model, url in _pairs(os.environ.get("MODEL_SERVER_URLS", "")).items()}
+    return ModelRouter(
+        client,
+        default_model=os.environ.get("MODEL_DEFAULT", DEFAULT_MODEL),
+        routes=_pairs(os.environ.get("MODEL_ROUTES", DEFAULT_ROUTES)),
+        fallbacks=_chains(os.environ.get("MODEL_FALLBACKS", DEFAULT_FALLBACKS)),
+        timeouts=_pairs(os.environ.get("MODEL_TIMEOUTS", DEFAULT_TIMEOUTS), float),
+        clients=clients,
+        long_prompt_tokens=int(os.environ.get("MODEL_LONG_PROMPT_TOKENS", 0)),
+        long_prompt_model=os.environ.get("MODEL_LONG_PROMPT"),
+        hedge_after=hedge_after if hedge_after == "p95" else float(hedge_after)
+    )
@@ -0,0 +1,127 @@
+from typing import ClassVar, Dict, List, Optional, Union
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator
+from LLMs.json_repair import JSONRepairError, loads_checked
+
+
+class ResponseModel(BaseModel):
+    # fields the prompt did not ask for are kept, so the response shape
+    # callers see does not change
+    model_config = ConfigDict(extra="allow")
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return value
+
+
+def _dict_or_list(value):
+    return {} if value is None else value
+
+
+class Reference(ResponseModel):
+    title: str = ""
+    link: Optional[str] = None
+
+
+class Idea(ResponseModel):
+    title: str
+    summary: str = ""
+    opportunities: List[str] = []
+    drawbacks: List[str] = []
+    references: Union[Dict[str, Union[Reference, str]], List[Union[Reference, str]]] = {}
+
+    _lists = field_validator("opportunities", "drawbacks", mode="before")(_as_list)
+    _references = field_validator("references", mode="before")(_dict_or_list)
+
+
+class IdeasResponse(ResponseModel):
+    root_field: ClassVar[str] = "ideas"
+    ideas: List[Idea]
+
+
+class IdeaSeed(ResponseModel):
+    title: str
+    angle: str = ""
+
+
+class IdeaSeedsResponse(ResponseModel):
+    root_field: ClassVar[str] = "seeds"
+    seeds: List[IdeaSeed]
+
+
+class ImprovedIdea(ResponseModel):
+    title: str
+    description: str = ""
+    opportunities: List[str] = []
+    drawbacks: List[str] = []
+    references: List[Union[str, Reference]] = []
+
+    _lists = field_validator("opportunities", "drawbacks", "references", mode="before")(_as_list)
+
+
+class ImprovementResponse(ResponseModel):
+    root_field: ClassVar[str] = "improved_idea"
+    improved_idea: List[ImprovedIdea]
+
+
+class RecommendedIdea(ResponseModel):
+    title: str
+    Abstract: str = ""
+    Methodology_recommended: str = ""
+    Existing_work: List[Union[str, Reference]] = []
+
+    _lists = field_validator("Existing_work", mode="before")(_as_list)
+
+
+class RecommendResponse(ResponseModel):
+    root_field: ClassVar[str] = "improved_idea"
+    improved_idea: List[RecommendedIdea]
+
+
+RESPONSE_SCHEMAS = {
+    "ideas": IdeasResponse,
+    "idea_seeds": IdeaSeedsResponse,
+    "improve": ImprovementResponse,
+    "recommend": RecommendResponse,
+}
+
+
+class ResponseParseError(ValueError):
+    pass
+
+
+def parse_response(content: str, schema=None):
+    """
+    Parses model output with json_repair.loads and, given a schema, validates
+    it and returns the validated dict. A bare list is taken as the schema's
+    root list. Raises ResponseParseError.
+    """
+    value, _ = parse_response_checked(content, schema)
+    return value
+
+
+def parse_response_checked(content: str, schema=None):
+    """
+    Like parse_response, but returns (value, truncated). When the output was
+    cut off, the last element of the root list is dropped (if it has more
+    than one), since it is the one the cut went through even when it still
+    validates; callers should not cache a truncated result.
+    """
+    try:
+        value, truncated = loads_checked(content)
+    except JSONRepairError as e:
+        raise ResponseParseError(str(e)) from e
+    if schema is None:
+        return value, truncated
+    if isinstance(value, list):
+        value = {schema.root_field: value}
+    items = value.get(schema.root_field) if isinstance(value, dict) else None
+    if truncated and isinstance(items, list) and len(items) > 1:
+        value = dict(value, **{schema.root_field: items[:-1]})
+    try:
+        return schema.model_validate(value).model_dump(exclude_none=True), truncated
+    except ValidationError as e:
+        raise ResponseParseError(f"response does not match {schema.__name__}: {e.error_count()} errors") from e
@@ -0,0 +1,134 @@
+import asyncio
+import random
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def bearer_token(headers: dict):
+    return headers.get("Authorization", "").removeprefix("Bearer ")
+
+
+def backoff_delay(attempt: int, backoff_factor: float, max_backoff: float, retry_after=None):
+    """
+    Seconds to wait before retry number `attempt` (0-based). A numeric
+    Retry-After header from the server wins over exponential backoff.
+    """
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), max_backoff)
+        except ValueError:
+            pass
+    delay = backoff_factor * (2 ** attempt)
+    return min(delay + random.uniform(0, backoff_factor), max_backoff)
+
+
+class SearchClient:
+    """
+    Keep-alive, connection-pooled client for the Discovery Engine :search
+    endpoint. One instance is shared by all prompt methods of a MistralChat so
+    the TCP+TLS handshake is paid once per pooled connection, not per call.
+
+    With `credentials` (a TokenManager), a 401 invalidates the token that was
+    sent and the search is retried once with a freshly fetched one, so a token
+    revoked before its scheduled refresh costs one failed request.
+    """
+
+    def __init__(self, endpoint_url: str, pool_size: int = 10,
+                 connect_timeout: float = 5.0, read_timeout: float = 30.0,
+                 max_retries: int = 3, backoff_factor: float = 0.5,
+                 max_backoff: float = 8.0, verify=True, credentials=None):
+        self.endpoint_url = endpoint_url
+        self.credentials = credentials
+        self.timeout = (connect_timeout, read_timeout)
+        # passed per request: Session.verify loses to REQUESTS_CA_BUNDLE
+        self.verify = verify
+        self.session = requests.Session()
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            backoff_max=max_backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"POST"}),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                              max_retries=retry, pool_block=False)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _post(self, payload: dict, headers: dict):
+        return self.session.post(
+            self.endpoint_url, headers=headers, json=payload, timeout=self.timeout,
+            verify=self.verify)
+
+    def search(self, payload: dict, headers: dict):
+        response = self._post(payload, headers)
+        if response.status_code == 401 and self.credentials is not None:
+            self.credentials.invalidate(bearer_token(headers))
+            headers = dict(headers, Authorization=f"Bearer {self.credentials.get_token()}")
+            response = self._post(payload, headers)
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncSearchClient:
+    """
+    asyncio counterpart of SearchClient built on a pooled httpx.AsyncClient.
+    httpx has no built-in status retries, so 429/5xx are retried here with
+    the same backoff policy, and a 401 the same way as SearchClient.
+    """
+
+    def __init__(self, endpoint_url: str, pool_size: int = 10,
+                 connect_timeout: float = 5.0, read_timeout: float = 30.0,
+                 max_retries: int = 3, backoff_factor: float = 0.5,
+                 max_backoff: float = 8.0, verify=True, credentials=None):
+        self.endpoint_url = endpoint_url
+        self.credentials = credentials
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.http = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size,
+                                max_keepalive_connections=pool_size),
+            verify=verify
+        )
+
+    async def search(self, payload: dict, headers: dict):
+        attempt = 0
+        reauthorized = False
+        while True:
+            try:
+                response = await self.http.post(
+                    self.endpoint_url, headers=headers, json=payload)
+            except httpx.TransportError:
+                if attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt, self.backoff_factor, self.max_backoff))
+                attempt += 1
+                continue
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                await asyncio.sleep(backoff_delay(
+                    attempt, self.backoff_factor, self.max_backoff,
+                    response.headers.get("Retry-After")))
+                attempt += 1
+                continue
+            if response.status_code == 401 and self.credentials is not None and not reauthorized:
+                self.credentials.invalidate(bearer_token(headers))
+                headers = dict(headers, Authorization=f"Bearer {await self.credentials.get_token_async()}")
+                reauthorized = True
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    async def aclose(self):
+        await self.http.aclose()
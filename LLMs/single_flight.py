@@ -0,0 +1,192 @@
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+
+def flight_key(endpoint: str, value):
+    return f"{endpoint}:{json.dumps(value, sort_keys=True, default=str)}"
+
+
+class FileFlight:
+    """
+    Coalesces identical requests across worker processes on one host.
+
+    Each key has a lock file in `directory`. The first worker to take the
+    flock computes the result and writes it next to the lock before
+    releasing it; workers that were blocked on the lock meanwhile read that
+    result instead of computing their own. A result is only used by workers
+    that arrived before it was written, so this never acts as a cache.
+    Error results ("error" in the dict) are not shared, and files older than
+    `max_age` seconds are swept.
+    """
+
+    def __init__(self, directory: str, max_age: float = 600.0):
+        import fcntl
+        self.fcntl = fcntl
+        self.directory = directory
+        self.max_age = max_age
+        self.last_sweep = 0.0
+        self.shared_hits = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str, suffix: str):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + suffix)
+
+    def _lock(self, key: str):
+        fd = os.open(self._path(key, ".lock"), os.O_CREAT | os.O_RDWR, 0o644)
+        self.fcntl.flock(fd, self.fcntl.LOCK_EX)
+        return fd
+
+    def _read(self, key: str, arrived: float):
+        path = self._path(key, ".json")
+        try:
+            if os.stat(path).st_mtime < arrived:
+                return None
+            with open(path) as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self.shared_hits += 1
+        return result
+
+    def _write(self, key: str, result):
+        if not isinstance(result, dict) or "error" in result:
+            return
+        path = self._path(key, ".json")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(result, f)
+        os.replace(tmp, path)
+        self._sweep()
+
+    def _sweep(self):
+        now = time.time()
+        if now - self.last_sweep < 60:
+            return
+        self.last_sweep = now
+        for entry in os.scandir(self.directory):
+            try:
+                if now - entry.stat().st_mtime > self.max_age:
+                    os.unlink(entry.path)
+            except OSError:
+                pass
+
+    def do(self, key: str, fn):
+        arrived = time.time()
+        fd = self._lock(key)
+        try:
+            result = self._read(key, arrived)
+            if result is None:
+                result = fn()
+                self._write(key, result)
+            return result
+        finally:
+            os.close(fd)
+
+    async def do_async(self, key: str, fn):
+        arrived = time.time()
+        fd = await asyncio.to_thread(self._lock, key)
+        try:
+            result = self._read(key, arrived)
+            if result is None:
+                result = await fn()
+                self._write(key, result)
+            return result
+        finally:
+            os.close(fd)
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time: threads that ask for a key
+    already in flight wait for that call and get a deep copy of its result
+    (or its exception). With `shared`, the leader also goes through a
+    FileFlight so other worker processes can join in.
+    """
+
+    def __init__(self, enabled: bool = True, shared: FileFlight = None):
+        self.enabled = enabled
+        self.shared = shared
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn):
+        if not self.enabled:
+            return fn()
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = self.calls[key] = Future()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return copy.deepcopy(future.result())
+        try:
+            result = self.shared.do(key, fn) if self.shared is not None else fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self.calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "cross_worker": self.shared.shared_hits if self.shared is not None else 0
+        }
+
+
+class AsyncSingleFlight(SingleFlight):
+    """
+    SingleFlight for coroutines on one event loop. The shared call runs as
+    its own task, so a caller that disconnects does not cancel it for the
+    others.
+    """
+
+    async def do(self, key: str, fn):
+        if not self.enabled:
+            return await fn()
+        task = self.calls.get(key)
+        leader = task is None
+        if leader:
+            task = self.calls[key] = asyncio.ensure_future(self._run(key, fn))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        result = await asyncio.shield(task)
+        return result if leader else copy.deepcopy(result)
+
+    async def _run(self, key: str, fn):
+        try:
+            if self.shared is not None:
+                return await self.shared.do_async(key, fn)
+            return await fn()
+        finally:
+            del self.calls[key]
+
+
+def single_flight_from_env(cls=SingleFlight):
+    """
+    SINGLE_FLIGHT=0 turns coalescing off; SINGLE_FLIGHT_DIR (a local
+    directory every worker can reach) extends it across worker processes.
+    """
+    directory = os.environ.get("SINGLE_FLIGHT_DIR")
+    return cls(
+        enabled=os.environ.get("SINGLE_FLIGHT", "1") != "0",
+        shared=FileFlight(directory) if directory else None
+    )
@@ -0,0 +1,92 @@
+import json
+from LLMs import json_repair
+
+
+def sse_event(event: str, data):
+    """Format one Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class JSONArrayStreamParser:
+    """
+    Incremental parser for streamed completions shaped like
+    {"ideas": [{...}, {...}]}.
+
+    `feed` takes the next chunk of model output and returns every element of
+    the first array inside the root object that was completed by that chunk,
+    so each idea can be sent to the browser as soon as its closing brace
+    arrives. Text before the root object (a ```json fence, prose) is skipped.
+    Elements that are not valid JSON go through json_repair; those that
+    still fail are dropped here, and the caller parses the full text at the
+    end.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.seen_root = False
+        self.array_depth = None
+        self.array_done = False
+        self.element = None
+
+    def feed(self, chunk: str):
+        completed = []
+        for ch in chunk:
+            if not self.seen_root:
+                if ch != "{":
+                    continue
+                self.seen_root = True
+
+            if self.element is not None:
+                self.element.append(ch)
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
+
+            if ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                self.depth += 1
+                if self.array_done:
+                    continue
+                if self.array_depth is None:
+                    if ch == "[" and self.depth == 2:
+                        self.array_depth = self.depth
+                elif self.depth == self.array_depth + 1 and self.element is None:
+                    self.element = [ch]
+            elif ch in "}]":
+                self.depth -= 1
+                if self.array_depth is None or self.array_done:
+                    continue
+                if self.element is not None and self.depth == self.array_depth:
+                    try:
+                        completed.append(json_repair.loads("".join(self.element)))
+                    except json_repair.JSONRepairError:
+                        pass
+                    self.element = None
+                elif ch == "]" and self.depth == self.array_depth - 1:
+                    self.array_done = True
+        return completed
+
+
+async def sse_stream(events):
+    """
+    Turns an async iterator of (event, data) pairs into SSE frames. Errors
+    after the response has started can no longer change the status code, so
+    they are reported as a final "error" event.
+    """
+    try:
+        async for event, data in events:
+            yield sse_event(event, data)
+    except Exception as e:
+        yield sse_event("error", {"error": str(e)})
+
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
@@ -0,0 +1,91 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mistralai import Mistral
+
+
+class ConnectionWarmer:
+    """
+    Opens a connection to a Mistral server while a request is still
+    retrieving and building its prompt, so the TCP and TLS handshakes are
+    off the critical path when the completion is sent.
+
+    A warm-up is a HEAD request to the server's base URL through the
+    client's own httpx pool; any response will do, since what is wanted is
+    the pooled keep-alive connection it leaves behind. The pool keeps idle
+    connections for about five seconds, so a server is warmed again only if
+    it has not been for `idle_seconds`. Under steady traffic that is one
+    extra request every few seconds, and connections are warm anyway.
+    Failures are counted and otherwise ignored; the completion will simply
+    open its own connection.
+    """
+
+    def __init__(self, enabled: bool = True, idle_seconds: float = 4.0, timeout: float = 5.0):
+        self.enabled = enabled
+        self.idle_seconds = idle_seconds
+        self.timeout = timeout
+        # id of the httpx client -> monotonic time of its last warm-up
+        self.warmed = {}
+        self.lock = threading.Lock()
+        self.pool = None
+        # async warm-ups in flight, referenced so they are not collected
+        self.tasks = set()
+        self.warmups = 0
+        self.failures = 0
+
+    def _due(self, http_client):
+        now = time.monotonic()
+        with self.lock:
+            if now - self.warmed.get(id(http_client), float("-inf")) < self.idle_seconds:
+                return False
+            self.warmed[id(http_client)] = now
+            self.warmups += 1
+            return True
+
+    def _request(self, client: Mistral, http_client):
+        url = client.sdk_configuration.get_server_details()[0]
+        return http_client.build_request("HEAD", url, timeout=self.timeout)
+
+    def _head(self, client: Mistral):
+        http_client = client.sdk_configuration.client
+        try:
+            http_client.send(self._request(client, http_client)).close()
+        except Exception:
+            self.failures += 1
+
+    def warm(self, client: Mistral):
+        """Starts warming `client`'s sync connection pool in the background, if it is due."""
+        if not self.enabled or not self._due(client.sdk_configuration.client):
+            return
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="warmup")
+        self.pool.submit(self._head, client)
+
+    async def _head_async(self, client: Mistral):
+        http_client = client.sdk_configuration.async_client
+        try:
+            await (await http_client.send(self._request(client, http_client))).aclose()
+        except Exception:
+            self.failures += 1
+
+    def warm_async(self, client: Mistral):
+        """Like warm, for the async pool, as a task on the running event loop."""
+        if not self.enabled or not self._due(client.sdk_configuration.async_client):
+            return
+        task = asyncio.ensure_future(self._head_async(client))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def stats(self):
+        return {"warmups": self.warmups, "failures": self.failures}
+
+
+def connection_warmer_from_env():
+    """LLM_WARMUP=0 turns warm-ups off; LLM_WARMUP_IDLE is the seconds before a server is warmed again."""
+    return ConnectionWarmer(
+        enabled=os.environ.get("LLM_WARMUP", "1") != "0",
+        idle_seconds=float(os.environ.get("LLM_WARMUP_IDLE", 4.0))
+    )
@@ -6,7 +6,7 @@ class ExtraSpecifications(BaseModel):
     specifications: str
 
 
-def recommendAcceptButton(data,chat):
+async def recommendAcceptButton(data,chat):
     sample_data = {
         "title": "This is the title",
         "Abstract": "This is the abstract",
@@ -14,10 +14,10 @@ def recommendAcceptButton(data,chat):
         "Existing work": ["this is a list of existing works"]
     }
    
-    return chat.recommend_ideas(data.model_dump())
+    return await chat.recommend_ideas(data.model_dump())
 
 
-def recommendSuggestionsButton(data,chat):
+async def recommendSuggestionsButton(data,chat):
     sample_data = {
         1: {
             "title": "This is the paper title",
@@ -68,9 +68,8 @@ def recommendSuggestionsButton(data,chat):
             }
         }
     }
-    print("Hello")
     #print(data.model_dump())
     #print(type(data.model_dump()))
-    return chat.suggestion_improvement_idea_prompt(data.model_dump())
+    return await chat.suggestion_improvement_idea_prompt(data.model_dump())
     #return data
     #return sample_data
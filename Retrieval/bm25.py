@@ -0,0 +1,112 @@
+import json
+import math
+import os
+from array import array
+import numpy as np
+from Retrieval.embeddings import tokenize
+
+
+class BM25Index:
+    """
+    Okapi BM25 over an inverted index with array-backed postings.
+
+    Each term's postings are two typed arrays (chunk ids and term
+    frequencies) rather than lists of Python ints, about 8 bytes per posting.
+    `add` appends a chunk at any time, so the index can grow as new papers
+    are ingested; chunk ids are assigned sequentially and match the ids in
+    the vector index and ChunkStore of the same directory.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab = {}
+        self.postings_ids = []
+        self.postings_tfs = []
+        self.doc_lengths = array("I")
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def add(self, text: str):
+        """Indexes one chunk and returns its id."""
+        chunk_id = len(self.doc_lengths)
+        counts = {}
+        terms = tokenize(text)
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, tf in counts.items():
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                term_id = self.vocab[term] = len(self.postings_ids)
+                self.postings_ids.append(array("I"))
+                self.postings_tfs.append(array("I"))
+            self.postings_ids[term_id].append(chunk_id)
+            self.postings_tfs[term_id].append(tf)
+        self.doc_lengths.append(len(terms))
+        self.total_length += len(terms)
+        return chunk_id
+
+    def idf(self, term: str):
+        """Inverse document frequency of a (tokenized) term; unseen terms get the highest."""
+        n = len(self.doc_lengths)
+        term_id = self.vocab.get(term)
+        df = len(self.postings_ids[term_id]) if term_id is not None else 0
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = 10):
+        """Returns (ids, scores) of the k best chunks for the query."""
+        n = len(self.doc_lengths)
+        if n == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32)
+        avg_length = self.total_length / n
+        scores = np.zeros(n, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            ids = np.frombuffer(self.postings_ids[term_id], dtype=np.uint32)
+            tfs = np.frombuffer(self.postings_tfs[term_id], dtype=np.uint32).astype(np.float32)
+            idf = self.idf(term)
+            norm = self.k1 * (1.0 - self.b + self.b * lengths[ids] / avg_length)
+            scores[ids] += idf * tfs * (self.k1 + 1.0) / (tfs + norm)
+        hits = np.flatnonzero(scores)
+        if len(hits) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        k = min(k, len(hits))
+        top = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return top.astype(np.int64), scores[top]
+
+    def save(self, directory: str):
+        """Writes the postings flattened into three arrays plus the vocabulary."""
+        os.makedirs(directory, exist_ok=True)
+        offsets = np.zeros(len(self.postings_ids) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(p) for p in self.postings_ids])
+        ids = np.empty(offsets[-1], dtype=np.uint32)
+        tfs = np.empty(offsets[-1], dtype=np.uint32)
+        for term_id, (p_ids, p_tfs) in enumerate(zip(self.postings_ids, self.postings_tfs)):
+            ids[offsets[term_id]:offsets[term_id + 1]] = p_ids
+            tfs[offsets[term_id]:offsets[term_id + 1]] = p_tfs
+        np.savez(os.path.join(directory, "bm25.npz"), offsets=offsets, ids=ids, tfs=tfs,
+                 doc_lengths=np.frombuffer(self.doc_lengths, dtype=np.uint32))
+        with open(os.path.join(directory, "bm25_vocab.json"), "w") as f:
+            json.dump({"k1": self.k1, "b": self.b, "vocab": self.vocab}, f)
+
+    @classmethod
+    def load(cls, directory: str):
+        with open(os.path.join(directory, "bm25_vocab.json")) as f:
+            config = json.load(f)
+        index = cls(config["k1"], config["b"])
+        index.vocab = config["vocab"]
+        data = np.load(os.path.join(directory, "bm25.npz"))
+        offsets, ids, tfs = data["offsets"], data["ids"], data["tfs"]
+        for term_id in range(len(offsets) - 1):
+            start, end = offsets[term_id], offsets[term_id + 1]
+            index.postings_ids.append(array("I", ids[start:end].tobytes()))
+            index.postings_tfs.append(array("I", tfs[start:end].tobytes()))
+        index.doc_lengths = array("I", data["doc_lengths"].tobytes())
+        index.total_length = int(data["doc_lengths"].sum())
+        return index
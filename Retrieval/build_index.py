@@ -0,0 +1,169 @@
+"""
+Builds a local retrieval index from PDFs downloaded by ArxivDownload.py.
+
+    python -m Retrieval.build_index --papers arxiv_papers --out local_index \
+        --link-prefix gs://<bucket>
+
+With --extracted, chunks come from an Ingestion.extract directory instead
+of parsing the PDFs again. With --append, papers whose link is already in
+--out are skipped and only the new ones are embedded and added to the
+existing index (see append_to_index).
+"""
+import argparse
+import glob
+import logging
+import os
+import time
+import numpy as np
+from pypdf import PdfReader
+from Retrieval.embeddings import HashingEmbedder
+from Retrieval.vector_index import IVFIndex
+from Retrieval.chunk_store import ChunkStore
+from Retrieval.retriever import save_embedder, load_embedder
+from Retrieval.bm25 import BM25Index
+from Ingestion.extract import iter_extracted_chunks
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+
+def extract_text(path: str):
+    reader = PdfReader(path)
+    return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+def chunk_words(text: str, size: int = 200, overlap: int = 40):
+    words = text.split()
+    step = max(1, size - overlap)
+    for start in range(0, max(1, len(words) - overlap), step):
+        chunk = words[start:start + size]
+        if chunk:
+            yield " ".join(chunk)
+
+
+def iter_paper_chunks(papers_dir: str, link_prefix: str = "", size: int = 200, overlap: int = 40):
+    """Yields chunk dicts for every arxiv_papers/YYYY-MM/*.pdf file."""
+    for path in sorted(glob.glob(os.path.join(papers_dir, "*", "*.pdf"))):
+        rel = os.path.relpath(path, papers_dir)
+        title = os.path.splitext(os.path.basename(path))[0]
+        link = f"{link_prefix.rstrip('/')}/{rel}" if link_prefix else path
+        try:
+            text = extract_text(path)
+        except Exception as e:
+            logging.error(f"Error extracting '{path}': {str(e)}")
+            continue
+        for chunk in chunk_words(text, size, overlap):
+            yield {"title": title, "link": link, "text": chunk}
+
+
+def build_index(chunks, out_dir: str, embedder=None, batch_size: int = 1024,
+                n_lists: int = None, nprobe: int = 8, dim: int = 384):
+    """
+    Embeds an iterable of chunk dicts and writes the vector index, the BM25
+    index and the chunk store to out_dir.
+
+    Chunks are stored and counted into BM25 first, then read back from the
+    chunk store to be embedded, so that the default embedder, a
+    HashingEmbedder of `dim` buckets, can weight words by their IDF over the
+    whole corpus.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    bm25 = BM25Index()
+
+    def stored():
+        for chunk in chunks:
+            bm25.add(chunk["text"])
+            yield chunk
+
+    count = ChunkStore.write(out_dir, stored())
+    if not count:
+        raise ValueError("No chunks to index")
+    embedder = embedder or HashingEmbedder(dim, bm25.idf)
+    texts = []
+    batches = []
+    store = ChunkStore(out_dir)
+    try:
+        for text in store.texts():
+            texts.append(text)
+            if len(texts) == batch_size:
+                batches.append(embedder(texts))
+                texts.clear()
+    finally:
+        store.close()
+    if texts:
+        batches.append(embedder(texts))
+    vectors = np.concatenate(batches)
+    index = IVFIndex.build(vectors, n_lists=n_lists, nprobe=nprobe)
+    index.save(out_dir)
+    bm25.save(out_dir)
+    save_embedder(out_dir, embedder)
+    return index
+
+
+def append_to_index(chunks, out_dir: str, embedder=None, batch_size: int = 1024):
+    """
+    Adds the chunks of papers not yet in out_dir to its chunk store, BM25
+    index and vector index, keeping the existing embeddings and IVF
+    quantizer; new chunks get the next ids. An IDF-weighted embedder takes
+    its weights from the BM25 index as it grows.
+    Returns how many were added.
+    """
+    indexed = ChunkStore(out_dir)
+    known = indexed.links()
+    first_id = len(indexed)
+    indexed.close()
+    bm25 = BM25Index.load(out_dir)
+    embedder = embedder or load_embedder(out_dir, bm25)
+    index = IVFIndex.load(out_dir)
+    texts = []
+    batches = []
+
+    def new_chunks():
+        for chunk in chunks:
+            if chunk["link"] in known:
+                continue
+            bm25.add(chunk["text"])
+            texts.append(chunk["text"])
+            if len(texts) == batch_size:
+                batches.append(embedder(texts))
+                texts.clear()
+            yield chunk
+
+    count = ChunkStore.append(out_dir, new_chunks())
+    if texts:
+        batches.append(embedder(texts))
+    if count:
+        index.add(np.concatenate(batches), np.arange(first_id, first_id + count))
+        index.save(out_dir)
+        bm25.save(out_dir)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--papers", default="arxiv_papers")
+    parser.add_argument("--out", default="local_index")
+    parser.add_argument("--extracted", help="Ingestion.extract output to index instead of --papers")
+    parser.add_argument("--link-prefix", default="",
+                        help="e.g. gs://bucket; links default to the local file path")
+    parser.add_argument("--chunk-words", type=int, default=200)
+    parser.add_argument("--overlap", type=int, default=40)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--append", action="store_true", help="add new papers to an existing --out index")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.extracted:
+        chunks = iter_extracted_chunks(args.extracted, args.link_prefix, args.papers)
+    else:
+        chunks = iter_paper_chunks(args.papers, args.link_prefix, args.chunk_words, args.overlap)
+    if args.append:
+        added = append_to_index(chunks, args.out)
+        print(f"Added {added} chunks in {time.perf_counter() - start:.1f}s -> {args.out}")
+        return
+    index = build_index(chunks, args.out, nprobe=args.nprobe, dim=args.dim)
+    print(f"Indexed {len(index)} chunks in {time.perf_counter() - start:.1f}s -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import json
+import os
+import numpy as np
+
+
+class ChunkStore:
+    """
+    Chunk metadata (title, link, text) for an index directory: one JSON line
+    per chunk in chunks.jsonl plus an array of byte offsets, so a lookup is a
+    seek and a single line read instead of holding every chunk in memory.
+    """
+
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, "chunks.jsonl")
+        self.offsets = np.load(os.path.join(directory, "chunk_offsets.npy"), mmap_mode="r")
+        self.file = open(self.path, "rb")
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def get(self, chunk_id: int):
+        self.file.seek(int(self.offsets[chunk_id]))
+        return json.loads(self.file.readline())
+
+    def close(self):
+        self.file.close()
+
+    @staticmethod
+    def write(directory: str, chunks):
+        """Writes an iterable of chunk dicts; returns how many were written."""
+        os.makedirs(directory, exist_ok=True)
+        offsets = []
+        with open(os.path.join(directory, "chunks.jsonl"), "wb") as f:
+            for chunk in chunks:
+                offsets.append(f.tell())
+                f.write(json.dumps(chunk).encode() + b"\n")
+        np.save(os.path.join(directory, "chunk_offsets.npy"), np.asarray(offsets, dtype=np.int64))
+        return len(offsets)
+
+    @staticmethod
+    def append(directory: str, chunks):
+        """Appends chunk dicts to an existing store; returns how many were added."""
+        old = np.load(os.path.join(directory, "chunk_offsets.npy"))
+        offsets = []
+        with open(os.path.join(directory, "chunks.jsonl"), "ab") as f:
+            for chunk in chunks:
+                offsets.append(f.tell())
+                f.write(json.dumps(chunk).encode() + b"\n")
+        np.save(os.path.join(directory, "chunk_offsets.npy"),
+                np.concatenate([old, np.asarray(offsets, dtype=np.int64)]))
+        return len(offsets)
+
+    def texts(self, start: int = 0):
+        """Chunk texts from id `start` on, read sequentially."""
+        if start >= len(self.offsets):
+            return
+        with open(self.path, "rb") as f:
+            f.seek(int(self.offsets[start]))
+            for line in f:
+                yield json.loads(line)["text"]
+
+    def links(self):
+        """Every distinct link in the store, read sequentially."""
+        with open(self.path, "rb") as f:
+            return {json.loads(line)["link"] for line in f}
@@ -0,0 +1,50 @@
+import re
+import zlib
+import numpy as np
+
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str):
+    return TOKEN_RE.findall(text.casefold())
+
+
+class HashingEmbedder:
+    """
+    Dependency-free CPU embedding: signed feature hashing of word unigrams and
+    bigrams into `dim` buckets, L2-normalized. Any callable mapping a list of
+    strings to an (n, dim) float32 array of unit vectors can be used instead,
+    e.g. a sentence-transformers model wrapped in a function.
+
+    Given `idf` (a function of a word, e.g. BM25Index.idf of the corpus being
+    indexed), each word counts idf squared and each bigram as much as its
+    commoner word. Unweighted, the common words of a chunk, which collisions
+    spread over every bucket, drown its rare technical terms, and dense
+    search finds almost nothing that BM25 does not rank better.
+    """
+
+    def __init__(self, dim: int = 384, idf=None):
+        self.dim = dim
+        self.idf = idf
+
+    def _embed_one(self, text: str, out):
+        words = tokenize(text)
+        grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        if self.idf is None:
+            weights = [1.0] * len(grams)
+        else:
+            word_weights = {word: self.idf(word) ** 2 for word in set(words)}
+            weights = [word_weights[word] for word in words] + \
+                      [min(word_weights[a], word_weights[b]) for a, b in zip(words, words[1:])]
+        for gram, weight in zip(grams, weights):
+            h = zlib.crc32(gram.encode())
+            out[h % self.dim] += weight if h & 0x80000000 else -weight
+
+    def __call__(self, texts: list):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            self._embed_one(text, vectors[i])
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
@@ -0,0 +1,138 @@
+import json
+import os
+import threading
+import numpy as np
+from abc import ABC, abstractmethod
+from Retrieval.embeddings import HashingEmbedder
+from Retrieval.vector_index import IVFIndex
+from Retrieval.chunk_store import ChunkStore
+from Retrieval.bm25 import BM25Index
+
+
+class Retriever(ABC):
+    """
+    Common interface for snippet sources. `search` returns up to `k` dicts
+    with "title", "snippet" and "link", the same triples get_clean_snippets
+    extracts from a Discovery Engine response.
+    """
+
+    @abstractmethod
+    def search(self, query: str, k: int):
+        pass
+
+
+def load_embedder(directory: str, bm25: BM25Index = None):
+    """
+    The embedder an index was built with. An IDF-weighted HashingEmbedder
+    takes its weights from the directory's BM25 index; pass `bm25` if it is
+    already loaded.
+    """
+    with open(os.path.join(directory, "embedder.json")) as f:
+        config = json.load(f)
+    if config["type"] != "hashing":
+        raise ValueError(f"Unknown embedder type {config['type']!r}; pass an embedder explicitly")
+    if not config.get("idf"):
+        return HashingEmbedder(config["dim"])
+    return HashingEmbedder(config["dim"], (bm25 or BM25Index.load(directory)).idf)
+
+
+def save_embedder(directory: str, embedder):
+    config = {"type": "hashing", "dim": embedder.dim, "idf": embedder.idf is not None} \
+        if isinstance(embedder, HashingEmbedder) else {"type": type(embedder).__name__}
+    with open(os.path.join(directory, "embedder.json"), "w") as f:
+        json.dump(config, f)
+
+
+class LocalVectorRetriever(Retriever):
+    """Dense retrieval over an index directory written by Retrieval.build_index."""
+
+    def __init__(self, directory: str, embedder=None, nprobe: int = None):
+        self.index = IVFIndex.load(directory, nprobe)
+        self.embedder = embedder or load_embedder(directory)
+        self.directory = directory
+        self.local = threading.local()
+
+    @property
+    def chunks(self):
+        # file handles are not shareable across threads, so one store per thread
+        store = getattr(self.local, "chunks", None)
+        if store is None:
+            store = self.local.chunks = ChunkStore(self.directory)
+        return store
+
+    def triples(self, ids):
+        results = []
+        for chunk_id in ids:
+            chunk = self.chunks.get(int(chunk_id))
+            results.append({"title": chunk["title"], "snippet": chunk["text"], "link": chunk["link"]})
+        return results
+
+    def search(self, query: str, k: int):
+        ids, _ = self.index.search(self.embedder([query])[0], k)
+        return self.triples(ids)
+
+
+def reciprocal_rank_fusion(rankings, k: int = 60, weights=None):
+    """Fuses ranked id lists: score(id) = sum of weight / (k + rank). Best first."""
+    weights = weights or [1.0] * len(rankings)
+    scores = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, chunk_id in enumerate(ranking):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + weight / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class HybridRetriever(LocalVectorRetriever):
+    """
+    BM25 + dense retrieval over the same index directory, fused with
+    reciprocal rank fusion. BM25 catches exact technical terms (model and
+    dataset names) that hashed or learned embeddings blur together, while
+    the dense ranking rewards chunks whose whole vocabulary matches.
+
+    The dense ranking that is fused covers the `candidates` best of each
+    side, scored exactly: a query dominated by one rare term often probes
+    none of the IVF cells its matches were clustered into, and BM25's
+    candidates are where they are found.
+
+    An index built before build_index weighted the HashingEmbedder by IDF
+    (no "idf" in its embedder.json) ranks worse fused than with BM25 alone;
+    rebuild it.
+    """
+
+    def __init__(self, directory: str, embedder=None, nprobe: int = None,
+                 candidates: int = 50, rrf_k: int = 60, dense_weight: float = 1.0,
+                 sparse_weight: float = 1.0):
+        self.bm25 = BM25Index.load(directory)
+        super().__init__(directory, embedder or load_embedder(directory, self.bm25), nprobe)
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.weights = [dense_weight, sparse_weight]
+
+    def search(self, query: str, k: int):
+        n = max(k, self.candidates)
+        vector = self.embedder([query])[0]
+        dense_ids, _ = self.index.search(vector, n)
+        sparse_ids, _ = self.bm25.search(query, n)
+        pool = np.union1d(dense_ids, sparse_ids)
+        dense_ids = pool[np.argsort(-self.index.score(vector, pool), kind="stable")]
+        fused = reciprocal_rank_fusion([dense_ids.tolist(), sparse_ids.tolist()],
+                                       self.rrf_k, self.weights)
+        return self.triples(fused[:k])
+
+
+def retriever_from_env():
+    """
+    RETRIEVAL_BACKEND=local (dense) or hybrid (BM25 + dense, weighted by
+    HYBRID_DENSE_WEIGHT and HYBRID_SPARSE_WEIGHT) serves snippets from
+    LOCAL_INDEX_DIR; anything else (the default) keeps using Vertex
+    Discovery Engine and returns None.
+    """
+    backend = os.environ.get("RETRIEVAL_BACKEND", "discovery_engine")
+    directory = os.environ.get("LOCAL_INDEX_DIR", "local_index")
+    if backend == "local":
+        return LocalVectorRetriever(directory)
+    if backend == "hybrid":
+        return HybridRetriever(
+            directory, dense_weight=float(os.environ.get("HYBRID_DENSE_WEIGHT", 1.0)),
+            sparse_weight=float(os.environ.get("HYBRID_SPARSE_WEIGHT", 1.0)))
+    return None
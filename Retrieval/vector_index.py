@@ -0,0 +1,138 @@
+import json
+import math
+import os
+import numpy as np
+
+
+class IVFIndex:
+    """
+    Inverted-file ANN index over unit vectors (inner product = cosine).
+
+    A spherical k-means quantizer splits the vectors into `n_lists` cells and
+    the vectors are stored grouped by cell, so probing a cell is one
+    contiguous slice of the matrix. On disk the matrix is a plain .npy file
+    that `load` memory-maps, so an index larger than RAM only pages in the
+    cells a query actually probes.
+    """
+
+    def __init__(self, vectors, ids, centroids, offsets, nprobe: int = 8):
+        self.vectors = vectors
+        self.ids = ids
+        self.centroids = centroids
+        self.offsets = offsets
+        self.nprobe = nprobe
+        self.rows = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _assign(vectors, centroids, batch_size: int = 65536):
+        assign = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), batch_size):
+            batch = vectors[start:start + batch_size]
+            assign[start:start + batch_size] = np.argmax(batch @ centroids.T, axis=1)
+        return assign
+
+    @classmethod
+    def build(cls, vectors, n_lists: int = None, iterations: int = 10,
+              sample_size: int = 100000, nprobe: int = 8, seed: int = 0):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        n = len(vectors)
+        n_lists = n_lists or max(1, int(math.sqrt(n)))
+        rng = np.random.default_rng(seed)
+
+        sample = vectors if n <= sample_size else vectors[rng.choice(n, sample_size, replace=False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assign = cls._assign(sample, centroids)
+            counts = np.bincount(assign, minlength=n_lists)
+            filled = counts > 0
+            # per-cell sums via one sort + reduceat (np.add.at is far slower)
+            order = np.argsort(assign, kind="stable")
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+            centroids[filled] = np.add.reduceat(sample[order], starts, axis=0)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+        assign = cls._assign(vectors, centroids)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assign, minlength=n_lists))
+        return cls(vectors[order], order.astype(np.int64), centroids, offsets, nprobe)
+
+    def add(self, vectors, ids):
+        """
+        Adds vectors under the given ids to the cells of their nearest
+        existing centroids, without retraining the quantizer. Cells drift
+        out of balance as the corpus grows, so rebuild now and then.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        assign = self._assign(vectors, self.centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=len(self.centroids))
+        new_offsets = np.zeros_like(self.offsets)
+        new_offsets[1:] = np.cumsum(counts)
+        rows, row_ids = [], []
+        for cell in range(len(self.centroids)):
+            start, end = self.offsets[cell], self.offsets[cell + 1]
+            new_start, new_end = new_offsets[cell], new_offsets[cell + 1]
+            rows += [self.vectors[start:end], vectors[order[new_start:new_end]]]
+            row_ids += [self.ids[start:end], np.asarray(ids, dtype=np.int64)[order[new_start:new_end]]]
+        self.vectors = np.concatenate(rows)
+        self.ids = np.concatenate(row_ids)
+        self.offsets = self.offsets + new_offsets
+        self.rows = None
+
+    def search(self, query, k: int = 10, nprobe: int = None):
+        """Returns (ids, scores) of the k best vectors among the probed cells."""
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        cell_scores = self.centroids @ query
+        cells = np.argpartition(-cell_scores, nprobe - 1)[:nprobe]
+
+        row_ids, row_scores = [], []
+        for cell in cells:
+            start, end = self.offsets[cell], self.offsets[cell + 1]
+            if start == end:
+                continue
+            row_scores.append(self.vectors[start:end] @ query)
+            row_ids.append(self.ids[start:end])
+        if not row_ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        ids = np.concatenate(row_ids)
+        scores = np.concatenate(row_scores)
+        k = min(k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return ids[top], scores[top]
+
+    def score(self, query, ids):
+        """Exact scores of the given ids, whichever cells they are in."""
+        if self.rows is None:
+            rows = np.empty(int(np.max(self.ids)) + 1, dtype=np.int64)
+            rows[self.ids] = np.arange(len(self.ids))
+            self.rows = rows
+        return self.vectors[self.rows[np.asarray(ids, dtype=np.int64)]] @ query
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        # written next to the old files and renamed over them, since an index
+        # being extended by add() may still be memory-mapped from them
+        for name, array in (("vectors", self.vectors), ("ids", self.ids)):
+            np.save(os.path.join(directory, f"{name}.tmp.npy"), array)
+            os.replace(os.path.join(directory, f"{name}.tmp.npy"), os.path.join(directory, f"{name}.npy"))
+        np.save(os.path.join(directory, "centroids.npy"), self.centroids)
+        np.save(os.path.join(directory, "offsets.npy"), self.offsets)
+        with open(os.path.join(directory, "ivf.json"), "w") as f:
+            json.dump({"nprobe": self.nprobe}, f)
+
+    @classmethod
+    def load(cls, directory: str, nprobe: int = None):
+        with open(os.path.join(directory, "ivf.json")) as f:
+            config = json.load(f)
+        return cls(
+            np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, "ids.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, "centroids.npy")),
+            np.load(os.path.join(directory, "offsets.npy")),
+            nprobe or config["nprobe"]
+        )
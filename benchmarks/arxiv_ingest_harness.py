@@ -0,0 +1,123 @@
+"""
+Runs Ingestion.async_downloader against a local fake arXiv: an export API
+stand-in that answers 429 to pages requested too quickly, and a PDF server
+that answers 503 to every few requests.
+
+  polite     client paces API pages slower than the server allows: no 429s,
+             at most --per-host PDF downloads at once, every paper on disk
+  impolite   API pacing switched off: 429s happen, Retry-After recovers them
+  rerun      the polite run again on the same manifest: nothing to do
+  rate       a 20 req/s global limit holds over the whole run
+
+    python -m benchmarks.arxiv_ingest_harness
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+from Ingestion.async_downloader import AsyncArxivDownloader
+from Ingestion.manifest import IngestionManifest
+from benchmarks.fake_servers import FakeArxivAPI, StubServer, pdf_responder
+
+START, END = datetime(2021, 1, 1), datetime(2021, 3, 31)
+
+
+class Fixture:
+    def __init__(self, args, min_interval, fail_every):
+        self.pdf_respond = pdf_responder(args.pdf_kb * 1024, fail_every)
+        self.pdfs = StubServer(self.pdf_respond, latency=args.pdf_latency).start()
+        self.api = FakeArxivAPI(self.pdfs.url, args.papers, min_interval)
+        self.api_server = StubServer(self.api).start()
+        self.directory = tempfile.mkdtemp(prefix="inspireit-ingest-")
+        self.manifest = IngestionManifest(os.path.join(self.directory, "manifest.db"))
+
+    def run(self, **options):
+        downloader = AsyncArxivDownloader(
+            self.manifest, self.directory, api_url=self.api_server.url + "/api/query",
+            page_size=40, backoff_factor=0.05, **options)
+        started = time.perf_counter()
+        new = asyncio.run(downloader.run(START, END, max_per_month=1000))
+        return downloader, new, time.perf_counter() - started
+
+    def files_ok(self, expected):
+        digest = hashlib.sha256(self.pdf_respond.data).hexdigest()
+        rows = self.manifest._connect().execute(
+            "SELECT path, sha256 FROM papers WHERE status = 'downloaded'").fetchall()
+        return len(rows) == expected and all(
+            sha == digest and hashlib.sha256(open(path, "rb").read()).hexdigest() == digest
+            for path, sha in rows)
+
+    def close(self):
+        self.pdfs.stop()
+        self.api_server.stop()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def report(name, ok, detail):
+    print(f"[{'PASS' if ok else 'FAIL'}] {name:<9} {detail}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--papers", type=int, default=100, help="papers per month (3 months)")
+    parser.add_argument("--pdf-kb", type=int, default=64)
+    parser.add_argument("--pdf-latency", type=float, default=0.02)
+    parser.add_argument("--per-host", type=int, default=3)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.ERROR)
+    total = 3 * args.papers
+    results = []
+
+    fixture = Fixture(args, min_interval=0.2, fail_every=7)
+    try:
+        downloader, new, elapsed = fixture.run(rate=1000, burst=50, api_interval=0.25,
+                                               per_host=args.per_host, workers=12)
+        results.append(report("polite", fixture.api.violations == 0
+                              and fixture.pdfs.peak_in_flight <= args.per_host
+                              and sum(new.values()) == total and fixture.files_ok(total),
+                              f"{elapsed:.2f}s {dict(downloader.stats)} 429s={fixture.api.violations} "
+                              f"peak PDF connections={fixture.pdfs.peak_in_flight}"))
+
+        requests_before = fixture.pdfs.requests
+        downloader, new, elapsed = fixture.run(rate=1000, burst=50, api_interval=0.25,
+                                               per_host=args.per_host)
+        results.append(report("rerun", sum(new.values()) == 0 and fixture.pdfs.requests == requests_before,
+                              f"{elapsed:.2f}s new={sum(new.values())} "
+                              f"PDF requests={fixture.pdfs.requests - requests_before}"))
+    finally:
+        fixture.close()
+
+    fixture = Fixture(args, min_interval=0.2, fail_every=0)
+    try:
+        downloader, new, elapsed = fixture.run(rate=1000, burst=50, api_interval=0,
+                                               per_host=args.per_host)
+        results.append(report("impolite", fixture.api.violations > 0 and fixture.files_ok(total),
+                              f"{elapsed:.2f}s 429s={fixture.api.violations} "
+                              f"retries={downloader.stats['retries']}"))
+    finally:
+        fixture.close()
+
+    fixture = Fixture(args, min_interval=0, fail_every=0)
+    try:
+        rate, burst = 20.0, 5
+        downloader, new, elapsed = fixture.run(rate=rate, burst=burst, api_interval=0,
+                                               per_host=args.per_host)
+        sent = fixture.pdfs.requests + fixture.api_server.requests
+        results.append(report("rate", sent <= rate * elapsed + burst and fixture.files_ok(total),
+                              f"{sent} requests in {elapsed:.2f}s = {sent / elapsed:.1f}/s "
+                              f"(limit {rate:.0f}/s, burst {burst})"))
+    finally:
+        fixture.close()
+
+    raise SystemExit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
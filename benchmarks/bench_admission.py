@@ -0,0 +1,122 @@
+"""
+Overload check of admission control (LLMs.admission) against a fake
+Mistral that, like the real API when it is rate limited, answers 429 to
+requests beyond --llm-capacity at once.
+
+At t=0 a burst of --burst /generate/submit/ requests arrives. For the next
+--duration seconds, interactive users also send /chatbot requests at
+--chat-rate per second, and one greedy client sends --greedy chat
+requests as fast as it can. Every user except the greedy one has its own
+X-Forwarded-For address. The app runs in one uvicorn worker, once with
+ADMISSION=0 and once with admission control and a per-client rate limit
+on. For each run it reports:
+
+  chat      ok / failed, p50 and p95 latency
+  generate  ok, 503 (with their latency: rejections should be fast), failed
+  greedy    429s
+  LLM       peak in flight and 429s it sent
+
+It exits non-zero unless, with admission on, every interactive chat
+succeeds, the fake LLM never has to send a 429, and the median rejected
+generation request is turned away in under a quarter of one LLM call
+(most are rejected up front, for an expected wait beyond the deadline;
+the time is mostly the worker taking in the whole burst at once).
+
+    python -m benchmarks.bench_admission --burst 80 --llm-capacity 12 --llm-latency 2.0
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+import httpx
+
+from benchmarks.fake_servers import (StubServer, search_responder, chat_responder, point_app_at,
+                                     serve_app_workers, stop_app_workers)
+
+
+async def post(client, url, body, client_ip):
+    started = time.perf_counter()
+    try:
+        response = await client.post(url, json=body, headers={"X-Forwarded-For": client_ip})
+        result = response.json()
+        ok = response.status_code == 200 and not (isinstance(result, dict) and "error" in result)
+        return response.status_code, ok, time.perf_counter() - started
+    except (httpx.HTTPError, ValueError):
+        # (an unhandled upstream error is a plain-text 500)
+        return 0, False, time.perf_counter() - started
+
+
+async def fire(base, args):
+    async with httpx.AsyncClient(timeout=120.0, limits=httpx.Limits(max_connections=None)) as client:
+        generate = [asyncio.create_task(post(client, base + "/generate/submit/",
+                                             {"domains": [f"Domain {i}"], "specifications": "burst"},
+                                             f"10.1.0.{i % 250}"))
+                    for i in range(args.burst)]
+        greedy = [asyncio.create_task(post(client, base + "/chatbot", {"message": f"spam {i}"}, "10.9.9.9"))
+                  for i in range(args.greedy)]
+        chats = []
+        for i in range(int(args.duration * args.chat_rate)):
+            await asyncio.sleep(1 / args.chat_rate)
+            chats.append(asyncio.create_task(post(client, base + "/chatbot", {"message": f"question {i}"},
+                                                  f"10.2.{i // 250}.{i % 250}")))
+        return (await asyncio.gather(*generate), await asyncio.gather(*chats), await asyncio.gather(*greedy))
+
+
+def summarize(name, generate, chats, greedy, llm):
+    chat_latency = [latency for _, ok, latency in chats if ok]
+    chat_ok = len(chat_latency)
+    p95 = statistics.quantiles(chat_latency, n=20)[-1] if len(chat_latency) > 1 else float("nan")
+    generate_ok = sum(ok for _, ok, _ in generate)
+    rejected = [latency for status, _, latency in generate if status == 503]
+    rejected_p50 = statistics.median(rejected) * 1e3 if rejected else float("nan")
+    throttled = sum(status == 429 for status, _, _ in greedy)
+    print(f"{name:<10} chat ok {chat_ok:3d}/{len(chats):<3d} p50 {statistics.median(chat_latency or [0]):5.2f}s "
+          f"p95 {p95:5.2f}s | generate ok {generate_ok:3d} 503 {len(rejected):3d} "
+          f"(p50 {rejected_p50:5.0f}ms) failed {len(generate) - generate_ok - len(rejected):3d} | "
+          f"greedy 429 {throttled:3d}/{len(greedy)} | LLM peak {llm.peak_in_flight:3d} 429s {llm.overloaded:3d}")
+    return chat_ok == len(chats), rejected_p50, llm.overloaded
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--burst", type=int, default=80)
+    parser.add_argument("--chat-rate", type=float, default=3.0)
+    parser.add_argument("--greedy", type=int, default=30)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--llm-latency", type=float, default=2.0)
+    parser.add_argument("--llm-capacity", type=int, default=12)
+    parser.add_argument("--port", type=int, default=8769)
+    args = parser.parse_args()
+
+    search = StubServer(search_responder(), 0.1).start()
+    llm = StubServer(chat_responder(), args.llm_latency, max_in_flight=args.llm_capacity).start()
+    point_app_at(search, llm, caches=False)
+    admission = {"ADMISSION": "1", "ADMISSION_CAPACITY": str(args.llm_capacity - 2), "ADMISSION_LIMITS": "chat=10,generate=6",
+                 "ADMISSION_MAX_WAIT": str(4 * args.llm_latency),
+                 "ADMISSION_SERVICE_SECONDS": f"chat={args.llm_latency},generate={args.llm_latency + 0.1}",
+                 "RATE_LIMIT_RPS": "1", "RATE_LIMIT_BURST": "5"}
+    print(f"burst of {args.burst} generations, {args.chat_rate}/s chats for {args.duration}s, "
+          f"{args.greedy} greedy chats; fake LLM {args.llm_latency}s, 429 above {args.llm_capacity} at once")
+    ok = True
+    try:
+        for name, env in (("off", {"ADMISSION": "0"}), ("admission", admission)):
+            process = serve_app_workers(args.port, 1, dict(env, SINGLE_FLIGHT="0"))
+            try:
+                llm.peak_in_flight = llm.overloaded = 0
+                generate, chats, greedy = asyncio.run(fire(f"http://127.0.0.1:{args.port}", args))
+            finally:
+                stop_app_workers(process)
+            chats_ok, rejected_p50, overloaded = summarize(name, generate, chats, greedy, llm)
+            if name == "admission":
+                ok = chats_ok and overloaded == 0 and not rejected_p50 >= 250 * args.llm_latency
+    finally:
+        search.stop()
+        llm.stop()
+    print("ok" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+End-to-end wall time of listing and downloading a 12-month arXiv range
+against a stubbed arxiv client and a local PDF server, run two ways:
+
+  serial     list every month, then download everything (the old
+             get_papers_by_month, kept below as the baseline)
+  pipeline   get_papers_by_month, where listed pages flow through a bounded
+             queue into the downloaders as they arrive
+
+Each run starts from an empty manifest and download directory. Peak Python
+memory (tracemalloc) is reported for both.
+
+    python -m benchmarks.bench_arxiv_pipeline --papers 200 --page-latency 1.0
+"""
+import argparse
+import concurrent.futures
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import ArxivDownload
+from ArxivDownload import DownloadTracker, download_paper, get_papers_by_month, iter_month_papers
+from Ingestion.manifest import IngestionManifest
+from benchmarks.fake_servers import StubServer, fake_arxiv_client, pdf_responder
+
+START, END = datetime(2021, 1, 1), datetime(2021, 12, 31)
+
+
+def month_ranges(max_papers):
+    return [(datetime(2021, m, 1), min(datetime(2021, m + 1, 1) if m < 12 else END, END),
+             max_papers, None) for m in range(1, 13)]
+
+
+def fetch_month_papers(date_tuple):
+    """One month's listing, all at once."""
+    return date_tuple[0].strftime("%Y-%m"), list(iter_month_papers(date_tuple))
+
+
+def process_papers_batch(papers, base_path, max_workers, manifest):
+    """Downloads an already listed batch in parallel."""
+    tracker = DownloadTracker(len(papers))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        concurrent.futures.wait([executor.submit(download_paper, (paper, base_path, tracker, manifest))
+                                 for paper in papers])
+    tracker.close()
+
+
+def run_serial(directory, args):
+    manifest = IngestionManifest(os.path.join(directory, "manifest.db"))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.fetch_workers) as executor:
+        for month_key, papers in executor.map(fetch_month_papers, month_ranges(args.papers)):
+            manifest.add_papers(papers)
+    process_papers_batch(manifest.pending(), directory, args.download_workers, manifest)
+    return manifest
+
+
+def run_pipeline(directory, args):
+    get_papers_by_month(START, END, args.papers, args.fetch_workers, args.download_workers,
+                        directory, queue_size=args.queue_size)
+    return IngestionManifest(os.path.join(directory, "manifest.db"))
+
+
+def measure(name, run, args):
+    directory = tempfile.mkdtemp(prefix="inspireit-pipeline-")
+    try:
+        tracemalloc.start()
+        started = time.perf_counter()
+        manifest = run(directory, args)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        done = manifest.summary().get("downloaded", {}).get("papers", 0)
+        print(f"{name:<9} {elapsed:7.2f}s  {done} papers downloaded  peak memory {peak / 2**20:.1f} MiB")
+        return elapsed
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--papers", type=int, default=200, help="papers per month")
+    parser.add_argument("--page-latency", type=float, default=1.0,
+                        help="seconds per 100-result listing page (arXiv asks for >= 3)")
+    parser.add_argument("--pdf-latency", type=float, default=0.05)
+    parser.add_argument("--pdf-kb", type=int, default=32)
+    parser.add_argument("--fetch-workers", type=int, default=4)
+    parser.add_argument("--download-workers", type=int, default=10)
+    parser.add_argument("--queue-size", type=int, default=200)
+    args = parser.parse_args()
+
+    pdfs = StubServer(pdf_responder(args.pdf_kb * 1024), latency=args.pdf_latency).start()
+    ArxivDownload.arxiv.Client = fake_arxiv_client(pdfs.url, args.page_latency)
+    print(f"12 months x {args.papers} papers, {args.page_latency}s per listing page, "
+          f"{args.pdf_latency * 1000:.0f}ms per PDF")
+    try:
+        serial = measure("serial", run_serial, args)
+        pipeline = measure("pipeline", run_pipeline, args)
+        print(f"speedup {serial / pipeline:.2f}x")
+    finally:
+        pdfs.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Load benchmark for the async request path.
+
+Starts local Discovery Engine and Mistral stubs, serves main.app from a single
+uvicorn worker and fires concurrent /generate/submit/ requests. With the async
+MistralChat the LLM stub sees (almost) every request in flight at once; with
+the old blocking path it never sees more than one per worker.
+
+    python -m benchmarks.bench_async_load --requests 64 --llm-latency 1.0
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.fake_servers import (StubServer, search_responder, chat_responder,
+                                     point_app_at, serve_app, stop_app)
+
+
+class BlockingChat:
+    """Reproduces the old behaviour: sync MistralChat called from async routes."""
+
+    def __init__(self):
+        from LLMs.prompts import MistralChat
+        self.chat = MistralChat()
+
+    async def generate_ideas(self, domains, specifications):
+        return self.chat.generate_ideas(domains, specifications)
+
+    async def aclose(self):
+        pass
+
+
+async def fire(url, n):
+    payloads = [{"domains": ["NLP", "GANs"], "specifications": f"benchmark {i}"} for i in range(n)]
+    async with httpx.AsyncClient(timeout=None) as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[client.post(url, json=p) for p in payloads])
+        elapsed = time.perf_counter() - start
+    failed = sum(1 for r in responses if r.status_code != 200)
+    return elapsed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--search-latency", type=float, default=0.2)
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--blocking", action="store_true",
+                        help="use the sync MistralChat to show the old behaviour")
+    args = parser.parse_args()
+
+    search = StubServer(search_responder(), args.search_latency).start()
+    llm = StubServer(chat_responder(), args.llm_latency).start()
+    point_app_at(search, llm, caches=False)
+
+    import main as app_module
+    if args.blocking:
+        app_module.chat = BlockingChat()
+
+    server, thread = serve_app(app_module.app, args.port)
+    try:
+        url = f"http://127.0.0.1:{args.port}/generate/submit/"
+        elapsed, failed = asyncio.run(fire(url, args.requests))
+    finally:
+        stop_app(server, thread)
+        search.stop()
+        llm.stop()
+
+    mode = "blocking" if args.blocking else "async"
+    print(f"mode={mode} requests={args.requests} failed={failed}")
+    print(f"wall time: {elapsed:.2f}s  throughput: {args.requests / elapsed:.1f} req/s")
+    print(f"peak in-flight at LLM stub: {llm.peak_in_flight} (single uvicorn worker)")
+
+
+if __name__ == "__main__":
+    main()
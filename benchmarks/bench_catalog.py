@@ -0,0 +1,99 @@
+"""
+Builds a PaperCatalog of synthetic papers at growing sizes (up to 1M rows
+by default) and reports build rate, size on disk and lookup latency by id,
+normalized title, GCS link and full-text search. Lookups by key should
+stay flat as the catalog grows (B-tree, O(log n)).
+
+    python -m benchmarks.bench_catalog --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from Ingestion.catalog import PaperCatalog
+from Ingestion.manifest import PaperRecord
+
+WORDS = ("learning neural graph diffusion transformer robust causal sparse federated quantum "
+         "adversarial bayesian contrastive language vision reinforcement retrieval efficient "
+         "scalable generative optimal stochastic private multimodal temporal networks models").split()
+# Zipf-distributed title vocabulary: a few very common words, a long tail of
+# rarer ones, as in real titles (a tiny uniform vocabulary makes every FTS
+# query match a large fraction of the catalog)
+SYLLABLES = "ka lo mi ne ru ta vo ze pi sha tri gon lex mor".split()
+VOCABULARY = WORDS + [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+WEIGHTS = [1.0 / (rank + 1) for rank in range(len(VOCABULARY))]
+NAMES = "Ada Alan Grace Edsger Barbara Donald John Margaret Claude Leslie Tony Radia".split()
+
+
+BASE = datetime(2015, 1, 1, tzinfo=timezone.utc)
+
+
+def paper_id(i: int):
+    return f"{BASE + timedelta(minutes=5 * i):%y%m}.{i:07d}"
+
+
+def synthetic_papers(start: int, count: int, seed: int = 0):
+    rng = random.Random(seed + start)
+    for i in range(start, start + count):
+        published = BASE + timedelta(minutes=5 * i)
+        title = " ".join(rng.choices(VOCABULARY, WEIGHTS, k=rng.randint(4, 10))).title() + f" {i}"
+        authors = tuple(f"{rng.choice(NAMES)} {rng.choice(NAMES)}son" for _ in range(rng.randint(1, 5)))
+        yield PaperRecord(paper_id(i), title, published,
+                          f"http://arxiv.org/pdf/{i}", authors, ("cs.LG",))
+
+
+def timed(lookup, keys):
+    latencies = []
+    for key in keys:
+        started = time.perf_counter()
+        lookup(key)
+        latencies.append((time.perf_counter() - started) * 1e6)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=50_000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="inspireit-catalog-")
+    path = os.path.join(directory, "catalog.db")
+    catalog = PaperCatalog(path, "arxiv_papers", "gs://bucket")
+    rng = random.Random(1)
+    try:
+        built, build_seconds = 0, 0.0
+        print(f"{'rows':>9} {'rows/s':>8} {'MiB':>6}   p50/p99 us: {'id':>11} {'title':>11} "
+              f"{'link':>11} {'fts':>13}")
+        for size in sorted(args.sizes):
+            while built < size:
+                count = min(args.batch, size - built)
+                started = time.perf_counter()
+                catalog.add(synthetic_papers(built, count))
+                build_seconds += time.perf_counter() - started
+                built += count
+            sample = [catalog.get(paper_id(rng.randrange(size))) for _ in range(args.lookups)]
+            ids = [p["arxiv_id"] for p in sample]
+            # lookups must survive case, spacing and punctuation differences
+            titles = [p["title"].lower().replace(" ", "  ") + "." for p in sample]
+            links = [p["gcs_link"] for p in sample]
+            queries = [" ".join(p["title"].split()[:3]) for p in sample[:200]]
+            results = [timed(catalog.get, ids), timed(catalog.by_title, titles),
+                       timed(catalog.by_link, links), timed(catalog.search, queries)]
+            assert all(catalog.by_title(t) for t in titles[:50]), "normalized title lookup failed"
+            mib = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory)) / 2**20
+            print(f"{size:>9} {built / build_seconds:>8.0f} {mib:>6.0f}   " + " ".join(
+                f"{p50:>5.0f}/{p99:<5.0f}" for p50, p99 in results))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
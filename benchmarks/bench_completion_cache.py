@@ -0,0 +1,105 @@
+"""
+Replays a request log through MistralChat against local stubs, once with the
+completion cache disabled and once enabled, and reports hit rate and latency.
+
+The log is JSONL with one {"endpoint": "ideas" | "improve" | "recommend",
+"data": {...}} per line, where data is the request body of the matching
+route. Without --log a synthetic log is generated: popular ideas are
+requested repeatedly (Zipf-like) and some repeats differ by a word or two,
+which only the semantic tier can catch.
+
+    python -m benchmarks.bench_completion_cache --requests 300 --llm-latency 0.2
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+
+from benchmarks.fake_servers import StubServer, search_responder, chat_responder, point_app_at
+
+
+def synthetic_log(n_requests: int, n_ideas: int, perturb: float, seed: int = 0):
+    rng = random.Random(seed)
+    ideas = [{
+        "title": f"Idea {i}: diffusion models for domain {i}",
+        "summary": f"We study how diffusion models can be adapted to domain {i} "
+                   f"using retrieval augmented conditioning and curriculum training.",
+        "drawbacks": ["compute cost"],
+        "opportunities": ["new benchmarks"]
+    } for i in range(n_ideas)]
+    weights = [1.0 / (i + 1) for i in range(n_ideas)]
+    log = []
+    for _ in range(n_requests):
+        idea = dict(rng.choices(ideas, weights)[0])
+        if rng.random() < perturb:
+            idea["summary"] = idea["summary"].replace("study", rng.choice(["explore", "examine"]))
+        if rng.random() < 0.5:
+            log.append({"endpoint": "recommend", "data": idea})
+        else:
+            log.append({"endpoint": "improve",
+                        "data": {"origDetails": idea, "specifications": "make it cheaper"}})
+    return log
+
+
+def replay(chat, log):
+    handlers = {
+        "ideas": lambda d: chat.generate_ideas(d["domains"], d["specifications"]),
+        "improve": chat.suggestion_improvement_idea_prompt,
+        "recommend": chat.recommend_ideas,
+    }
+    latencies = []
+    for entry in log:
+        start = time.perf_counter()
+        handlers[entry["endpoint"]](entry["data"])
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--log", help="JSONL request log to replay")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--ideas", type=int, default=40)
+    parser.add_argument("--perturb", type=float, default=0.3)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--threshold", type=float, default=0.95)
+    args = parser.parse_args()
+
+    if args.log:
+        with open(args.log) as f:
+            log = [json.loads(line) for line in f if line.strip()]
+    else:
+        log = synthetic_log(args.requests, args.ideas, args.perturb)
+
+    search = StubServer(search_responder()).start()
+    llm = StubServer(chat_responder(), args.llm_latency).start()
+    point_app_at(search, llm)
+    os.environ["RETRIEVAL_CACHE_SIZE"] = "0"
+
+    from LLMs.prompts import MistralChat
+    try:
+        os.environ["COMPLETION_CACHE_SIZE"] = "0"
+        baseline = replay(MistralChat(), log)
+
+        os.environ["COMPLETION_CACHE_SIZE"] = "1024"
+        os.environ["COMPLETION_CACHE_SEMANTIC"] = "ideas,improve,recommend"
+        os.environ["COMPLETION_CACHE_THRESHOLD"] = str(args.threshold)
+        chat = MistralChat()
+        cached = replay(chat, log)
+    finally:
+        search.stop()
+        llm.stop()
+
+    stats = chat.completion_cache.stats()
+    print(f"replayed {len(log)} requests, LLM stub latency {args.llm_latency}s")
+    print(f"hit rate {stats['hit_rate']:.1%} (exact {stats['exact_hits']}, "
+          f"semantic {stats['semantic_hits']}, misses {stats['misses']})")
+    for name, samples in (("no cache", baseline), ("cache", cached)):
+        print(f"{name:>9}: mean {statistics.mean(samples) * 1000:7.1f} ms  "
+              f"p50 {statistics.median(samples) * 1000:7.1f} ms  total {sum(samples):6.1f}s")
+
+
+if __name__ == "__main__":
+    main()
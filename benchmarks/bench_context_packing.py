@@ -0,0 +1,149 @@
+"""
+Prompt tokens saved by LLMs.context.ContextBuilder on synthetic retrieval
+results, and how often the old snippet_triples attached a snippet to the
+wrong paper.
+
+Two kinds of requests are generated:
+
+  discovery  Discovery Engine responses of 20 papers, each with 1-3 short
+             HTML snippets; some papers are other versions of an earlier
+             one and repeat its snippet
+  local      20 local index chunks of 150-256 tokens from 6-10 papers, some
+             near-duplicates of each other (a word changed)
+
+For each it reports the estimated snippet tokens in the prompt before
+(every snippet, as before) and after packing, the time to pack, and
+checks that every packed snippet is from the paper it is listed under.
+
+    python -m benchmarks.bench_context_packing --requests 500 --budget 1500
+"""
+import argparse
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+from Chatbot.sessions import estimate_tokens
+from LLMs.context import ContextBuilder
+from LLMs.prompts import MistralChat
+
+VOCAB = [f"w{i}" for i in range(3000)]
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(VOCAB) for _ in range(words)) + "."
+
+
+def discovery_response(rng):
+    results, previous = [], []
+    for i in range(20):
+        if previous and rng.random() < 0.15:
+            title, snippets = rng.choice(previous)
+            title += " (v2)"
+        else:
+            title = f"Paper {rng.randrange(10 ** 6)}: " + sentence(rng, 6)
+            snippets = [f"This <b>{sentence(rng, 3)}</b>&nbsp;{sentence(rng, rng.randint(25, 45))}"
+                        for _ in range(rng.choice([1, 1, 2, 3]))]
+            previous.append((title, snippets))
+        results.append({"document": {"derivedStructData": {
+            "title": title,
+            "link": f"gs://inspireit-papers/2021-01/paper_{i}.pdf",
+            "snippets": [{"snippet": s, "snippet_status": "SUCCESS"} for s in snippets]}}})
+    return {"results": results}
+
+
+def old_snippet_triples(chat, result):
+    """snippet_triples before the fix: snippets zipped against titles by position."""
+    titles, snippets, links = [], [], []
+    for i in result["results"]:
+        doc = i["document"]["derivedStructData"]
+        titles.append(doc["title"])
+        links.append(doc["link"])
+        for j in doc["snippets"]:
+            if j["snippet_status"] == "SUCCESS":
+                snippets.append(chat.clean_text(j["snippet"]))
+    return [{"title": title, "snippet": snippet, "link": link}
+            for snippet, title, link in zip(snippets, titles, links)]
+
+
+def local_triples(rng):
+    papers = [(f"Paper {rng.randrange(10 ** 6)}: " + sentence(rng, 6),
+               f"gs://inspireit-papers/2022-03/paper_{p}.pdf") for p in range(rng.randint(6, 10))]
+    triples = []
+    for _ in range(20):
+        if triples and rng.random() < 0.15:
+            words = rng.choice(triples)["snippet"].split()
+            words[rng.randrange(len(words))] = rng.choice(VOCAB)
+            text = " ".join(words)
+        else:
+            text = sentence(rng, rng.randint(150, 256) * 4 // 7)
+        title, link = rng.choice(papers)
+        triples.append({"title": title, "snippet": text, "link": link})
+    return triples
+
+
+def prompt_tokens(chat, triples):
+    return estimate_tokens(", ".join(chat.format_snippets(triples)))
+
+
+def attributed(packed, triples):
+    """Every packed snippet part is (a prefix of) a snippet of the same paper."""
+    by_link = {}
+    for triple in triples:
+        by_link.setdefault(triple["link"], []).append(triple)
+    for doc in packed:
+        sources = by_link.get(doc["link"], [])
+        if not sources or any(source["title"] != doc["title"] for source in sources):
+            return False
+        for part in doc["snippet"].split(" ... "):
+            part = part.removesuffix("…")
+            if part and not any(source["snippet"].startswith(part) for source in sources):
+                return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--budget", type=int, default=1500)
+    parser.add_argument("--max-per-doc", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    chat = SimpleNamespace(clean_text=lambda text: MistralChat.clean_text(None, text))
+    chat.format_snippets = lambda triples: MistralChat.format_snippets(None, triples)
+    builder = ContextBuilder(budget_tokens=args.budget, max_per_doc=args.max_per_doc)
+    query = "Keywords: w1,w2,w3. Specifications: " + sentence(rng, 8)
+
+    wrong = total = 0
+    requests = {"discovery": [], "local": []}
+    for _ in range(args.requests):
+        response = discovery_response(rng)
+        triples = MistralChat.snippet_triples(chat, response)
+        old = old_snippet_triples(chat, response)
+        for triple in old:
+            total += 1
+            wrong += not any(t["snippet"] == triple["snippet"] and t["title"] == triple["title"] for t in triples)
+        requests["discovery"].append(triples)
+        requests["local"].append(local_triples(rng))
+    print(f"old snippet_triples: {wrong / total:.1%} of snippets listed under the wrong title "
+          f"(and snippets past the 20th paper dropped)")
+
+    for name, batch in requests.items():
+        before, after, micros, docs, correct = [], [], [], [], 0
+        for triples in batch:
+            started = time.perf_counter()
+            packed = builder.build(query, triples)
+            micros.append((time.perf_counter() - started) * 1e6)
+            before.append(prompt_tokens(chat, triples))
+            after.append(prompt_tokens(chat, packed))
+            docs.append(len(packed))
+            correct += attributed(packed, triples)
+        saved = 1 - sum(after) / sum(before)
+        print(f"{name:<10} tokens/request {statistics.mean(before):7.0f} -> {statistics.mean(after):6.0f} "
+              f"(saved {saved:.0%}, max {max(after)})  papers {statistics.mean(docs):4.1f}  "
+              f"pack p50 {statistics.median(micros):5.0f}us  attribution ok {correct}/{len(batch)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Throughput and incrementality of Ingestion.extract on synthetic papers.
+
+Writes --papers small text PDFs (title, abstract, numbered sections,
+references) into a temporary arxiv_papers/YYYY-MM tree, then:
+
+  cold       extract everything with 1 process and with --workers processes
+  rerun      nothing changed: every paper is reused
+  touch      one file's mtime changes but not its bytes: reused via SHA-256
+  edit       one file is rewritten: only that paper is extracted again
+
+    python -m benchmarks.bench_extract --papers 60 --pages 8 --workers 4
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import Counter
+
+from Ingestion.extract import ExtractedCorpus, extract_corpus
+
+SECTION_TITLES = ["1 Introduction", "2 Related Work", "3 Methods", "4 Experiments",
+                  "5 Results", "6 Conclusion", "References"]
+
+
+def write_pdf(path, pages):
+    """Minimal uncompressed PDF: one Helvetica text line per entry of each page."""
+    def escape(line):
+        return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        stream = "BT /F1 9 Tf 11 TL 40 800 Td " + " ".join(f"({escape(l)}) Tj T*" for l in lines) + " ET"
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream.encode("latin-1")))
+        kids.append(len(objects) + 1)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects)))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        " ".join(f"{k} 0 R" for k in kids).encode(), len(kids))
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def synthetic_paper(rng, n_pages, lines_per_page=60, words_per_line=11):
+    vocabulary = [f"term{i}" for i in range(3000)]
+    lines = ["A Synthetic Paper About Things", "Jane Doe, John Roe", "Abstract"]
+    headings = iter(SECTION_TITLES)
+    total = n_pages * lines_per_page
+    every = total // (len(SECTION_TITLES) + 1)
+    while len(lines) < total:
+        if len(lines) % every == 0:
+            lines.append(next(headings, "Appendix"))
+        lines.append(" ".join(rng.choice(vocabulary) for _ in range(words_per_line)))
+    return [lines[i:i + lines_per_page] for i in range(0, total, lines_per_page)]
+
+
+def run(name, papers_dir, out_dir, workers, **settings):
+    stats = extract_corpus(papers_dir, out_dir, workers, **settings)
+    print(f"{name:<10} workers={workers or os.cpu_count()}  {stats['extracted']:3d} extracted  "
+          f"{stats['reused']:3d} reused  {stats['chunks']} chunks  {stats['seconds']:.2f}s  "
+          f"{stats['pages_per_sec']:.1f} pages/s")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--papers", type=int, default=60)
+    parser.add_argument("--pages", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    root = tempfile.mkdtemp(prefix="inspireit-extract-")
+    papers_dir = os.path.join(root, "arxiv_papers")
+    try:
+        paths = []
+        for i in range(args.papers):
+            month_dir = os.path.join(papers_dir, f"2021-{i % 12 + 1:02d}")
+            os.makedirs(month_dir, exist_ok=True)
+            paths.append(os.path.join(month_dir, f"Paper {i}.pdf"))
+            write_pdf(paths[-1], synthetic_paper(rng, args.pages))
+        print(f"{args.papers} papers x {args.pages} pages, {os.cpu_count()} CPUs")
+
+        run("cold", papers_dir, os.path.join(root, "serial"), 1)
+        out_dir = os.path.join(root, "extracted")
+        run("cold", papers_dir, out_dir, args.workers)
+        run("rerun", papers_dir, out_dir, args.workers)
+        os.utime(paths[0], (time.time() + 10, time.time() + 10))
+        run("touch", papers_dir, out_dir, args.workers)
+        write_pdf(paths[1], synthetic_paper(rng, args.pages))
+        stats = run("edit", papers_dir, out_dir, args.workers)
+        assert stats["extracted"] == 1, stats
+
+        corpus = ExtractedCorpus(out_dir)
+        sections = Counter(chunk["section"] for chunk in corpus)
+        blob = sum(os.path.getsize(os.path.join(out_dir, f)) for f in os.listdir(out_dir))
+        print(f"sections: {dict(sections)}")
+        print(f"{len(corpus)} chunks in {blob / 2**20:.1f} MiB on disk")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Query latency and recall@k of dense, BM25 and hybrid (RRF) retrieval on a
+small labeled query set.
+
+By default a synthetic corpus is generated: chunks of topical and generic
+filler text, some of which mention a rare technical term (think
+"resnet152", "mmlu"). Each query names one such term plus a few generic and
+topic words, and its relevant set
+is every chunk containing the term, the case where pure vector search
+struggles. Pass --index and --labels to score a real index instead; labels
+are JSONL lines of {"query": ..., "relevant": [chunk titles]}.
+
+"hybrid" uses HybridRetriever's default weights and "hybrid*" weights
+dense and BM25 by --dense-weight and --sparse-weight. On the synthetic
+corpus, a second index is built over the first 80% of the chunks and
+extended with the rest by Retrieval.build_index.append_to_index, and its
+BM25 and hybrid recall are reported too. The script exits non-zero unless
+the default hybrid recalls more than BM25 alone, in both indexes, and BM25
+recall of the appended index equals that of the full build.
+
+    python -m benchmarks.bench_hybrid_retrieval --chunks 20000
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from Retrieval.build_index import build_index, append_to_index
+from Retrieval.retriever import LocalVectorRetriever, HybridRetriever
+
+
+def synthetic_corpus(n_chunks: int, n_terms: int = 300, words: int = 120, seed: int = 0):
+    rng = random.Random(seed)
+    general = [f"g{i}" for i in range(300)]
+    topics = [[f"t{t}w{i}" for i in range(200)] for t in range(20)]
+    terms = [f"model{i}x" for i in range(n_terms)]
+    chunks, holders = [], {}
+    for i in range(n_chunks):
+        topic = rng.randrange(len(topics))
+        text = rng.choices(topics[topic], k=words // 2) + rng.choices(general, k=words // 2)
+        if rng.random() < 0.1:
+            term = rng.choice(terms)
+            text.insert(rng.randrange(len(text)), term)
+            holders.setdefault(term, []).append((i, topic))
+        chunks.append({"title": f"chunk {i}", "link": f"gs://bench/{i}.pdf", "text": " ".join(text)})
+
+    labels = []
+    for term, held in list(holders.items())[:100]:
+        _, topic = rng.choice(held)
+        query = " ".join([term] + rng.choices(general, k=2) + rng.choices(topics[topic], k=1))
+        labels.append({"query": query, "relevant": [f"chunk {i}" for i, _ in held]})
+    return chunks, labels
+
+
+def evaluate(name, retriever, labels, k):
+    latencies, recalls = [], []
+    for label in labels:
+        relevant = set(label["relevant"])
+        start = time.perf_counter()
+        results = retriever.search(label["query"], k)
+        latencies.append(time.perf_counter() - start)
+        found = sum(1 for r in results if r["title"] in relevant)
+        recalls.append(found / min(k, len(relevant)))
+    print(f"{name:>7}: recall@{k} {statistics.mean(recalls):.3f}  "
+          f"p50 {statistics.median(latencies) * 1000:6.2f} ms  "
+          f"max {max(latencies) * 1000:6.2f} ms")
+    return statistics.mean(recalls)
+
+
+class BM25Only(HybridRetriever):
+    def search(self, query, k):
+        ids, _ = self.bm25.search(query, k)
+        return self.triples(ids)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--index", help="existing index directory (from Retrieval.build_index)")
+    parser.add_argument("--labels", help="JSONL labeled queries for --index")
+    parser.add_argument("--dense-weight", type=float, default=0.5,
+                        help="dense weight for the hybrid* row")
+    parser.add_argument("--sparse-weight", type=float, default=1.0,
+                        help="BM25 weight for the hybrid* row")
+    args = parser.parse_args()
+
+    if args.index:
+        directory = args.index
+        with open(args.labels) as f:
+            labels = [json.loads(line) for line in f if line.strip()]
+    else:
+        chunks, labels = synthetic_corpus(args.chunks)
+        directory = tempfile.mkdtemp(prefix="inspireit-hybrid-")
+        start = time.perf_counter()
+        build_index(iter(chunks), directory)
+        print(f"built dense + BM25 index over {len(chunks)} chunks in "
+              f"{time.perf_counter() - start:.1f}s")
+
+    print(f"{len(labels)} labeled queries")
+    evaluate("dense", LocalVectorRetriever(directory), labels, args.k)
+    bm25 = evaluate("bm25", BM25Only(directory), labels, args.k)
+    hybrid = evaluate("hybrid", HybridRetriever(directory), labels, args.k)
+    evaluate("hybrid*", HybridRetriever(directory, dense_weight=args.dense_weight,
+                                        sparse_weight=args.sparse_weight), labels, args.k)
+    ok = hybrid > bm25
+    if not args.index:
+        appended = tempfile.mkdtemp(prefix="inspireit-hybrid-append-")
+        build_index(iter(chunks[:len(chunks) * 4 // 5]), appended)
+        start = time.perf_counter()
+        added = append_to_index(iter(chunks), appended)
+        print(f"appended {added} chunks to an index of {len(chunks) - added} in "
+              f"{time.perf_counter() - start:.1f}s")
+        ok &= evaluate("bm25+", BM25Only(appended), labels, args.k) == bm25
+        ok &= evaluate("hybrid+", HybridRetriever(appended), labels, args.k) > bm25
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
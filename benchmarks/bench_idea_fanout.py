@@ -0,0 +1,105 @@
+"""
+Latency of idea generation as one completion vs fanned out (IDEA_FANOUT=1:
+a short planning call, then one completion per idea in parallel), against a
+fake LLM that generates at --tokens-per-sec.
+
+For each mode it reports the full generate_ideas latency through
+MistralChat and AsyncMistralChat and, for the async client, when
+stream_ideas delivers the first idea. The last row fans out with one idea
+call stalled past IDEA_FANOUT_TIMEOUT, to show the partial result.
+
+    python -m benchmarks.bench_idea_fanout --tokens-per-sec 100 --idea-words 200
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.fake_servers import (StubServer, search_responder, chat_responder, point_app_at,
+                                     fake_ideas_content, fake_seeds_content, seed_index)
+
+
+def fake_llm(idea_words: int, stall: dict):
+    def content(body):
+        prompt = body["messages"][-1]["content"]
+        if '"seeds"' in prompt:
+            return fake_seeds_content()
+        if "write up one research idea" in prompt:
+            i = seed_index(prompt)
+            if stall.get("seconds") and i == 1:
+                time.sleep(stall["seconds"])
+            return fake_ideas_content(1, idea_words, first=i)
+        return fake_ideas_content(3, idea_words)
+    return content
+
+
+def run_sync(domains, specifications):
+    from LLMs.prompts import MistralChat
+    chat = MistralChat()
+    try:
+        start = time.perf_counter()
+        result = chat.generate_ideas(domains, specifications)
+        return time.perf_counter() - start, result
+    finally:
+        chat.credentials.stop()
+
+
+async def run_async(domains, specifications):
+    from LLMs.async_prompts import AsyncMistralChat
+    chat = AsyncMistralChat()
+    try:
+        start = time.perf_counter()
+        result = await chat.generate_ideas(domains, specifications)
+        total = time.perf_counter() - start
+        start = time.perf_counter()
+        first_idea = None
+        async for event, _ in chat.stream_ideas(domains, specifications):
+            if event == "idea" and first_idea is None:
+                first_idea = time.perf_counter() - start
+        return total, first_idea, result
+    finally:
+        await chat.aclose()
+
+
+def describe(result):
+    if "error" in result:
+        return f"error: {result['error']}"
+    text = f"{len(result['ideas'])} ideas"
+    if result.get("errors"):
+        text += f", failed: {', '.join(e['title'] + ' (' + e['error'] + ')' for e in result['errors'])}"
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens-per-sec", type=float, default=100.0)
+    parser.add_argument("--idea-words", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=15.0)
+    args = parser.parse_args()
+
+    stall = {}
+    search = StubServer(search_responder()).start()
+    llm = StubServer(chat_responder(fake_llm(args.idea_words, stall), args.tokens_per_sec)).start()
+    # the client hangs up on the stalled idea call
+    llm.httpd.handle_error = lambda request, client_address: None
+    point_app_at(search, llm, caches=False)
+    domains, specifications = ["NLP", "GANs"], "benchmark"
+    print(f"fake LLM at {args.tokens_per_sec:.0f} tokens/s, ~{args.idea_words} words per idea summary")
+    try:
+        for name, fanout, stall_seconds in (("single completion", "0", 0.0),
+                                            ("fan-out", "1", 0.0),
+                                            ("fan-out, 1 stalled", "1", args.timeout + 5)):
+            os.environ["IDEA_FANOUT"] = fanout
+            os.environ["IDEA_FANOUT_TIMEOUT"] = str(args.timeout)
+            stall["seconds"] = stall_seconds
+            sync_total, result = run_sync(domains, specifications)
+            async_total, first_idea, _ = asyncio.run(run_async(domains, specifications))
+            print(f"{name:<20} sync {sync_total:6.2f}s  async {async_total:6.2f}s  "
+                  f"stream first idea {first_idea:6.2f}s  ({describe(result)})")
+    finally:
+        search.stop()
+        llm.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Checks LLMs.json_repair / LLMs.schemas against a corpus of malformed model
+outputs and measures parse throughput.
+
+benchmarks/data/llm_outputs_synthetic.jsonl has one {"name", "endpoint",
+"text", "expect"} per line: `expect` is the value the text should parse to,
+null if it must be rejected, or "schema" if it parses but must fail
+validation. Cut-off entries may also give "kept", the number of root-list
+elements parse_response must return once the incomplete last one is
+dropped. The corpus is synthetic: every entry was written by hand to
+reproduce one failure mode seen in model output, none is a captured
+response. Every entry is also parsed with the old regex-strip-and-json.loads
+parser, for comparison. Exits non-zero, before timing anything, if the
+tolerant parser gets any entry wrong or an entry cannot be read.
+
+Throughput is measured on a 3-idea response of about --kb KiB, well formed
+in a ```json fence, and with trailing commas, unquoted keys and single
+quotes.
+
+    python -m benchmarks.bench_json_repair --kb 6 --seconds 1
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+from LLMs import json_repair
+from LLMs.schemas import RESPONSE_SCHEMAS, ResponseParseError, parse_response
+
+CORPUS = os.path.join(os.path.dirname(__file__), "data", "llm_outputs_synthetic.jsonl")
+
+
+def regex_parse(content: str):
+    """The parser MistralChat used before json_repair."""
+    return json.loads(re.sub(r'^```json\n|\n```$', '', content.strip()))
+
+
+def check_corpus(path: str):
+    with open(path) as f:
+        lines = [line for line in f if line.strip()]
+    cases, failures, regex_ok = [], [], 0
+    for number, line in enumerate(lines, 1):
+        try:
+            case = json.loads(line)
+        except json.JSONDecodeError as e:
+            case = {"error": str(e)}
+        if not isinstance(case, dict) or {"name", "text", "expect"} - case.keys() \
+                or case.get("endpoint") not in RESPONSE_SCHEMAS:
+            failures.append((f"line {number}", "unreadable entry"))
+        else:
+            cases.append(case)
+    for case in cases:
+        schema = RESPONSE_SCHEMAS[case["endpoint"]]
+        try:
+            regex_ok += regex_parse(case["text"]) == case["expect"]
+        except json.JSONDecodeError:
+            regex_ok += case["expect"] is None
+        try:
+            value = json_repair.loads(case["text"])
+        except json_repair.JSONRepairError:
+            value = None
+        try:
+            kept = len(parse_response(case["text"], schema)[schema.root_field])
+            valid = True
+        except ResponseParseError:
+            kept, valid = None, False
+        if case["expect"] == "schema":
+            ok = value is not None and not valid
+        elif case["expect"] is None:
+            ok = value is None and not valid
+        else:
+            ok = value == case["expect"] and valid and case.get("kept", kept) == kept
+        if not ok:
+            failures.append((case["name"], value))
+    print(f"synthetic corpus: {len(lines)} outputs  tolerant parser {len(lines) - len(failures)}/{len(lines)}  "
+          f"regex parser {regex_ok}/{len(lines)}")
+    for name, value in failures:
+        print(f"  FAIL {name}: {json.dumps(value)[:200]}")
+    return not failures
+
+
+def sample_response(kb: int):
+    filler = "Diffusion models trained on sparse views recover detail that filtered back projection loses. "
+    ideas = [{
+        "title": f"Idea {i}: score-based priors for sparse-view CT",
+        "summary": filler * max(1, kb * 1024 // (3 * len(filler)) - 4),
+        "opportunities": ["fewer scans", "lower dose", "faster triage"],
+        "drawbacks": ["slow sampling", "hallucinated structures"],
+        "references": {str(j): {"title": f"Paper {j}", "link": f"gs://inspireit-papers/2021-01/paper_{j}.pdf"}
+                       for j in range(1, 5)}
+    } for i in range(3)]
+    clean = "```json\n" + json.dumps({"ideas": ideas}, indent=2) + "\n```"
+    broken = re.sub(r'"(\w+)":', r"\1:", clean)
+    broken = re.sub(r'("gs://[^"]+")\n', r"\1,\n", broken.replace('"}', '",}'))
+    broken = re.sub(r'"(Paper \d+)"', r"'\1'", broken)
+    return clean, broken
+
+
+def throughput(parse, text: str, seconds: float):
+    count, started = 0, time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        parse(text)
+        count += 1
+    elapsed = time.perf_counter() - started
+    return count / elapsed, count * len(text) / elapsed / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--kb", type=int, default=6)
+    parser.add_argument("--seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    if not check_corpus(args.corpus):
+        sys.exit(1)
+
+    clean, broken = sample_response(args.kb)
+    assert json_repair.loads(broken) == json_repair.loads(clean)
+    schema = RESPONSE_SCHEMAS["ideas"]
+    for name, parse, text in (
+            ("regex + json.loads, clean", regex_parse, clean),
+            ("json_repair.loads, clean", json_repair.loads, clean),
+            ("json_repair.loads, broken", json_repair.loads, broken),
+            ("parse_response, clean", lambda t: parse_response(t, schema), clean),
+            ("parse_response, broken", lambda t: parse_response(t, schema), broken)):
+        per_sec, mib = throughput(parse, text, args.seconds)
+        print(f"{name:<28} {len(text) / 1024:5.1f} KiB  {per_sec:9.0f} parses/s  {mib:7.1f} MiB/s")
+
+
+if __name__ == "__main__":
+    main()
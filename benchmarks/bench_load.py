@@ -0,0 +1,230 @@
+"""
+Load-test suite for main.app: every endpoint, alone and in a mix, under
+concurrent closed-loop clients, against local Discovery Engine and Mistral
+stand-ins. Reports per scenario the requests, errors, req/s and p50/p95/p99
+latency (and time to first byte for the streaming endpoints), so changes
+can be compared offline.
+
+The app runs in its own uvicorn process(es) with caches off. Backends:
+
+  fake    synthetic responses (benchmarks.fake_servers) with configurable
+          latency, token rate and injected error rate
+  record  the stubs forward to the real APIs and save every exchange to
+          --cassette; needs MISTRAL_API_KEY and DISCOVERY_ENGINE_TOKEN (and
+          DISCOVERY_ENGINE_URL for a non-default engine)
+  replay  answers from --cassette only; the request sequence is seeded, so
+          a replay sends the same requests that were recorded, and requests
+          missing from the cassette get a 404 and are reported
+
+Record once with small numbers, then replay with the same --seed,
+--requests and --concurrency:
+
+    python -m benchmarks.bench_load --backend record --requests 10 --concurrency 2
+    python -m benchmarks.bench_load --backend replay --requests 10 --concurrency 2
+
+    python -m benchmarks.bench_load --scenario mixed --requests 400 --concurrency 32 \\
+        --llm-latency 0.5 --tokens-per-sec 200 --llm-error-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import httpx
+
+from benchmarks.fake_servers import (StubServer, Cassette, search_responder, chat_responder, flaky,
+                                     recording_responder, replay_responder, point_app_at,
+                                     serve_app_workers, stop_app_workers)
+from LLMs.prompts import DEFAULT_ENDPOINT_URL
+
+DOMAINS = [["NLP", "GANs"], ["Reinforcement Learning"], ["Computer Vision", "Robotics"],
+           ["Graph Neural Networks"], ["Speech", "NLP"], ["Federated Learning", "Privacy"]]
+SPECIFICATIONS = ["workshop paper", "low compute budget", "a 6 month project"]
+QUESTIONS = ["What is a GAN?", "How do transformers handle long documents?",
+             "What are open problems in federated learning?"]
+
+
+def paper(rng):
+    i = rng.randrange(5)
+    return {"title": f"Idea {i}", "summary": "A research idea used for load testing.",
+            "drawbacks": ["drawback1"], "opportunities": ["opp1", "opp2"]}
+
+
+# endpoint -> (method, payload(rng), streamed, weight in the mixed scenario)
+ENDPOINTS = {
+    "/": ("GET", None, False, 1),
+    "/generate/": ("GET", None, False, 1),
+    "/cache/stats": ("GET", None, False, 1),
+    "/metrics": ("GET", None, False, 1),
+    "/generate/submit/": ("POST", lambda rng: {"domains": rng.choice(DOMAINS),
+                                               "specifications": rng.choice(SPECIFICATIONS)}, False, 6),
+    "/generate/submit/stream/": ("POST", lambda rng: {"domains": rng.choice(DOMAINS),
+                                                      "specifications": rng.choice(SPECIFICATIONS)}, True, 4),
+    "/generate/submit/extra-suggestions/": ("POST", lambda rng: {"origDetails": paper(rng),
+                                                                 "specifications": rng.choice(SPECIFICATIONS)},
+                                            False, 3),
+    "/recommend/suggested/": ("POST", paper, False, 3),
+    "/chatbot": ("POST", lambda rng: {"message": rng.choice(QUESTIONS)}, False, 5),
+    "/chatbot/stream": ("POST", lambda rng: {"message": rng.choice(QUESTIONS)}, True, 5),
+}
+
+
+def plan(scenario, requests, seed):
+    """The (endpoint, payload) sequence of a scenario, the same for a given seed."""
+    rng = random.Random(f"{seed}:{scenario}")
+    if scenario == "mixed":
+        names = list(ENDPOINTS)
+        endpoints = rng.choices(names, weights=[ENDPOINTS[name][3] for name in names], k=requests)
+    else:
+        endpoints = [scenario] * requests
+    return [(name, ENDPOINTS[name][1](rng) if ENDPOINTS[name][1] else None) for name in endpoints]
+
+
+async def one(client, base, name, payload):
+    """Returns (endpoint, ok, latency, time to first byte)."""
+    method, _, streamed, _ = ENDPOINTS[name]
+    started = time.perf_counter()
+    first_byte = None
+    chunks = []
+    try:
+        async with client.stream(method, base + name, json=payload) as response:
+            async for chunk in response.aiter_bytes():
+                if first_byte is None:
+                    first_byte = time.perf_counter() - started
+                chunks.append(chunk)
+        body = b"".join(chunks)
+        ok = response.status_code == 200
+        if ok and streamed:
+            # a streamed failure still answers 200, ending with an error event
+            ok = b"event: error" not in body
+        elif ok and response.headers.get("content-type", "").startswith("application/json"):
+            # and the JSON endpoints report upstream failures in the body
+            result = json.loads(body)
+            ok = not (isinstance(result, dict) and "error" in result)
+    except httpx.HTTPError:
+        ok = False
+    return name, ok, time.perf_counter() - started, first_byte
+
+
+async def run(bases, sequence, concurrency):
+    queue = list(enumerate(sequence))
+    queue.reverse()
+    results = []
+
+    async def worker(client):
+        while queue:
+            i, (name, payload) = queue.pop()
+            results.append(await one(client, bases[i % len(bases)], name, payload))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=120.0, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return results, elapsed
+
+
+def percentiles(samples):
+    if len(samples) < 2:
+        return (samples[0],) * 3 if samples else (float("nan"),) * 3
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return cuts[49], cuts[94], cuts[98]
+
+
+def report(scenario, results, elapsed):
+    latencies = [latency for _, ok, latency, _ in results if ok]
+    errors = sum(not ok for _, ok, _, _ in results)
+    p50, p95, p99 = percentiles(latencies)
+    first_bytes = [first for name, ok, _, first in results if ok and first is not None and ENDPOINTS[name][2]]
+    ttfb = f"  ttfb p50 {statistics.median(first_bytes) * 1e3:7.1f}ms" if first_bytes else ""
+    print(f"{scenario:<38} n {len(results):4d}  err {errors:3d}  {len(results) / elapsed:7.1f} req/s  "
+          f"p50 {p50 * 1e3:7.1f}ms  p95 {p95 * 1e3:7.1f}ms  p99 {p99 * 1e3:7.1f}ms{ttfb}")
+    return errors
+
+
+def backends(args):
+    """(search responder, LLM responder, cassette or None) for --backend."""
+    if args.backend == "fake":
+        search, llm = search_responder(), chat_responder(tokens_per_sec=args.tokens_per_sec)
+        return (flaky(search, args.search_error_rate, args.seed, status=503),
+                flaky(llm, args.llm_error_rate, args.seed), None)
+    cassette = Cassette(args.cassette)
+    if args.backend == "replay":
+        if not len(cassette):
+            sys.exit(f"{args.cassette} is empty; record it first with --backend record")
+        return replay_responder(cassette), replay_responder(cassette), cassette
+    if os.path.exists(args.cassette):
+        os.unlink(args.cassette)
+        cassette = Cassette(args.cassette)
+    search_headers = {"Authorization": f"Bearer {os.environ['DISCOVERY_ENGINE_TOKEN']}"}
+    llm_headers = {"Authorization": f"Bearer {os.environ['MISTRAL_API_KEY']}"}
+    return (recording_responder(os.environ.get("DISCOVERY_ENGINE_URL", DEFAULT_ENDPOINT_URL), cassette,
+                                search_headers, keep_path=False),
+            recording_responder(args.mistral_url, cassette, llm_headers), cassette)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenario", default="all",
+                        help="'all' (each endpoint, then mixed), 'mixed', or one endpoint path")
+    parser.add_argument("--requests", type=int, default=100, help="per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn processes, one port each")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", choices=["fake", "record", "replay"], default="fake")
+    parser.add_argument("--cassette", default="benchmarks/data/load_cassette.jsonl")
+    parser.add_argument("--search-latency", type=float, default=0.1)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0, help="fake LLM generation speed (0 = instant)")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="share of completions answered 429")
+    parser.add_argument("--search-error-rate", type=float, default=0.0, help="share of searches answered 503")
+    parser.add_argument("--mistral-url", default="https://api.mistral.ai", help="API recorded from")
+    parser.add_argument("--port", type=int, default=8768)
+    args = parser.parse_args()
+
+    if args.backend == "record" and not all(os.environ.get(name) for name in ("MISTRAL_API_KEY",
+                                                                              "DISCOVERY_ENGINE_TOKEN")):
+        sys.exit("--backend record needs MISTRAL_API_KEY and DISCOVERY_ENGINE_TOKEN")
+    scenarios = list(ENDPOINTS) + ["mixed"] if args.scenario == "all" else [args.scenario]
+    if any(scenario != "mixed" and scenario not in ENDPOINTS for scenario in scenarios):
+        sys.exit(f"unknown scenario; use all, mixed or one of: {', '.join(ENDPOINTS)}")
+
+    search_respond, llm_respond, cassette = backends(args)
+    # latency is only simulated for the fake backend; recording has the real one
+    fake = args.backend == "fake"
+    search = StubServer(search_respond, args.search_latency if fake else 0.0).start()
+    llm = StubServer(llm_respond, args.llm_latency if fake else 0.0).start()
+    point_app_at(search, llm, caches=False)
+    ports = [args.port + i for i in range(args.workers)]
+    processes = [serve_app_workers(port, 1) for port in ports]
+    print(f"backend {args.backend}, {args.workers} worker(s), concurrency {args.concurrency}, "
+          f"{args.requests} requests per scenario")
+    errors = 0
+    try:
+        bases = [f"http://127.0.0.1:{port}" for port in ports]
+        for scenario in scenarios:
+            results, elapsed = asyncio.run(run(bases, plan(scenario, args.requests, args.seed), args.concurrency))
+            errors += report(scenario, results, elapsed)
+    finally:
+        for process in processes:
+            stop_app_workers(process)
+        search.stop()
+        llm.stop()
+    print(f"upstream requests: search {search.requests}, llm {llm.requests}; "
+          f"peak in flight at the LLM {llm.peak_in_flight}")
+    if args.backend == "replay":
+        misses = search_respond.misses + llm_respond.misses
+        print(f"replayed from {len(cassette)} recorded exchanges, {misses} requests not in the cassette")
+    elif args.backend == "record":
+        print(f"recorded {len(cassette)} exchanges to {args.cassette}")
+    else:
+        print(f"injected failures: search {search_respond.errors}, llm {llm_respond.errors}")
+    print(f"{errors} failed requests")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Cost of the request instrumentation in LLMs.metrics.
+
+First the cost of one timed stage (`with metrics.stage(...)`) with metrics
+off, on, and on with spans written to a file. Then /generate/submit/ is
+served in-process (httpx's ASGI transport, no app server) against
+zero-latency Discovery Engine and Mistral stubs with caches off, in
+interleaved rounds of each mode, so the instrumentation is as large a share
+of each request as it can be. It reports the median request time per mode,
+the stages recorded per request, and checks that
+
+  - /metrics is valid Prometheus text and has the stage, route, token and
+    cache series,
+  - every span of a request shares its trace and has a parent in it,
+  - the instrumentation costs less than --max-overhead-us per request
+    (stages per request, the HTTP middleware's included, x the measured
+    cost of a stage with spans), exiting non-zero otherwise.
+
+    python -m benchmarks.bench_metrics_overhead --requests 200 --max-overhead-us 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.fake_servers import StubServer, search_responder, chat_responder, point_app_at
+from LLMs.metrics import JSONLinesSpanExporter, PipelineMetrics
+
+SAMPLE_RE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="[^"]*",?)*\})? -?[0-9.e+-]+|[+-]Inf|NaN$')
+
+
+def stage_cost(metrics, n):
+    """Microseconds per enter/exit of one stage."""
+    started = time.perf_counter()
+    for _ in range(n):
+        with metrics.stage("bench"):
+            pass
+    return (time.perf_counter() - started) / n * 1e6
+
+
+def valid_exposition(text):
+    for line in text.splitlines():
+        if line and not line.startswith("#") and not SAMPLE_RE.match(line):
+            return False
+    return True
+
+
+def traces_connected(path):
+    with open(path) as f:
+        spans = [json.loads(line) for line in f]
+    by_trace = {}
+    for span in spans:
+        by_trace.setdefault(span["traceId"], []).append(span)
+    for trace in by_trace.values():
+        ids = {span["spanId"] for span in trace}
+        roots = [span for span in trace if not span["parentSpanId"]]
+        if len(roots) != 1 or any(span["parentSpanId"] not in ids for span in trace if span["parentSpanId"]):
+            return False, len(by_trace)
+    return True, len(by_trace)
+
+
+async def run(app, chat, modes, rounds, per_round):
+    body = {"domains": ["NLP", "GANs"], "specifications": "workshop"}
+    times = {mode: [] for mode in modes}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+        for _ in range(rounds):
+            for mode, (enabled, exporter) in modes.items():
+                chat.metrics.enabled, chat.metrics.exporter = enabled, exporter
+                for _ in range(per_round):
+                    started = time.perf_counter()
+                    response = await client.post("/generate/submit/", json=body)
+                    times[mode].append(time.perf_counter() - started)
+                    response.raise_for_status()
+        chat.metrics.exporter = None
+        exposition = (await client.get("/metrics")).text
+    return times, exposition
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200, help="per mode")
+    parser.add_argument("--stage-iterations", type=int, default=200_000)
+    parser.add_argument("--max-overhead-us", type=float, default=500.0)
+    args = parser.parse_args()
+
+    trace_path = tempfile.mktemp(prefix="inspireit-spans-", suffix=".jsonl")
+    exporter = JSONLinesSpanExporter(trace_path)
+    costs = {
+        "off": stage_cost(PipelineMetrics(enabled=False), args.stage_iterations),
+        "on": stage_cost(PipelineMetrics(), args.stage_iterations),
+        "on+spans": stage_cost(PipelineMetrics(exporter=JSONLinesSpanExporter(os.devnull)),
+                               args.stage_iterations // 10)
+    }
+    print("stage cost: " + "  ".join(f"{mode} {cost:5.2f}us" for mode, cost in costs.items()))
+
+    search = StubServer(search_responder()).start()
+    llm = StubServer(chat_responder()).start()
+    point_app_at(search, llm, caches=False)
+    os.environ["SINGLE_FLIGHT"] = "0"
+    import main as app_module
+    chat = app_module.chat
+
+    modes = {"off": (False, None), "on": (True, None), "on+spans": (True, exporter)}
+    rounds = 10
+    try:
+        times, exposition = asyncio.run(run(app_module.app, chat, modes, rounds, max(1, args.requests // rounds)))
+    finally:
+        search.stop()
+        llm.stop()
+        exporter.close()
+
+    requests = len(times["on"]) + len(times["on+spans"])
+    stages = sum(sum(counts) for counts, _ in chat.metrics.stage_seconds.values.values()) / requests
+    base = statistics.median(times["off"])
+    for mode, samples in times.items():
+        median = statistics.median(samples)
+        print(f"{mode:<9} request p50 {median * 1e3:6.2f}ms  ({(median - base) * 1e6:+6.0f}us vs off)")
+
+    overhead = stages * costs["on+spans"]
+    has_series = all(name in exposition for name in (
+        'inspireit_stage_seconds_bucket{stage="completion"', 'route="/generate/submit/"',
+        'inspireit_llm_tokens_total{type="completion"}', 'inspireit_cache_misses_total{cache="retrieval"}'))
+    valid = valid_exposition(exposition)
+    connected, traces = traces_connected(trace_path)
+    os.unlink(trace_path)
+    print(f"stages/request {stages:.1f}  modelled overhead {overhead:.0f}us/request "
+          f"(limit {args.max_overhead_us:.0f}us)")
+    print(f"/metrics valid {valid}, expected series {has_series}; "
+          f"{traces} traces, spans connected {connected}")
+    ok = valid and has_series and connected and traces == len(times["on+spans"]) and overhead <= args.max_overhead_us
+    print("ok" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
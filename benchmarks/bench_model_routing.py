@@ -0,0 +1,161 @@
+"""
+Model routing, fallback tiers and hedged requests (LLMs.routing) against
+three fake Mistral deployments of different speeds, one per model:
+
+  mistral-large-latest   --large-latency, and --tail of its requests take
+                         --tail-latency longer
+  mistral-small-latest   --small-latency
+  ministral-8b-latest    --tiny-latency
+
+AsyncMistralChat is driven in-process with --concurrency concurrent callers
+making a mix of chat, improvement and idea requests, caches and
+coalescing off, in four configurations:
+
+  large only     every call on the large model (the old behaviour)
+  routed         the default routes: chat and improvement on the small model
+  routed+hedge   also MODEL_HEDGE_AFTER=--hedge-after
+  429s           the large model answers --error-rate of calls with 429;
+                 large only vs routed, with the default fallback tiers
+
+It reports p50/p95 latency and failures per request kind and the calls
+each model served, and exits non-zero unless routing makes chat faster,
+hedging cuts the p95 of idea generation, and fallback serves every request
+that the large model alone fails.
+
+    python -m benchmarks.bench_model_routing --requests 60 --tail 0.1
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+
+from benchmarks.fake_servers import StubServer, search_responder, chat_responder, flaky, point_app_at
+
+MODELS = ("mistral-large-latest", "mistral-small-latest", "ministral-8b-latest")
+
+
+def slow_tail(respond, share, extra, seed=0):
+    """Makes a seeded `share` of requests take `extra` seconds longer."""
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def wrapped(path, body):
+        with lock:
+            slow = rng.random() < share
+        if slow:
+            time.sleep(extra)
+        return respond(path, body)
+    return wrapped
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))] if samples else float("nan")
+
+
+async def drive(chat, requests, concurrency):
+    paper = {"title": "Idea 0", "summary": "A research idea.", "drawbacks": ["d1"], "opportunities": ["o1"]}
+    kinds = {
+        "chat": lambda i: chat.research_chat(f"question {i}"),
+        "improve": lambda i: chat.suggestion_improvement_idea_prompt(
+            {"origDetails": paper, "specifications": f"variant {i}"}),
+        "ideas": lambda i: chat.generate_ideas([f"Domain {i}"], "benchmark"),
+    }
+    plan = [(kind, i) for i in range(requests) for kind in kinds]
+    results = {kind: [] for kind in kinds}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(kind, i):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                result = await kinds[kind](i)
+                ok = not (isinstance(result, dict) and "error" in result)
+            except Exception:
+                ok = False
+            results[kind].append((ok, time.perf_counter() - started))
+
+    await asyncio.gather(*(one(kind, i) for kind, i in plan))
+    return results
+
+
+def run(name, env, args):
+    saved = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+    try:
+        from LLMs.async_prompts import AsyncMistralChat
+        chat = AsyncMistralChat()
+        results = asyncio.run(drive(chat, args.requests, args.concurrency))
+        chat.credentials.stop()
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+    router = chat.router.snapshot()
+    summary = {}
+    line = f"{name:<16}"
+    for kind, samples in results.items():
+        latencies = [latency for ok, latency in samples if ok]
+        failed = sum(not ok for ok, _ in samples)
+        summary[kind] = (percentile(latencies, 0.5), percentile(latencies, 0.95), failed)
+        line += f" {kind} p50 {summary[kind][0]:5.2f}s p95 {summary[kind][1]:5.2f}s fail {failed:2d} |"
+    calls = "/".join(str(router["models"].get(model, {}).get("calls", 0)) for model in MODELS)
+    print(f"{line} calls L/S/T {calls}  hedges {router['hedges']} (won {router['hedge_wins']})  "
+          f"fallbacks {router['fallbacks']}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=40, help="of each kind")
+    parser.add_argument("--concurrency", type=int, default=12)
+    parser.add_argument("--large-latency", type=float, default=1.0)
+    parser.add_argument("--small-latency", type=float, default=0.3)
+    parser.add_argument("--tiny-latency", type=float, default=0.15)
+    parser.add_argument("--tail", type=float, default=0.1, help="share of large-model calls that are slow")
+    parser.add_argument("--tail-latency", type=float, default=5.0)
+    parser.add_argument("--hedge-after", type=float, default=1.5)
+    parser.add_argument("--error-rate", type=float, default=0.25)
+    args = parser.parse_args()
+
+    search = StubServer(search_responder()).start()
+    large = StubServer(slow_tail(chat_responder(), args.tail, args.tail_latency), args.large_latency).start()
+    small = StubServer(chat_responder(), args.small_latency).start()
+    tiny = StubServer(chat_responder(), args.tiny_latency).start()
+    failing = StubServer(flaky(chat_responder(), args.error_rate), args.large_latency).start()
+    # hedging hangs up on the losing call
+    for server in (large, small, tiny):
+        server.httpd.handle_error = lambda request, client_address: None
+    point_app_at(search, large, caches=False)
+    os.environ.update({"SINGLE_FLIGHT": "0", "IDEA_FANOUT": "0"})
+    servers = f"mistral-small-latest={small.url},ministral-8b-latest={tiny.url}"
+    large_only = {"MODEL_ROUTES": "", "MODEL_FALLBACKS": "", "MODEL_SERVER_URLS": servers}
+    routed = {"MODEL_SERVER_URLS": servers}
+    print(f"large {args.large_latency}s (+{args.tail_latency}s for {args.tail:.0%}), small {args.small_latency}s, "
+          f"tiny {args.tiny_latency}s; {args.requests} requests of each kind, concurrency {args.concurrency}")
+    try:
+        single = run("large only", large_only, args)
+        routing = run("routed", routed, args)
+        hedged = run("routed+hedge", dict(routed, MODEL_HEDGE_AFTER=str(args.hedge_after)), args)
+        os.environ["MISTRAL_SERVER_URL"] = failing.url
+        unprotected = run("429s large only", large_only, args)
+        protected = run("429s routed", routed, args)
+    finally:
+        for server in (search, large, small, tiny, failing):
+            server.stop()
+
+    ok = (routing["chat"][0] < single["chat"][0]
+          and hedged["ideas"][1] < routing["ideas"][1]
+          and unprotected["ideas"][2] > 0
+          and all(failed == 0 for _, _, failed in protected.values()))
+    print("ok" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
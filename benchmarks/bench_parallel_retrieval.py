@@ -0,0 +1,185 @@
+"""
+Critical-path latency of the prompt pipeline with per-domain retrieval
+(IDEA_DOMAIN_SEARCH=1) and the LLM connection warm-up (LLM_WARMUP), against
+a fake Discovery Engine that answers each query with its own papers after
+--search-latency, and a fake Mistral that takes --connect-latency extra on
+every new connection (the TCP and TLS round trips to a remote API) and
+--llm-latency per completion.
+
+Each request starts without a pooled connection to the model, as after the
+pool's keep-alive has run out between requests; the search connection
+stays warm. Requests are made one at a time through AsyncMistralChat and
+MistralChat, caches off, in four configurations:
+
+  baseline              one combined search for the domains, no warm-up
+  domains, in sequence  the combined and per-domain searches one after
+                        another (for reference; the app never does this)
+  domains, parallel     IDEA_DOMAIN_SEARCH=1: the same searches at once
+  domains + warm-up     also LLM_WARMUP=1 (the default)
+
+It reports p50 latency of idea generation (--domains domains), the
+improvement and recommendation flows, and the distinct papers idea
+generation had to choose from, and exits non-zero unless parallel
+searches cost no more than one, the warm-up takes most of
+--connect-latency off every flow, and no warm-up failed.
+
+    python -m benchmarks.bench_parallel_retrieval --requests 15 --connect-latency 0.12
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+from benchmarks.fake_servers import StubServer, chat_responder, fake_search_result, point_app_at
+
+DOMAINS = ["NLP", "Computer Vision", "Robotics", "Graph Neural Networks"]
+PAPER = {"title": "Idea 0", "summary": "A research idea.", "drawbacks": ["d1"], "opportunities": ["o1"]}
+
+
+def topical_search_responder():
+    """Search stub whose results depend on the query: papers per keyword, plus some every query shares."""
+    def respond(path, body):
+        query = body["query"]
+        result = fake_search_result(body.get("pageSize", 10))
+        for i, item in enumerate(result["results"]):
+            doc = item["document"]["derivedStructData"]
+            if i % 3:
+                topic = hashlib.sha256(query.encode()).hexdigest()[:8]
+                doc["title"] = f"Paper {topic}-{i}"
+                doc["link"] = f"gs://inspireit-papers/2021-01/paper_{topic}_{i}.pdf"
+        return 200, result
+    return respond
+
+
+def cold(chat):
+    """Drops the pooled connections to the model, as if they had idled out."""
+    for client in {id(c): c for c in [chat.client, *chat.router.clients.values()]}.values():
+        config = client.sdk_configuration
+        config.client.close()
+        config.client = httpx.Client()
+        old, config.async_client = config.async_client, httpx.AsyncClient()
+        chat.retired.append(old)
+    chat.warmer.warmed.clear()
+
+
+async def sequential_search_all(chat, searches):
+    from LLMs.context import merge_triples
+    return merge_triples([await chat._search(query, page_size) for query, page_size in searches])
+
+
+async def run_async(args, sequential):
+    from LLMs.async_prompts import AsyncMistralChat
+    chat = AsyncMistralChat()
+    chat.retired = []
+    if sequential:
+        chat._search_all = lambda searches: sequential_search_all(chat, searches)
+    flows = {
+        "ideas": lambda i: chat.generate_ideas(DOMAINS[:args.domains], f"variant {i}"),
+        "improve": lambda i: chat.suggestion_improvement_idea_prompt({"origDetails": PAPER,
+                                                                      "specifications": f"variant {i}"}),
+        "recommend": lambda i: chat.recommend_ideas(dict(PAPER, summary=f"A research idea, variant {i}.")),
+    }
+    latencies = {name: [] for name in flows}
+    failures = 0
+    try:
+        # first request of the run sets up the search connection
+        await flows["recommend"](-1)
+        for i in range(args.requests):
+            for name, flow in flows.items():
+                cold(chat)
+                # a warm-up still in flight belongs to the previous request
+                await asyncio.gather(*chat.warmer.tasks)
+                started = time.perf_counter()
+                result = await flow(i)
+                latencies[name].append(time.perf_counter() - started)
+                failures += "error" in result
+        triples = await chat._search_all(chat._idea_searches(DOMAINS[:args.domains], "papers"))
+        papers = len({triple["link"] for triple in triples})
+    finally:
+        await asyncio.gather(*chat.warmer.tasks)
+        for client in chat.retired:
+            await client.aclose()
+        await chat.aclose()
+    return {name: statistics.median(samples) for name, samples in latencies.items()}, papers, failures, chat.warmer
+
+
+def run_sync(args):
+    from LLMs.prompts import MistralChat
+    chat = MistralChat()
+    chat.retired = []
+    samples = []
+    try:
+        chat.generate_ideas(DOMAINS[:args.domains], "warm search")
+        for i in range(args.requests):
+            cold(chat)
+            started = time.perf_counter()
+            chat.generate_ideas(DOMAINS[:args.domains], f"variant {i}")
+            samples.append(time.perf_counter() - started)
+    finally:
+        chat.credentials.stop()
+    return statistics.median(samples)
+
+
+def run(name, env, args, sequential=False):
+    saved = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+    try:
+        p50, papers, failures, warmer = asyncio.run(run_async(args, sequential))
+        # the sequential searches are only patched into the async client
+        sync_ideas = None if sequential else run_sync(args)
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+    sync_ideas = f"{sync_ideas * 1e3:6.0f}ms" if sync_ideas is not None else "     -  "
+    print(f"{name:<22} ideas {p50['ideas'] * 1e3:6.0f}ms  improve {p50['improve'] * 1e3:6.0f}ms  "
+          f"recommend {p50['recommend'] * 1e3:6.0f}ms | sync ideas {sync_ideas} | "
+          f"papers {papers:3d} | warm-ups {warmer.warmups} (failed {warmer.failures})  errors {failures}")
+    return p50, warmer.failures + failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=15, help="of each flow")
+    parser.add_argument("--domains", type=int, default=3)
+    parser.add_argument("--search-latency", type=float, default=0.15)
+    parser.add_argument("--connect-latency", type=float, default=0.12)
+    parser.add_argument("--llm-latency", type=float, default=0.4)
+    args = parser.parse_args()
+
+    search = StubServer(topical_search_responder(), args.search_latency).start()
+    llm = StubServer(chat_responder(), args.llm_latency, connect_latency=args.connect_latency).start()
+    point_app_at(search, llm, caches=False)
+    os.environ.update({"SINGLE_FLIGHT": "0", "IDEA_FANOUT": "0", "MODEL_ROUTES": "", "MODEL_FALLBACKS": ""})
+    print(f"search {args.search_latency}s, LLM {args.llm_latency}s + {args.connect_latency}s per new connection; "
+          f"{args.requests} requests per flow, {args.domains} domains")
+    try:
+        baseline, _ = run("baseline", {"IDEA_DOMAIN_SEARCH": "0", "LLM_WARMUP": "0"}, args)
+        sequential, _ = run("domains, in sequence", {"IDEA_DOMAIN_SEARCH": "1", "LLM_WARMUP": "0"}, args, True)
+        parallel, _ = run("domains, parallel", {"IDEA_DOMAIN_SEARCH": "1", "LLM_WARMUP": "0"}, args)
+        warm, failed = run("domains + warm-up", {"IDEA_DOMAIN_SEARCH": "1", "LLM_WARMUP": "1"}, args)
+    finally:
+        search.stop()
+        llm.stop()
+    print(f"LLM connections opened: {llm.connections}")
+
+    saved = {flow: baseline[flow] - warm[flow] for flow in baseline}
+    print("critical path saved vs baseline: " + ", ".join(f"{flow} {seconds * 1e3:.0f}ms"
+                                                          for flow, seconds in saved.items()))
+    ok = (parallel["ideas"] < sequential["ideas"]
+          and parallel["ideas"] < baseline["ideas"] + args.search_latency / 2
+          and all(seconds > args.connect_latency / 2 for seconds in saved.values())
+          and failed == 0)
+    print("ok" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
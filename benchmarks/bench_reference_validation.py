@@ -0,0 +1,115 @@
+"""
+Latency and accuracy of LLMs.references.ReferenceValidator on synthetic
+responses, against a PaperCatalog of --rows synthetic papers.
+
+Each request has 20 snippets drawn from the catalog and 3 ideas with 4
+references each, a mix of:
+
+  exact        a snippet's title and link, verbatim
+  garbled      a snippet's title with case, punctuation and a word changed
+  catalog      a catalog paper that is not in the snippets, exact title, wrong link
+  fuzzy        a catalog paper that is not in the snippets, title with a typo
+  hallucinated a title and gs:// link that exist nowhere
+
+Reports the time the validation stage adds per request and how many
+references ended up with the right paper (or were dropped, for
+hallucinations).
+
+    python -m benchmarks.bench_reference_validation --rows 100000 --requests 300
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from Ingestion.catalog import PaperCatalog
+from LLMs.references import ReferenceValidator
+from benchmarks.bench_catalog import paper_id, synthetic_papers
+
+KINDS = ["exact", "garbled", "catalog", "fuzzy", "hallucinated"]
+
+
+def garble(rng, title):
+    words = title.split()
+    words[rng.randrange(len(words) - 1)] = rng.choice(["novel", "towards", "via"])
+    return " ".join(words).upper().replace(" ", ", ", 1)
+
+
+def typo(rng, title):
+    i = rng.randrange(1, len(title) - 1)
+    return title[:i] + title[i + 1] + title[i] + title[i + 2:]
+
+
+def make_request(rng, catalog, rows):
+    papers = [catalog.get(paper_id(rng.randrange(rows))) for _ in range(24)]
+    snippets, outside = papers[:20], papers[20:]
+    triples = [{"title": p["title"], "snippet": "...", "link": p["gcs_link"]} for p in snippets]
+    ideas, expected = [], {}
+    for i in range(3):
+        references = {}
+        for j in range(4):
+            kind = rng.choice(KINDS)
+            if kind in ("exact", "garbled"):
+                paper = rng.choice(snippets)
+            else:
+                paper = rng.choice(outside)
+            title = {"exact": paper["title"], "garbled": garble(rng, paper["title"]),
+                     "catalog": paper["title"], "fuzzy": typo(rng, paper["title"]),
+                     "hallucinated": f"Imaginary Results On Topic {rng.random()}"}[kind]
+            link = paper["gcs_link"] if kind in ("exact", "garbled") else f"gs://bucket/made-up-{i}-{j}.pdf"
+            references[str(j + 1)] = {"title": title, "link": link}
+            expected[(i, title)] = (kind, None if kind == "hallucinated" else paper)
+        ideas.append({"title": f"Idea {i}", "summary": "...", "references": references})
+    return {"ideas": ideas}, triples, expected
+
+
+def score(result, expected, outcomes):
+    for i, idea in enumerate(result["ideas"]):
+        kept = {(ref["title"], ref["link"]) for ref in idea["references"].values()}
+        for (idea_index, title), (kind, paper) in expected.items():
+            if idea_index != i:
+                continue
+            if paper is None:
+                outcomes[kind].append(not any(t == title for t, _ in kept))
+            else:
+                outcomes[kind].append((paper["title"], paper["gcs_link"]) in kept)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--threshold", type=float, default=0.6)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="inspireit-refs-")
+    try:
+        catalog = PaperCatalog(os.path.join(directory, "catalog.db"), "arxiv_papers", "gs://bucket")
+        for start in range(0, args.rows, 50_000):
+            catalog.add(synthetic_papers(start, min(50_000, args.rows - start)))
+        rng = random.Random(0)
+        requests = [make_request(rng, catalog, args.rows) for _ in range(args.requests)]
+
+        for name, validator in (("snippets only", ReferenceValidator(threshold=args.threshold)),
+                                ("with catalog", ReferenceValidator(catalog, args.threshold))):
+            outcomes = {kind: [] for kind in KINDS}
+            latencies = []
+            for result, triples, expected in requests:
+                result = {"ideas": [dict(idea, references=dict(idea["references"])) for idea in result["ideas"]]}
+                started = time.perf_counter()
+                validator.fix(result, triples)
+                latencies.append((time.perf_counter() - started) * 1000)
+                score(result, expected, outcomes)
+            latencies.sort()
+            print(f"{name:<14} p50 {statistics.median(latencies):.2f}ms  "
+                  f"p99 {latencies[int(len(latencies) * 0.99) - 1]:.2f}ms  correct: " + "  ".join(
+                      f"{kind} {sum(o) / len(o):.0%}" for kind, o in outcomes.items() if o))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Micro-benchmark: per-call latency of Discovery Engine searches against a local
+HTTPS stub, with a fresh requests.post per call (the old behaviour) versus the
+pooled keep-alive SearchClient.
+
+    python -m benchmarks.bench_search_pool --calls 200
+"""
+import argparse
+import statistics
+import time
+
+import requests
+
+from LLMs.search_client import SearchClient
+from benchmarks.fake_servers import StubServer, search_responder, self_signed_cert
+
+
+def summarize(name, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{name:>10}: mean {statistics.mean(samples) * 1000:7.2f} ms  "
+          f"p50 {statistics.median(samples) * 1000:7.2f} ms  p95 {p95 * 1000:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--pool-size", type=int, default=4)
+    args = parser.parse_args()
+
+    certfile, keyfile = self_signed_cert()
+    server = StubServer(search_responder(), certfile=certfile, keyfile=keyfile).start()
+    url = server.url + "/search"
+    headers = {"Authorization": "Bearer fake-token", "Content-Type": "application/json"}
+    payload = {"query": "NLP, GANs", "pageSize": 20}
+
+    try:
+        unpooled = []
+        for _ in range(args.calls):
+            start = time.perf_counter()
+            requests.post(url, headers=headers, json=payload, verify=certfile).json()
+            unpooled.append(time.perf_counter() - start)
+
+        client = SearchClient(url, pool_size=args.pool_size, verify=certfile)
+        pooled = []
+        for _ in range(args.calls):
+            start = time.perf_counter()
+            client.search(payload, headers)
+            pooled.append(time.perf_counter() - start)
+        client.close()
+    finally:
+        server.stop()
+
+    print(f"{args.calls} sequential calls to {url}")
+    summarize("no pool", unpooled)
+    summarize("pooled", pooled)
+
+
+if __name__ == "__main__":
+    main()
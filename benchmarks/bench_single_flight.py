@@ -0,0 +1,106 @@
+"""
+Concurrent-client check of request coalescing (LLMs.single_flight) against
+stub Discovery Engine and Mistral servers.
+
+Each round fires --clients identical /generate/submit/ requests at once
+(a class clicking "generate" together) plus --distinct requests for other
+domains, at the app under uvicorn with caches off, and counts how many
+searches and completions reached the stubs. Worker processes are separate
+uvicorn servers on consecutive ports and requests alternate between them,
+so each worker is sure to see part of the burst:
+
+  off            SINGLE_FLIGHT=0, 1 worker
+  in-worker      1 worker
+  2 workers      coalescing within each worker only
+  2 workers+dir  SINGLE_FLIGHT_DIR shared by both workers
+
+It fails if identical requests got different responses, or if coalescing
+let more than one completion per distinct request through.
+
+    python -m benchmarks.bench_single_flight --clients 30 --llm-latency 1.0
+"""
+import argparse
+import asyncio
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.fake_servers import (StubServer, search_responder, chat_responder, point_app_at,
+                                     serve_app_workers, stop_app_workers)
+
+
+async def fire(bases, clients, distinct):
+    """Sends the requests round-robin over `bases` (one per worker); returns latencies, results and summed stats."""
+    bodies = [{"domains": ["NLP", "GANs"], "specifications": "workshop"}] * clients
+    bodies += [{"domains": [f"Domain {i}"], "specifications": "workshop"} for i in range(distinct)]
+
+    async def one(client, base, body):
+        start = time.perf_counter()
+        response = await client.post(base + "/generate/submit/", json=body)
+        response.raise_for_status()
+        return time.perf_counter() - start, response.json()
+
+    async with httpx.AsyncClient(timeout=None, limits=httpx.Limits(max_connections=None)) as client:
+        results = await asyncio.gather(*(one(client, bases[i % len(bases)], body)
+                                         for i, body in enumerate(bodies)))
+        stats = {"coalesced": 0, "cross_worker": 0}
+        for base in bases:
+            worker = (await client.get(base + "/cache/stats")).json()["single_flight"]
+            for field in stats:
+                stats[field] += worker[field]
+    return [latency for latency, _ in results], [result for _, result in results], stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=30)
+    parser.add_argument("--distinct", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--search-latency", type=float, default=0.2)
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+
+    search = StubServer(search_responder(), args.search_latency).start()
+    llm = StubServer(chat_responder(), args.llm_latency).start()
+    point_app_at(search, llm, caches=False)
+    directory = tempfile.mkdtemp(prefix="inspireit-flight-")
+    ok = True
+    print(f"{args.clients} identical + {args.distinct} distinct requests, "
+          f"LLM stub {args.llm_latency}s, search stub {args.search_latency}s")
+    try:
+        # most completions each round may make: one per distinct request, per worker that sees it
+        for name, workers, env, limit in (
+                ("off", 1, {"SINGLE_FLIGHT": "0"}, args.clients + args.distinct),
+                ("in-worker", 1, {}, 1 + args.distinct),
+                ("2 workers", 2, {}, 2 + args.distinct),
+                ("2 workers+dir", 2, {"SINGLE_FLIGHT_DIR": directory}, 1 + args.distinct)):
+            ports = [args.port + i for i in range(workers)]
+            processes = [serve_app_workers(port, 1, env) for port in ports]
+            try:
+                search.requests = llm.requests = 0
+                latencies, results, stats = asyncio.run(
+                    fire([f"http://127.0.0.1:{port}" for port in ports], args.clients, args.distinct))
+            finally:
+                for process in processes:
+                    stop_app_workers(process)
+            identical = results[:args.clients]
+            same = all(result == identical[0] for result in identical) and "ideas" in identical[0]
+            passed = same and llm.requests <= limit
+            ok = ok and passed
+            print(f"{name:<14} completions {llm.requests:3d}  searches {search.requests:3d}  "
+                  f"p50 {statistics.median(latencies):5.2f}s  max {max(latencies):5.2f}s  "
+                  f"coalesced {stats['coalesced']:3d}  cross-worker {stats['cross_worker']:2d}  "
+                  f"{'ok' if passed else 'FAIL'}")
+    finally:
+        search.stop()
+        llm.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Time-to-first-byte benchmark for the streaming endpoints against a fake LLM
+that generates at a fixed token rate.
+
+Reports, for /generate/submit/ vs /generate/submit/stream/, when the client
+sees the first byte, the first complete idea and the full result; and for
+/chatbot vs /chatbot/stream, the first token vs the full reply. Exits
+non-zero unless both streams send their first byte within --max-ttfb.
+
+    python -m benchmarks.bench_streaming_ttfb --tokens-per-sec 40
+"""
+import argparse
+import sys
+import time
+
+import httpx
+
+from benchmarks.fake_servers import (StubServer, search_responder, chat_responder,
+                                     point_app_at, serve_app, stop_app)
+
+
+def timed_post(client, url, payload):
+    start = time.perf_counter()
+    response = client.post(url, json=payload)
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+def timed_stream(client, url, payload, first_event):
+    start = time.perf_counter()
+    first_byte = first_hit = None
+    with client.stream("POST", url, json=payload) as response:
+        for line in response.iter_lines():
+            now = time.perf_counter() - start
+            if first_byte is None:
+                first_byte = now
+            if first_hit is None and line == f"event: {first_event}":
+                first_hit = now
+    return first_byte, first_hit, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0)
+    parser.add_argument("--search-latency", type=float, default=0.1)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--max-ttfb", type=float, default=1.0, help="seconds")
+    args = parser.parse_args()
+
+    search = StubServer(search_responder(), args.search_latency).start()
+    llm = StubServer(chat_responder(tokens_per_sec=args.tokens_per_sec)).start()
+    point_app_at(search, llm, caches=False)
+
+    import main as app_module
+    server, thread = serve_app(app_module.app, args.port)
+    base = f"http://127.0.0.1:{args.port}"
+    ideas = {"domains": ["NLP", "GANs"], "specifications": "benchmark"}
+    chat = {"message": "What is a GAN?"}
+    try:
+        with httpx.Client(timeout=None) as client:
+            full = timed_post(client, base + "/generate/submit/", ideas)
+            first_byte, first_idea, total = timed_stream(
+                client, base + "/generate/submit/stream/", ideas, "idea")
+            chat_full = timed_post(client, base + "/chatbot", chat)
+            chat_first_byte, first_token, chat_total = timed_stream(
+                client, base + "/chatbot/stream", chat, "token")
+    finally:
+        stop_app(server, thread)
+        search.stop()
+        llm.stop()
+
+    print(f"fake LLM at {args.tokens_per_sec:.0f} tokens/s")
+    print(f"/generate/submit/         complete response: {full:6.2f}s")
+    print(f"/generate/submit/stream/  first byte: {first_byte:6.2f}s  "
+          f"first idea: {first_idea:6.2f}s  done: {total:6.2f}s")
+    print(f"/chatbot                  complete response: {chat_full:6.2f}s")
+    print(f"/chatbot/stream           first byte: {chat_first_byte:6.2f}s  "
+          f"first token: {first_token:6.2f}s  done: {chat_total:6.2f}s")
+    ok = max(first_byte, chat_first_byte) < args.max_ttfb
+    print("ok" if ok else f"FAIL: first byte after more than {args.max_ttfb}s")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Build time, query latency and recall@10 of the local IVF index at 10k and
+100k chunks, plus embedding throughput of the default HashingEmbedder.
+
+Vectors are synthetic (clustered unit vectors) so the numbers measure the
+index itself; recall is against exact brute-force search.
+
+    python -m benchmarks.bench_vector_index --sizes 10000 100000
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from Retrieval.embeddings import HashingEmbedder
+from Retrieval.vector_index import IVFIndex
+
+
+def clustered_vectors(n: int, dim: int, n_topics: int = 200, noise: float = 0.6, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    vectors = topics[rng.integers(0, n_topics, n)] + noise * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def bench_embedder(n_texts: int = 2000, words: int = 200, seed: int = 0):
+    rng = random.Random(seed)
+    vocab = [f"term{i}" for i in range(20000)]
+    texts = [" ".join(rng.choices(vocab, k=words)) for _ in range(n_texts)]
+    embedder = HashingEmbedder()
+    start = time.perf_counter()
+    embedder(texts)
+    elapsed = time.perf_counter() - start
+    print(f"HashingEmbedder: {n_texts / elapsed:,.0f} chunks/s ({words} words per chunk)")
+
+
+def bench_index(n: int, dim: int, queries: int, nprobes):
+    vectors = clustered_vectors(n, dim)
+    start = time.perf_counter()
+    index = IVFIndex.build(vectors)
+    build = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as directory:
+        index.save(directory)
+        index = IVFIndex.load(directory)
+        query_vectors = clustered_vectors(queries, dim, seed=1)
+        truth = [set(np.argsort(-(vectors @ q))[:10]) for q in query_vectors]
+        print(f"{n:>7,} chunks x {dim} dims: build {build:6.2f}s, {len(index.centroids)} lists")
+        for nprobe in nprobes:
+            latencies, recalls = [], []
+            for q, expected in zip(query_vectors, truth):
+                start = time.perf_counter()
+                ids, _ = index.search(q, 10, nprobe=nprobe)
+                latencies.append(time.perf_counter() - start)
+                recalls.append(len(expected & set(ids.tolist())) / 10)
+            latencies.sort()
+            print(f"    nprobe {nprobe:>3}: p50 {statistics.median(latencies) * 1000:6.2f} ms  "
+                  f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:6.2f} ms  "
+                  f"recall@10 {statistics.mean(recalls):.3f}")
+        del index
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16])
+    args = parser.parse_args()
+
+    bench_embedder()
+    for n in args.sizes:
+        bench_index(n, args.dim, args.queries, args.nprobe)
+
+
+if __name__ == "__main__":
+    main()
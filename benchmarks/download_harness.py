@@ -0,0 +1,186 @@
+"""
+Exercises ArxivDownload.fetch_pdf against a local HTTP server that serves
+large files with Range support and can misbehave on purpose:
+
+  large      a big file in one go; reports peak Python memory (tracemalloc)
+  flaky      the first response is cut off part-way; must resume via Range
+  leftover   a .part file from a "killed run" already exists; must resume
+  no-range   the server ignores Range; must restart from zero
+  stale      a leftover .part file is longer than the served file, so the
+             server answers 416; must discard it and restart from zero
+  truncated  every response stops 1000 bytes short of its Content-Length;
+             must fail and leave no file at the final path
+
+    python -m benchmarks.download_harness --size-mb 50
+"""
+import argparse
+import hashlib
+import os
+import re
+import shutil
+import socket
+import tempfile
+import threading
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import ArxivDownload
+from ArxivDownload import fetch_pdf
+from benchmarks.harness import check
+
+
+class FileServer:
+    """Serves files from a directory; `mode` selects the misbehaviour."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.mode = "ok"
+        self.cut_after = None
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_GET(self):
+                path = os.path.join(server.directory, self.path.lstrip("/"))
+                size = os.path.getsize(path)
+                start = 0
+                range_header = self.headers.get("Range")
+                server.requests.append(range_header)
+                match = re.match(r"bytes=(\d+)-", range_header or "")
+                if match and server.mode != "no-range":
+                    start = int(match.group(1))
+                    if start >= size:
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{size}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{size - 1}/{size}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Length", str(size - start))
+                self.send_header("Connection", "close")
+                self.end_headers()
+
+                limit = size - start - (1000 if server.mode == "truncated" else 0)
+                if server.cut_after is not None:
+                    limit = min(limit, server.cut_after)
+                    server.cut_after = None
+                with open(path, "rb") as f:
+                    f.seek(start)
+                    while limit > 0:
+                        block = f.read(min(1 << 16, limit))
+                        if not block:
+                            break
+                        self.wfile.write(block)
+                        limit -= len(block)
+                self.close_connection = True
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        # clients hanging up mid-body is expected here
+        self.httpd.handle_error = lambda request, client_address: None
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def url(self, name):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}/{name}"
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def make_file(path, size):
+    digest = hashlib.sha256()
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining:
+            block = os.urandom(min(1 << 20, remaining))
+            f.write(block)
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=50)
+    args = parser.parse_args()
+
+    ArxivDownload.time.sleep = lambda seconds: None  # no retry backoff in the harness
+    root = tempfile.mkdtemp(prefix="inspireit-download-")
+    served, out = os.path.join(root, "served"), os.path.join(root, "out")
+    os.makedirs(served)
+    os.makedirs(out)
+    size = args.size_mb << 20
+    sha = make_file(os.path.join(served, "large.pdf"), size)
+    server = FileServer(served)
+    ok = True
+    try:
+        target = os.path.join(out, "large.pdf")
+        tracemalloc.start()
+        got = fetch_pdf(server.url("large.pdf"), target)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        ok &= check("large", got == (size, sha),
+                    f"{args.size_mb} MB, peak traced memory {peak / 1024:.0f} KiB")
+
+        os.remove(target)
+        server.requests.clear()
+        server.cut_after = size // 3
+        got = fetch_pdf(server.url("large.pdf"), target)
+        ok &= check("flaky", got == (size, sha) and server.requests[-1] == f"bytes={size // 3}-",
+                    f"requests: {server.requests}")
+
+        os.remove(target)
+        with open(os.path.join(served, "large.pdf"), "rb") as src, open(target + ".part", "wb") as dst:
+            dst.write(src.read(size // 2))
+        server.requests.clear()
+        got = fetch_pdf(server.url("large.pdf"), target)
+        ok &= check("leftover", got == (size, sha) and server.requests == [f"bytes={size // 2}-"],
+                    f"requests: {server.requests}")
+
+        os.remove(target)
+        shutil.copyfile(os.path.join(served, "large.pdf"), target + ".part")
+        os.truncate(target + ".part", size // 2)
+        server.mode = "no-range"
+        got = fetch_pdf(server.url("large.pdf"), target)
+        ok &= check("no-range", got == (size, sha))
+
+        os.remove(target)
+        server.mode = "ok"
+        shutil.copyfile(os.path.join(served, "large.pdf"), target + ".part")
+        with open(target + ".part", "ab") as f:
+            f.write(os.urandom(1000))
+        server.requests.clear()
+        got = fetch_pdf(server.url("large.pdf"), target)
+        ok &= check("stale", got == (size, sha) and server.requests == [f"bytes={size + 1000}-", None]
+                    and not os.path.exists(target + ".part"), f"requests: {server.requests}")
+
+        os.remove(target)
+        server.mode = "truncated"
+        try:
+            fetch_pdf(server.url("large.pdf"), target)
+            failed = False
+        except IOError as e:
+            failed = True
+        ok &= check("truncated", failed and not os.path.exists(target))
+    finally:
+        server.stop()
+        shutil.rmtree(root)
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
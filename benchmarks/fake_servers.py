@@ -0,0 +1,586 @@
+"""
+Local stand-ins for the Discovery Engine :search endpoint, the Mistral chat
+API and arXiv, used by the benchmark scripts in this directory so they can
+run offline, plus error injection (flaky) and recording real API exchanges
+into a Cassette to replay them later.
+"""
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+def fake_search_result(n_docs: int = 10):
+    results = []
+    for i in range(n_docs):
+        results.append({
+            "document": {
+                "derivedStructData": {
+                    "title": f"Paper {i}",
+                    "link": f"gs://inspireit-papers/2021-01/paper_{i}.pdf",
+                    "snippets": [{
+                        "snippet": f"This <b>paper</b> studies topic {i}&nbsp;in detail.",
+                        "snippet_status": "SUCCESS"
+                    }]
+                }
+            }
+        })
+    return {"results": results}
+
+
+def fake_ideas_content(n_ideas: int = 3, summary_words: int = 0, first: int = 0):
+    ideas = []
+    for i in range(first, first + n_ideas):
+        ideas.append({
+            "title": f"Idea {i}",
+            "summary": " ".join(["A fake idea used for benchmarking."] + ["lengthy"] * summary_words),
+            "opportunities": ["opp1", "opp2"],
+            "drawbacks": ["drawback1"],
+            "references": {"1": {"title": "Paper 0",
+                                 "link": "gs://inspireit-papers/2021-01/paper_0.pdf"}}
+        })
+    return "```json\n" + json.dumps({"ideas": ideas}) + "\n```"
+
+
+def fake_content(body):
+    """A response in the shape the prompt asks for, so it passes LLMs.schemas."""
+    prompt = body["messages"][-1]["content"] if body.get("messages") else ""
+    if '"Existing_work"' in prompt:
+        return "```json\n" + json.dumps({"improved_idea": [{
+            "title": "Idea 0", "Abstract": "A fake abstract.", "Methodology_recommended": "A fake method.",
+            "Existing_work": ["Paper 0"]}]}) + "\n```"
+    if '"improved_idea"' in prompt:
+        return "```json\n" + json.dumps({"improved_idea": [{
+            "title": "Idea 0", "description": "A fake improvement.", "opportunities": ["opp1"],
+            "drawbacks": ["drawback1"], "references": ["Paper 0"]}]}) + "\n```"
+    if '"seeds"' in prompt:
+        return fake_seeds_content()
+    if "write up one research idea" in prompt:
+        return fake_ideas_content(1, first=seed_index(prompt))
+    return fake_ideas_content()
+
+
+def fake_seeds_content(n_ideas: int = 3):
+    seeds = [{"title": f"Idea {i}", "angle": f"Angle {i}"} for i in range(n_ideas)]
+    return json.dumps({"seeds": seeds})
+
+
+def seed_index(prompt: str):
+    """Which planned seed a fan-out idea prompt is for (see MistralChat._seeded_idea_messages)."""
+    match = re.search(r"Idea title: Idea (\d+)", prompt)
+    return int(match.group(1)) if match else 0
+
+
+class StubServer:
+    """
+    A threaded HTTP server that answers every request after `latency` seconds
+    and records the peak number of requests it was serving at the same time.
+
+    `respond(path, body)` returns (status, payload) or (status, payload,
+    headers); body is None for a GET. A dict payload is sent as JSON, bytes as-is, and anything else is treated
+    as an iterator of text frames and streamed.
+
+    With `max_in_flight`, requests beyond that many at once are answered 429
+    straight away, like an overloaded API, and counted in `overloaded`.
+
+    `connect_latency` is added to the first request on each new connection,
+    standing in for the TCP and TLS round trips to a remote API; those
+    connections are counted in `connections`. HEAD requests get an empty
+    200 without `latency`.
+    """
+
+    def __init__(self, respond, latency: float = 0.0, port: int = 0, certfile=None, keyfile=None,
+                 max_in_flight: int = 0, connect_latency: float = 0.0):
+        self.respond = respond
+        self.latency = latency
+        self.max_in_flight = max_in_flight
+        self.connect_latency = connect_latency
+        self.connections = 0
+        self.overloaded = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.httpd.daemon_threads = True
+        self.scheme = "http"
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            self.httpd.socket = context.wrap_socket(self.httpd.socket, server_side=True)
+            self.scheme = "https"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f"{self.scheme}://{host}:{port}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                # headers and body go out in separate writes; without this,
+                # Nagle + delayed ACK add ~40ms to every keep-alive response
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.handshake = server.connect_latency
+                with server.lock:
+                    server.connections += 1
+
+            def handle_one_request(self):
+                # the first request on a connection pays for the "handshake"
+                # once it has arrived, before it is parsed
+                if self.handshake and self.rfile.peek(1):
+                    time.sleep(self.handshake)
+                    self.handshake = 0.0
+                super().handle_one_request()
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.serve(json.loads(self.rfile.read(length) or b"{}"))
+
+            def do_GET(self):
+                self.serve(None)
+
+            def serve(self, body):
+                with server.lock:
+                    server.in_flight += 1
+                    server.requests += 1
+                    server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+                    overloaded = server.max_in_flight and server.in_flight > server.max_in_flight
+                    server.overloaded += bool(overloaded)
+                try:
+                    if overloaded:
+                        status, payload = 429, {"object": "error", "message": "overloaded"}
+                        headers = [{"Retry-After": "1"}]
+                    else:
+                        time.sleep(server.latency)
+                        status, payload, *headers = server.respond(self.path, body)
+                    headers = headers[0] if headers else {}
+                    if isinstance(payload, (dict, bytes)):
+                        binary = isinstance(payload, bytes)
+                        data = payload if binary else json.dumps(payload).encode()
+                        self.send_response(status)
+                        for name, value in headers.items():
+                            self.send_header(name, value)
+                        self.send_header("Content-Type", "application/octet-stream" if binary
+                                         else "application/json")
+                        self.send_header("Content-Length", str(len(data)))
+                        self.end_headers()
+                        self.wfile.write(data)
+                    else:
+                        # streamed body: an iterator of str frames, ended by closing
+                        self.send_response(status)
+                        self.send_header("Content-Type", "text/event-stream")
+                        self.send_header("Connection", "close")
+                        self.end_headers()
+                        for frame in payload:
+                            self.wfile.write(frame.encode())
+                            self.wfile.flush()
+                        self.close_connection = True
+                finally:
+                    with server.lock:
+                        server.in_flight -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def self_signed_cert():
+    """Create a throwaway certificate for 127.0.0.1; returns (certfile, keyfile)."""
+    directory = tempfile.mkdtemp(prefix="inspireit-bench-")
+    certfile = os.path.join(directory, "cert.pem")
+    keyfile = os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+         "-keyout", keyfile, "-out", certfile, "-days", "1",
+         "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1"],
+        check=True, capture_output=True)
+    return certfile, keyfile
+
+
+def search_responder(n_docs: int = 10):
+    def respond(path, body):
+        return 200, fake_search_result(min(n_docs, body.get("pageSize", n_docs)))
+    return respond
+
+
+def split_tokens(text: str, chars_per_token: int = 4):
+    return [text[i:i + chars_per_token] for i in range(0, len(text), chars_per_token)]
+
+
+def chat_responder(content=None, tokens_per_sec: float = 0.0):
+    """
+    Mistral chat completions stub. With `"stream": true` in the request it
+    emits one SSE chunk per ~4 characters at `tokens_per_sec` (0 = no delay);
+    otherwise it waits for the whole "generation" and returns one JSON body.
+    """
+    def respond(path, body):
+        text = content(body) if callable(content) else (content or fake_content(body))
+        tokens = split_tokens(text)
+        delay = 1.0 / tokens_per_sec if tokens_per_sec else 0.0
+        model = body.get("model", "fake")
+        if body.get("stream"):
+            return 200, stream_chunks(tokens, model, delay)
+        time.sleep(delay * len(tokens))
+        return 200, {
+            "id": "fake-completion",
+            "object": "chat.completion",
+            "model": model,
+            "created": int(time.time()),
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens),
+                      "total_tokens": len(tokens)},
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop"
+            }]
+        }
+    return respond
+
+
+def stream_chunks(tokens, model, delay):
+    for i, token in enumerate(tokens):
+        time.sleep(delay)
+        chunk = {
+            "id": "fake-completion",
+            "object": "chat.completion.chunk",
+            "model": model,
+            "created": int(time.time()),
+            "choices": [{
+                "index": 0,
+                "delta": {"role": "assistant", "content": token},
+                "finish_reason": "stop" if i == len(tokens) - 1 else None
+            }]
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+class FakeArxivResult:
+    """The parts of arxiv.Result that the ingestion code reads."""
+
+    class Author:
+        def __init__(self, name):
+            self.name = name
+
+    def __init__(self, short_id: str, title: str, published, pdf_url: str):
+        self.short_id = short_id
+        self.title = title
+        self.published = published
+        self.pdf_url = pdf_url
+        self.authors = [self.Author("Jane Doe"), self.Author("John Roe")]
+        self.categories = ["cs.LG"]
+
+    def get_short_id(self):
+        return self.short_id
+
+
+def fake_arxiv_client(pdf_base_url: str, page_latency: float = 0.0):
+    """
+    Returns a drop-in for arxiv.Client whose results() answers any
+    submittedDate search with `max_results` synthetic papers from the
+    searched month, one page of `page_size` every `page_latency` seconds,
+    each with a PDF link under `pdf_base_url`.
+    """
+    class FakeClient:
+        def __init__(self, page_size: int = 100, delay_seconds: float = 3.0, num_retries: int = 3):
+            self.page_size = page_size
+
+        def results(self, search):
+            start = re.search(r"submittedDate:\[(\d{12})", search.query).group(1)
+            start = datetime.strptime(start, "%Y%m%d%H%M")
+            month = start.replace(day=1, hour=0, minute=0)
+            for page_start in range(0, search.max_results, self.page_size):
+                time.sleep(page_latency)
+                for i in range(page_start, min(search.max_results, page_start + self.page_size)):
+                    short_id = f"{month:%y%m}.{i:05d}v1"
+                    yield FakeArxivResult(short_id, f"Paper {short_id}", month + timedelta(minutes=i),
+                                          f"{pdf_base_url}/pdf/{short_id}")
+
+    return FakeClient
+
+
+class FakeArxivAPI:
+    """
+    Responder for an arXiv export API stand-in (/api/query). Every month in
+    a submittedDate search has `papers_per_month` papers, one submitted per
+    minute from midnight on the 1st, whose PDFs live under `pdf_base_url`.
+    A page requested less than `min_interval` seconds after the last page
+    served is answered 429 with Retry-After, and counted in `violations`.
+    """
+
+    def __init__(self, pdf_base_url: str, papers_per_month: int = 50, min_interval: float = 0.0):
+        self.pdf_base_url = pdf_base_url
+        self.papers_per_month = papers_per_month
+        self.min_interval = min_interval
+        self.last_request = None
+        self.violations = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, path, body):
+        with self.lock:
+            now = time.monotonic()
+            if self.last_request is not None and now - self.last_request < self.min_interval:
+                self.violations += 1
+                return 429, b"rate exceeded", {"Retry-After": str(self.min_interval)}
+            self.last_request = now
+
+        params = parse_qs(urlsplit(path).query)
+        query = params["search_query"][0]
+        start = int(params.get("start", ["0"])[0])
+        max_results = int(params.get("max_results", ["10"])[0])
+        first, last = re.search(r"submittedDate:\[(\d{12}) TO (\d{12})\]", query).groups()
+        first = datetime.strptime(first, "%Y%m%d%H%M")
+        last = datetime.strptime(last, "%Y%m%d%H%M")
+        month = first.replace(day=1, hour=0, minute=0)
+        matching = [i for i in range(self.papers_per_month)
+                    if first <= month + timedelta(minutes=i) <= last]
+        entries = []
+        for i in matching[start:start + max_results]:
+            short_id = f"{month:%y%m}.{i:05d}"
+            published = (month + timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%SZ")
+            entries.append(f"""
+  <entry>
+    <id>http://arxiv.org/abs/{short_id}v1</id>
+    <published>{published}</published>
+    <title>Paper {short_id}</title>
+    <author><name>Jane Doe</name></author>
+    <author><name>John Roe</name></author>
+    <category term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>
+    <link href="http://arxiv.org/abs/{short_id}v1" rel="alternate" type="text/html"/>
+    <link title="pdf" href="{self.pdf_base_url}/pdf/{short_id}v1" rel="related" type="application/pdf"/>
+  </entry>""")
+        feed = f"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">
+  <opensearch:totalResults>{len(matching)}</opensearch:totalResults>
+  <opensearch:startIndex>{start}</opensearch:startIndex>{"".join(entries)}
+</feed>"""
+        return 200, feed.encode()
+
+
+def pdf_responder(size: int = 1 << 16, fail_every: int = 0):
+    """
+    Serves the same random `size`-byte "PDF" (kept as `respond.data`) for
+    every path; with `fail_every`, every n-th request gets a 503 with
+    Retry-After: 0 instead.
+    """
+    data = os.urandom(size)
+    counter = itertools.count(1)
+
+    def respond(path, body):
+        if fail_every and next(counter) % fail_every == 0:
+            return 503, b"busy", {"Retry-After": "0"}
+        return 200, data
+    respond.data = data
+    return respond
+
+
+def point_app_at(search: StubServer, llm: StubServer, caches: bool = True):
+    """
+    Environment that makes MistralChat talk to the given stubs; set before
+    importing main. caches=False turns off the retrieval and completion
+    caches so every request reaches the stubs.
+    """
+    os.environ["DISCOVERY_ENGINE_URL"] = search.url + "/search"
+    os.environ["DISCOVERY_ENGINE_TOKEN"] = "fake-token"
+    os.environ["MISTRAL_SERVER_URL"] = llm.url
+    os.environ.setdefault("MISTRAL_API_KEY", "fake-key")
+    # the benchmarks measure the app itself; bench_admission turns this on
+    os.environ.setdefault("ADMISSION", "0")
+    if not caches:
+        os.environ["RETRIEVAL_CACHE_SIZE"] = "0"
+        os.environ["COMPLETION_CACHE_SIZE"] = "0"
+
+
+def serve_app(app, port: int):
+    """Run an ASGI app with a single uvicorn worker in a background thread."""
+    import uvicorn
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+def stop_app(server, thread):
+    server.should_exit = True
+    thread.join()
+
+
+def serve_app_workers(port: int, workers: int, env: dict = None):
+    """Run main:app under uvicorn with `workers` processes; returns the Popen once it answers."""
+    import httpx
+
+    process = subprocess.Popen(
+        ["python", "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=dict(os.environ, **(env or {})))
+    deadline = time.time() + 60
+    while True:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1.0).raise_for_status()
+            # the first worker answers; give the others a moment to come up
+            time.sleep(1.0 if workers > 1 else 0.0)
+            return process
+        except httpx.HTTPError:
+            if process.poll() is not None or time.time() > deadline:
+                process.kill()
+                raise RuntimeError("uvicorn did not start")
+            time.sleep(0.2)
+
+
+def stop_app_workers(process):
+    process.terminate()
+    process.wait(timeout=30)
+
+
+def flaky(respond, error_rate: float, seed: int = 0, status: int = 429):
+    """
+    Wraps a responder so that a seeded `error_rate` share of requests get
+    `status` (429 by default, as Mistral sends when rate limited) with
+    Retry-After: 1 instead of an answer. The failures are counted in
+    `respond.errors`.
+    """
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def wrapped(path, body):
+        with lock:
+            fail = rng.random() < error_rate
+            wrapped.errors += fail
+        if fail:
+            return status, {"object": "error", "message": "injected failure"}, {"Retry-After": "1"}
+        return respond(path, body)
+    wrapped.errors = 0
+    return wrapped
+
+
+def exchange_key(path: str, body):
+    """What a recorded exchange is looked up by: the request path and its JSON body."""
+    return hashlib.sha256(json.dumps([path, body], sort_keys=True).encode()).hexdigest()
+
+
+class Cassette:
+    """
+    Recorded upstream exchanges, one JSON object per line of `path`:
+    {"key", "path", "status", "payload"}, where payload is the JSON body or,
+    for a streamed response, {"frames": [...]}. Requests recorded more than
+    once are replayed in the order they were recorded, then the last one
+    repeats, so a replay is deterministic.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.exchanges = {}
+        self.cursor = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.exchanges.setdefault(entry["key"], []).append(entry)
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.exchanges.values())
+
+    def record(self, path: str, body, status: int, payload):
+        entry = {"key": exchange_key(path, body), "path": path, "status": status, "payload": payload}
+        with self.lock:
+            self.exchanges.setdefault(entry["key"], []).append(entry)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def lookup(self, path: str, body):
+        key = exchange_key(path, body)
+        with self.lock:
+            entries = self.exchanges.get(key)
+            if not entries:
+                return None
+            i = self.cursor.get(key, 0)
+            self.cursor[key] = i + 1
+            return entries[min(i, len(entries) - 1)]
+
+
+def recording_responder(upstream_url: str, cassette: Cassette, headers: dict, keep_path: bool = True):
+    """
+    Forwards every request to the real API at `upstream_url` with `headers`
+    (the credentials; the stub does not see the app's own headers), records
+    the exchange in `cassette` and returns the real response. With
+    keep_path=False the request path is dropped, for upstreams whose URL
+    is already complete (the Discovery Engine :search endpoint).
+    """
+    import httpx
+
+    client = httpx.Client(timeout=120.0, headers=headers)
+
+    def respond(path, body):
+        url = upstream_url + path if keep_path else upstream_url
+        if body is not None and body.get("stream"):
+            with client.stream("POST", url, json=body) as response:
+                frames = [line + "\n\n" for line in response.iter_lines() if line]
+            cassette.record(path, body, response.status_code, {"frames": frames})
+            return response.status_code, iter(frames)
+        response = client.post(url, json=body) if body is not None else client.get(url)
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = {"raw": response.text}
+        cassette.record(path, body, response.status_code, payload)
+        return response.status_code, payload
+    return respond
+
+
+def replay_responder(cassette: Cassette, fallback=None):
+    """
+    Answers from `cassette`. A request that was never recorded goes to
+    `fallback` if one is given, otherwise it gets a 404; either way it is
+    counted in `respond.misses`.
+    """
+    def respond(path, body):
+        entry = cassette.lookup(path, body)
+        if entry is None:
+            respond.misses += 1
+            if fallback is not None:
+                return fallback(path, body)
+            return 404, {"object": "error", "message": "request not in cassette"}
+        payload = entry["payload"]
+        if isinstance(payload, dict) and "frames" in payload and len(payload) == 1:
+            return entry["status"], iter(payload["frames"])
+        return entry["status"], payload
+    respond.misses = 0
+    return respond
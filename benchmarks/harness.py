@@ -0,0 +1,22 @@
+"""
+Pieces shared by the *_harness scripts in this directory: a fake clock to
+inject into time-dependent components and the [PASS]/[FAIL] line printer.
+"""
+
+
+class FakeClock:
+    """Callable stand-in for time.time / time.monotonic that only moves when told to."""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+def check(name, condition, detail=""):
+    print(f"[{'PASS' if condition else 'FAIL'}] {name} {detail}")
+    return condition
@@ -0,0 +1,134 @@
+"""
+Checks that the chat session stores in Chatbot.sessions stay bounded under
+many sessions, for MemoryConversationStore and SQLiteConversationStore,
+with a fake clock:
+
+  per-session  one long conversation keeps only its last max_messages
+  lru          --sessions sessions (more than max_sessions) leave exactly
+               max_sessions, and a session read recently survives while the
+               least recently used ones go
+  ttl          sessions idle past the TTL are gone, and for SQLite so are
+               their message rows
+  reuse        a session id used again after its TTL starts from an empty
+               history, whether it is read or appended to first
+  append cost  (SQLite) an append to a full store costs about the same as
+               one to a nearly empty store, i.e. eviction does not scan
+               every message
+
+    python -m benchmarks.session_store_harness --sessions 5000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from Chatbot.sessions import MemoryConversationStore, SQLiteConversationStore
+from benchmarks.harness import FakeClock, check
+
+
+def turn(i):
+    return {"role": "user", "content": f"question {i}"}, {"role": "assistant", "content": f"answer {i}"}
+
+
+def message_rows(store):
+    if isinstance(store, SQLiteConversationStore):
+        return store._connect().execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+    return sum(len(history) for _, history in store.sessions.values())
+
+
+def exercise(name, make, args):
+    ok = True
+    clock = FakeClock()
+    store = make(clock)
+    for i in range(3 * args.max_messages):
+        clock.advance(1)
+        store.append("long", *turn(i))
+    history = store.get("long")
+    ok &= check(f"{name} per-session", len(history) == args.max_messages
+                and history[-1]["content"] == f"answer {3 * args.max_messages - 1}",
+                f"{3 * args.max_messages * 2} messages appended, {len(history)} kept")
+
+    reused = {}
+    for first in ("get", "append"):
+        store = make(clock)
+        store.append("reused", {"role": "user", "content": "old secret"}, {"role": "assistant", "content": "x"})
+        clock.advance(args.ttl + 1)
+        if first == "get":
+            store.get("reused")
+        store.append("reused", *turn(1))
+        reused[first] = [m["content"] for m in store.get("reused")]
+    ok &= check(f"{name} reuse", all(history == ["question 1", "answer 1"] for history in reused.values()),
+                f"history after the TTL: {reused}")
+
+    store = make(clock)
+    store.append("favourite", *turn(0))
+    for i in range(args.sessions):
+        clock.advance(0.01)
+        store.append(f"s{i}", *turn(i))
+        if i % 100 == 0:
+            store.get("favourite")
+    survivors = [f"s{i}" for i in range(args.sessions) if store.get(f"s{i}")]
+    expected = [f"s{i}" for i in range(args.sessions - args.max_sessions + 1, args.sessions)]
+    ok &= check(f"{name} lru", len(store) == args.max_sessions and store.get("favourite") != []
+                and survivors[-len(expected):] == expected and message_rows(store) == 2 * args.max_sessions,
+                f"{args.sessions} sessions, {len(store)} kept, {message_rows(store)} messages held")
+
+    clock.advance(args.ttl + 1)
+    store.append("fresh", *turn(0))
+    ok &= check(f"{name} ttl", len(store) == 1 and store.get("s1") == [] and message_rows(store) == 2,
+                f"{len(store)} session(s) and {message_rows(store)} messages left after the TTL")
+    return ok
+
+
+def append_seconds(store, clock, prefix, n):
+    started = time.perf_counter()
+    for i in range(n):
+        clock.advance(0.01)
+        store.append(f"{prefix}{i}", *turn(i))
+    return (time.perf_counter() - started) / n
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=5000)
+    parser.add_argument("--max-sessions", type=int, default=1000)
+    parser.add_argument("--max-messages", type=int, default=10)
+    parser.add_argument("--ttl", type=float, default=3600.0)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="inspireit-sessions-")
+    counter = iter(range(1_000_000))
+
+    def sqlite_store(clock, max_sessions=args.max_sessions):
+        return SQLiteConversationStore(os.path.join(directory, f"sessions{next(counter)}.db"),
+                                       max_sessions=max_sessions, ttl=args.ttl,
+                                       max_messages=args.max_messages, clock=clock)
+
+    def memory_store(clock):
+        return MemoryConversationStore(max_sessions=args.max_sessions, ttl=args.ttl,
+                                       max_messages=args.max_messages, clock=clock)
+
+    try:
+        ok = exercise("memory", memory_store, args)
+        ok &= exercise("sqlite", sqlite_store, args)
+
+        clock = FakeClock()
+        store = sqlite_store(clock, max_sessions=10 * args.sessions)
+        empty = append_seconds(store, clock, "a", 200)
+        append_seconds(store, clock, "b", args.sessions)
+        # long conversations: many message rows per session
+        for i in range(args.sessions // 10):
+            for j in range(args.max_messages // 2):
+                store.append(f"b{i}", *turn(j))
+        full = append_seconds(store, clock, "c", 200)
+        ok &= check("sqlite append cost", full < 3 * empty,
+                    f"{empty * 1e6:.0f}us per append with ~200 sessions, {full * 1e6:.0f}us with "
+                    f"{len(store)} sessions and {message_rows(store)} messages")
+    finally:
+        shutil.rmtree(directory)
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
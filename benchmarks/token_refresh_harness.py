@@ -0,0 +1,156 @@
+"""
+Checks the refresh policy of LLMs.credentials.TokenManager against a fake
+clock and a fake token endpoint that issues numbered tokens valid for
+--ttl seconds of fake time:
+
+  before-expiry  the token is reused until refresh_margin before expiry, then
+                 replaced while the old one is still valid
+  concurrent     --threads callers inside the margin share one refresh
+  failure        a failed refresh keeps serving the old token until it
+                 expires, then raises
+  backoff        the background thread retries a failing endpoint every
+                 retry_delay (not in a hot loop) and stops calling once a
+                 refresh succeeds
+  invalidate     a 401 on the current token forces one refresh, shared by
+                 concurrent callers; a 401 on an already replaced token
+                 forces none
+  metrics        token age, TTL and refresh counts follow the fake clock
+
+    python -m benchmarks.token_refresh_harness
+"""
+import argparse
+import logging
+import threading
+import time
+
+from LLMs.credentials import TokenManager
+from benchmarks.harness import FakeClock, check
+
+
+class FakeTokenEndpoint:
+    """fetch() for TokenManager: token-1, token-2, ... each valid for `ttl` from the fake clock."""
+
+    def __init__(self, clock: FakeClock, ttl: float, latency: float = 0.0):
+        self.clock = clock
+        self.ttl = ttl
+        self.latency = latency
+        self.failing = False
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def fetch(self):
+        with self.lock:
+            self.calls += 1
+            n = self.calls
+        time.sleep(self.latency)
+        if self.failing:
+            raise ConnectionError("token endpoint unavailable")
+        return f"token-{n}", self.clock() + self.ttl
+
+
+def concurrently(fn, threads: int):
+    """Runs fn in `threads` threads released at once; returns their results or exceptions."""
+    barrier = threading.Barrier(threads)
+    results = [None] * threads
+
+    def run(i):
+        barrier.wait()
+        try:
+            results[i] = fn()
+        except Exception as e:
+            results[i] = e
+
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ttl", type=float, default=3600.0)
+    parser.add_argument("--margin", type=float, default=300.0)
+    parser.add_argument("--threads", type=int, default=32)
+    args = parser.parse_args()
+    # the failures below are on purpose; TokenManager logs each one with a traceback
+    logging.disable(logging.ERROR)
+    ok = True
+
+    clock = FakeClock()
+    endpoint = FakeTokenEndpoint(clock, args.ttl)
+    tokens = TokenManager(endpoint.fetch, refresh_margin=args.margin, clock=clock)
+    first = tokens.get_token()
+    clock.advance(args.ttl - args.margin - 1)
+    reused = tokens.get_token()
+    clock.advance(2)
+    old_expiry = tokens.expiry
+    refreshed = tokens.get_token()
+    ok &= check("before-expiry", first == reused == "token-1" and refreshed == "token-2" and clock() < old_expiry,
+                f"fetches {endpoint.calls}, refreshed {args.margin - 1:.0f}s before the old token expired")
+
+    clock.advance(args.ttl - args.margin + 1)
+    endpoint.latency = 0.2
+    calls = endpoint.calls
+    results = concurrently(tokens.get_token, args.threads)
+    ok &= check("concurrent", endpoint.calls == calls + 1 and set(results) == {"token-3"},
+                f"{args.threads} callers, {endpoint.calls - calls} fetch(es)")
+    endpoint.latency = 0.0
+
+    clock.advance(args.ttl - args.margin + 1)
+    endpoint.failing = True
+    stale = tokens.get_token()
+    clock.advance(args.margin)
+    try:
+        tokens.get_token()
+        raised = False
+    except ConnectionError:
+        raised = True
+    ok &= check("failure", stale == "token-3" and raised and tokens.refresh_failures == 2,
+                f"served the old token inside the margin, raised after expiry; "
+                f"failures {tokens.refresh_failures}")
+
+    retry_delay, window = 0.05, 0.5
+    calls = endpoint.calls
+    tokens.retry_delay = retry_delay
+    tokens.start()
+    time.sleep(window)
+    retries = endpoint.calls - calls
+    endpoint.failing = False
+    time.sleep(3 * retry_delay)
+    recovered = tokens.token
+    calls = endpoint.calls
+    time.sleep(window)
+    idle = endpoint.calls - calls
+    tokens.stop()
+    expected = window / retry_delay
+    ok &= check("backoff", expected / 2 <= retries <= expected * 1.5 + 1 and recovered != "token-3" and idle == 0,
+                f"{retries} retries in {window}s at retry_delay {retry_delay}s, {recovered} after recovery, "
+                f"{idle} fetches once fresh")
+
+    current = tokens.get_token()
+    calls = endpoint.calls
+    tokens.invalidate("token-0")
+    unchanged = tokens.get_token() == current and endpoint.calls == calls
+    endpoint.latency = 0.1
+
+    def rejected_then_retry():
+        tokens.invalidate(current)
+        return tokens.get_token()
+
+    results = concurrently(rejected_then_retry, args.threads)
+    ok &= check("invalidate", unchanged and endpoint.calls == calls + 1 and len(set(results)) == 1
+                and current not in results,
+                f"stale 401 ignored; {args.threads} concurrent 401s, {endpoint.calls - calls} fetch(es)")
+
+    clock.advance(60)
+    stats = tokens.metrics()
+    ok &= check("metrics", stats["token_age_seconds"] == 60 and stats["token_ttl_seconds"] == args.ttl - 60
+                and stats["refresh_count"] == endpoint.calls - tokens.refresh_failures,
+                f"{stats}")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,31 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from Chatbot.chatbot import *
 from GenerateIdeas.generate import *
 from Recommended.recommend import *
 
 from LLMs.prompts import *
-chat = MistralChat()
+from LLMs.async_prompts import AsyncMistralChat
+from LLMs.metrics import MetricsMiddleware
+from LLMs.admission import AdmissionMiddleware, admission_from_env
+chat = AsyncMistralChat()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await chat.aclose()
+
+app = FastAPI(lifespan=lifespan)
+# ADMISSION=1 turns on admission control (off by default); innermost, so
+# that rejections still get CORS headers and are counted in /metrics
+admission = admission_from_env()
+if admission is not None:
+    app.add_middleware(AdmissionMiddleware, controller=admission)
+    admission.register_metrics(chat.metrics)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -16,6 +33,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware, metrics=chat.metrics)
 
 
 @app.get("/")
@@ -23,6 +41,21 @@ async def root():
     return {"Status": "Works"}
 
 
+@app.get("/cache/stats")
+async def cacheStats():
+    return {
+        "retrieval": chat.retrieval_cache.stats(),
+        "completion": chat.completion_cache.stats(),
+        "single_flight": chat.single_flight.stats(),
+        "token": chat.credentials.metrics()
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(chat.metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/generate/")
 async def generate():
     return generateButton()
@@ -30,17 +63,27 @@ async def generate():
 
 @app.post("/generate/submit/")
 async def generateSubmit(userDetails: UserDetailsFormat):
-    return generateSubmitButton(dict(userDetails), chat)
+    return await generateSubmitButton(dict(userDetails), chat)
+
+
+@app.post("/generate/submit/stream/")
+async def generateSubmitStream(userDetails: UserDetailsFormat):
+    return generateSubmitStreamButton(dict(userDetails), chat)
 
 
 @app.post("/generate/submit/extra-suggestions/")
 async def generateWithSuggestions(userDetails: ExtraSpecifications):
-    return recommendSuggestionsButton(userDetails,chat)
+    return await recommendSuggestionsButton(userDetails,chat)
 
 
 @app.post("/recommend/suggested/")
 async def recommendPaperChosen(paperChosen: PaperFormat):
-    return recommendAcceptButton(paperChosen,chat)
+    return await recommendAcceptButton(paperChosen,chat)
 @app.post("/chatbot")
 async def chatbotEndpoint(userchat:UserChat):
-    return chatbotButton(dict(userchat),chat)
\ No newline at end of file
+    return await chatbotButton(dict(userchat),chat)
+
+
+@app.post("/chatbot/stream")
+async def chatbotStreamEndpoint(userchat:UserChat):
+    return chatbotStreamButton(dict(userchat),chat)
\ No newline at end of file